@@ -0,0 +1,263 @@
+"""
+Placement of SEED-STEM devices onto shared south services.
+
+Instead of one Fledge south service per device, devices are packed into at most SHARED_SOUTH_SERVICES
+multi-device mqtt-readings-binary services per MQTT broker and credentials. A shared service keeps the
+devices it serves in its "devices" configuration item and subscribes to the topics of the enabled ones
+through its "topic" item, so placing, moving or disabling a device is a category update rather than a
+new service.
+
+A new device goes to the least loaded service by expected message rate. When the load of a service
+exceeds the mean load of its pool by more than REBALANCE_THRESHOLD, devices are moved to the coolest
+service until it no longer does.
+
+SHARED_SOUTH_SERVICES=0 keeps the former one south service per device.
+"""
+import json
+import os
+import re
+
+import requests
+from fastapi import HTTPException
+
+SHARED_SOUTH_SERVICES = int(os.getenv("SHARED_SOUTH_SERVICES", "4"))
+SHARED_SOUTH_PREFIX = os.getenv("SHARED_SOUTH_PREFIX", "SEED-STEM-SOUTH")
+REBALANCE_THRESHOLD = float(os.getenv("REBALANCE_THRESHOLD", "0.25"))
+
+SOUTH_PLUGIN = "mqtt-readings-binary"
+# plugin defaults of the broker items
+DEFAULT_BROKER_HOST = "localhost"
+
+# Expected messages per minute of a topic, by its stream type token
+STREAM_RATES = {"pdstop": 1.0, "pqstop": 1.0, "adstop": 6.0, "ddstop": 6.0}
+DEFAULT_RATE = 1.0
+
+_TOKEN_SPLIT = re.compile(r'[/_\-.]')
+
+
+def split_topics(topic):
+    return [item.strip() for item in (topic or "").split(",") if item.strip()]
+
+
+def expected_rate(topic):
+    """Expected messages per minute of a device subscribed to the comma separated `topic`."""
+    rate = 0.0
+    for subscription in split_topics(topic):
+        tokens = _TOKEN_SPLIT.split(subscription)
+        rate += next((STREAM_RATES[token] for token in tokens if token in STREAM_RATES), DEFAULT_RATE)
+    return rate or DEFAULT_RATE
+
+
+def is_shared_service(name):
+    return name.startswith(SHARED_SOUTH_PREFIX + "-")
+
+
+def _item_value(category, item, default=""):
+    value = category.get(item, {}).get("value", default)
+    return default if value is None else value
+
+
+class SharedService:
+    """A shared south service and the devices placed on it."""
+
+    __slots__ = ["name", "broker_host", "username", "password", "devices", "running"]
+
+    def __init__(self, name, broker_host, username, password, devices, running):
+        self.name = name
+        self.broker_host = broker_host
+        self.username = username
+        self.password = password
+        self.devices = devices
+        self.running = running
+
+    @property
+    def pool(self):
+        return (self.broker_host, self.username, self.password)
+
+    @property
+    def load(self):
+        return sum(device.get("rate", DEFAULT_RATE) for device in self.devices.values())
+
+    def topics(self):
+        """Comma separated topics of the enabled devices."""
+        topics = []
+        for device in self.devices.values():
+            if device.get("enabled", True):
+                topics.extend(topic for topic in split_topics(device.get("topic")) if topic not in topics)
+        return ",".join(topics)
+
+
+class DevicePlacement:
+    """Places devices on the shared south services of a Fledge instance."""
+
+    def __init__(self, base_url, auth_token):
+        self.base_url = base_url
+        self.auth_token = auth_token
+
+    def _request(self, method, path, **kwargs):
+        headers = {"Authorization": self.auth_token()}
+        response = requests.request(method, f"{self.base_url}/fledge/{path}", headers=headers, **kwargs)
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        return response.json()
+
+    def services(self, listed=None):
+        """Every shared south service, with its devices; `listed` is the Fledge service list, when already fetched."""
+        services = []
+        if listed is None:
+            listed = self._request("GET", "service").get("services", [])
+        for service in listed:
+            name = service.get("name", "")
+            if not is_shared_service(name):
+                continue
+            category = self._request("GET", f"category/{name}")
+            devices = _item_value(category, "devices", "{}")
+            if isinstance(devices, str):
+                devices = json.loads(devices) if devices.strip() else {}
+            services.append(SharedService(
+                name,
+                _item_value(category, "brokerHost"),
+                _item_value(category, "username"),
+                _item_value(category, "password"),
+                devices,
+                service.get("status") == "running"
+            ))
+        return services
+
+    def find(self, device_name, services=None):
+        """The shared service `device_name` is placed on, or None."""
+        for service in self.services() if services is None else services:
+            if device_name in service.devices:
+                return service
+        return None
+
+    def placed(self, device_name, services):
+        """The shared service `device_name` is placed on, 404 when it is no longer placed on any."""
+        service = self.find(device_name, services)
+        if service is None:
+            raise HTTPException(status_code=404, detail=f"Device {device_name} is not placed on a shared service")
+        return service
+
+    def add(self, device_name, device, broker_host, username, password, services=None):
+        """Place a device on the least loaded service of its broker pool, creating one while the pool is not full."""
+        services = self.services() if services is None else services
+        pool = [service for service in services if service.pool == (broker_host, username, password)]
+        device.setdefault("rate", expected_rate(device.get("topic")))
+        if len(pool) < SHARED_SOUTH_SERVICES:
+            taken = {service.name for service in services}
+            index = 1
+            while f"{SHARED_SOUTH_PREFIX}-{index}" in taken:
+                index += 1
+            service = SharedService(f"{SHARED_SOUTH_PREFIX}-{index}", broker_host, username, password,
+                                    {device_name: device}, False)
+            self._create(service)
+            return service
+        service = min(pool, key=lambda candidate: candidate.load)
+        service.devices[device_name] = device
+        self._save(service)
+        self.rebalance(pool)
+        # the rebalance may have moved it on
+        return self.find(device_name, pool)
+
+    def update(self, device_name, topic=None, asset=None, broker_host=None, username=None, password=None,
+               services=None):
+        """Update a placed device; a new broker or credentials move it to the matching pool.
+
+        Returns the service the device is placed on afterwards.
+        """
+        services = self.services() if services is None else services
+        service = self.placed(device_name, services)
+        device = dict(service.devices[device_name])
+        if topic is not None:
+            device["topic"] = topic
+            device["rate"] = expected_rate(topic)
+        if asset is not None:
+            device["asset"] = asset
+        pool = (service.broker_host if broker_host is None else broker_host,
+                service.username if username is None else username,
+                service.password if password is None else password)
+        if pool != service.pool:
+            target = self.add(device_name, device, *pool, services=services)
+            self.remove(device_name, [service])
+            return target
+        service.devices[device_name] = device
+        self._save(service)
+        pool = [candidate for candidate in services if candidate.pool == service.pool]
+        self.rebalance(pool)
+        return self.find(device_name, pool)
+
+    def remove(self, device_name, services=None):
+        services = self.services() if services is None else services
+        service = self.placed(device_name, services)
+        del service.devices[device_name]
+        if service.devices:
+            self._save(service)
+        else:
+            self._request("DELETE", f"service/{service.name}")
+            services = [candidate for candidate in services if candidate is not service]
+        self.rebalance([candidate for candidate in services if candidate.pool == service.pool])
+
+    def set_enabled(self, device_name, enabled, services=None):
+        service = self.placed(device_name, self.services() if services is None else services)
+        service.devices[device_name]["enabled"] = enabled
+        self._save(service)
+        return service
+
+    def rebalance(self, pool):
+        """Move devices from services hotter than the pool mean by REBALANCE_THRESHOLD to the coolest one."""
+        moved = []
+        for _ in range(sum(len(service.devices) for service in pool)):
+            if len(pool) < 2:
+                break
+            pool = sorted(pool, key=lambda service: service.load)
+            coolest, hottest = pool[0], pool[-1]
+            mean = sum(service.load for service in pool) / len(pool)
+            if hottest.load <= mean * (1 + REBALANCE_THRESHOLD):
+                break
+            gap = hottest.load - coolest.load
+            # the largest device that still narrows the gap between the two
+            candidates = [(device.get("rate", DEFAULT_RATE), name) for name, device in hottest.devices.items()
+                          if device.get("rate", DEFAULT_RATE) < gap]
+            if not candidates:
+                break
+            _, name = max(candidates)
+            coolest.devices[name] = hottest.devices.pop(name)
+            moved.append((coolest, hottest))
+        # subscribe on the new service before unsubscribing on the old one: frames of a moved device that
+        # arrive in between are ingested by both services, with the same RTC timestamps, rather than lost
+        saved = set()
+        for coolest, hottest in moved:
+            for service in (coolest, hottest):
+                if service.name not in saved:
+                    saved.add(service.name)
+                    self._save(service)
+
+    def _create(self, service):
+        topics = service.topics()
+        self._request("POST", "service", json={
+            "name": service.name,
+            "type": "south",
+            "plugin": SOUTH_PLUGIN,
+            "enabled": bool(topics),
+            "config": {
+                "brokerHost": {"value": service.broker_host},
+                "username": {"value": service.username},
+                "password": {"value": service.password},
+                "topic": {"value": topics or "#"},
+                # the service name is unique per Fledge instance and, unlike the topics, never changes
+                "clientId": {"value": service.name},
+                "devices": {"value": json.dumps(service.devices)}
+            }
+        })
+        service.running = bool(topics)
+
+    def _save(self, service):
+        self._request("PUT", f"category/{service.name}/devices", json={"value": json.dumps(service.devices)})
+        topics = service.topics()
+        if topics:
+            self._request("PUT", f"category/{service.name}/topic", json={"value": topics})
+        # the topic item is mandatory, a service without enabled devices is stopped instead
+        if bool(topics) != service.running:
+            self._request("PUT", "schedule/enable" if topics else "schedule/disable",
+                          json={"schedule_name": service.name})
+            service.running = bool(topics)
@@ -97,6 +97,64 @@ echo "HTTP North plugin DDS_POST has been configured."
 
 sleep 2
 
+# Each north task sends only the assets of its stream type when the mqtt-readings-binary south plugin
+# names them <asset>_<stream> (assetNameTemplate {asset}_{stream}); assets without a stream suffix, the
+# default, pass to every task.
+for STREAM in pds pqs ads dds; do
+
+  TASK_NAME="$(echo "$STREAM" | tr '[:lower:]' '[:upper:]')_POST"
+  FILTER_NAME="${STREAM}_assets"
+
+  if curl -s http://comms_gw:8081/fledge/filter | grep -q "\"name\":\s*\"$FILTER_NAME\""; then
+    echo "Filter '$FILTER_NAME' already exists. Skipping creation."
+  else
+    echo "Filter '$FILTER_NAME' does not exist. Creating..."
+
+  OTHER_STREAMS="$(echo pds pqs ads dds | tr ' ' '\n' | grep -v "^$STREAM$" | paste -sd '|')"
+
+  # the ingest statistics readings of the south services (<asset>statistics) stay in Fledge
+
+  curl --location 'http://comms_gw:8081/fledge/filter' \
+  --header 'Accept: application/json, text/plain, */*' \
+  --data '{"name":"'"$FILTER_NAME"'","plugin":"asset","filter_config":{"enable":"true","config":{"rules":[{"asset_name":".*statistics","action":"exclude"},{"asset_name":".*_'"$STREAM"'","action":"include"},{"asset_name":".*_('"$OTHER_STREAMS"')","action":"exclude"}],"defaultAction":"include"}}}'
+
+  curl --location --request PUT 'http://comms_gw:8081/fledge/filter/'"$TASK_NAME"'/pipeline?allow_duplicates=true&append_filter=true' \
+  --header 'Accept: application/json, text/plain, */*' \
+  --data '{"pipeline":["'"$FILTER_NAME"'"]}'
+
+  echo "Asset filter of $TASK_NAME has been configured."
+
+  fi
+
+  # http_north sends readings as they are: compact readings (compactStreams of the south plugin) are
+  # expanded to named datapoints before they reach the historian API
+  FILTER_NAME="${STREAM}_expand_compact"
+
+  if curl -s http://comms_gw:8081/fledge/filter | grep -q "\"name\":\s*\"$FILTER_NAME\""; then
+    echo "Filter '$FILTER_NAME' already exists. Skipping creation."
+  else
+    echo "Filter '$FILTER_NAME' does not exist. Creating..."
+
+  curl --location 'http://comms_gw:8081/fledge/filter' \
+  --header 'Accept: application/json, text/plain, */*' \
+  --data '{"name":"'"$FILTER_NAME"'","plugin":"python35","filter_config":{"enable":"true"}}'
+
+  curl --location --request PUT 'http://comms_gw:8081/fledge/filter/'"$TASK_NAME"'/pipeline?allow_duplicates=true&append_filter=true' \
+  --header 'Accept: application/json, text/plain, */*' \
+  --data '{"pipeline":["'"$FILTER_NAME"'"],"files":[{"script":{}}]}'
+
+  curl --location 'http://comms_gw:8081/fledge/category/'"$TASK_NAME"'_'"$FILTER_NAME"'/script/upload' \
+  --header 'Accept: application/json, text/plain, */*' \
+  --form 'script=@"/app/plugins/filter/compact/expand_compact_readings.py"'
+
+  echo "Compact reading expansion of $TASK_NAME has been configured."
+
+  fi
+
+done
+
+sleep 2
+
 FILTER_NAME="stream_to_websocket"
 
   if curl -s http://comms_gw:8081/fledge/filter | grep -q "\"name\":\s*\"$FILTER_NAME\""; then
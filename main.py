@@ -4,6 +4,7 @@ import os
 from dotenv import load_dotenv
 from pydantic import BaseModel,Field
 import response_models
+import device_placement
 
 load_dotenv()
 
@@ -793,6 +794,8 @@ async def get_asset_data(asset_code: str, limit: int = 2):
 
 # User defined API
 
+placement = device_placement.DevicePlacement(COMMS_GW_BASE_URL, get_auth_token)
+
 @app.get(
     "/comm_gw/seed-stem-device",
     tags=["Device Management"],
@@ -823,8 +826,17 @@ async def list_seed_stem_devices(
         }
         for service in services
         if service.get("type", "").lower() in ["southbound", "northbound"]
+        and not device_placement.is_shared_service(service.get("name", ""))
     }
 
+    # Devices placed on shared south services
+    for shared in placement.services(services):
+        for name, device in shared.devices.items():
+            seed_stem_services[name] = {
+                "enabled": shared.running and device.get("enabled", True),
+                "comms_protocol": device_placement.SOUTH_PLUGIN
+            }
+
     # Apply pagination
     device_names = list(seed_stem_services.keys())
     start_index = (page - 1) * limit
@@ -875,6 +887,20 @@ async def get_category(device_name: str):
 
     enabled = devices_dict.get(device_name, False)
 
+    shared = placement.find(device_name)
+    if shared is not None:
+        device = shared.devices[device_name]
+        return {
+            "device_name": device_name,
+            "enabled": enabled,
+            "comms_protocol": device_placement.SOUTH_PLUGIN,
+            "mqtt_broker_host": shared.broker_host,
+            "mqtt_topic": device.get("topic", ""),
+            "mqtt_username": shared.username,
+            "mqtt_password": shared.password,
+            "asset_point_id": device.get("asset", "")
+        }
+
     url = f"{COMMS_GW_BASE_URL}/fledge/category/{device_name}"
     headers = {"Authorization": get_auth_token()}
     response = requests.get(url, headers=headers)
@@ -910,6 +936,21 @@ async def create_seed_stem_device(payload: response_models.CreateSEEDSTEMDeviceP
     if payload.comms_protocol and payload.comms_protocol.lower() != "mqtt":
         raise HTTPException(status_code=400, detail={"message": "Invalid comms_protocol. Only 'mqtt' is supported."})
 
+    # Pack the device into a shared south service instead of creating its own
+    if device_placement.SHARED_SOUTH_SERVICES > 0:
+        if payload.comms_protocol != "mqtt":
+            raise HTTPException(status_code=400, detail="Invalid comms_protocol. Only 'mqtt' is supported.")
+        if any(device.device_name == payload.device_name for device in await get_all_seed_stem_devices()):
+            raise HTTPException(status_code=409, detail={"message": f"Device {payload.device_name} already exists"})
+        device = {"topic": payload.mqtt_topic or "", "enabled": payload.enabled}
+        if payload.asset_point_id is not None:
+            device["asset"] = str(payload.asset_point_id)
+        placement.add(payload.device_name, device,
+                      payload.mqtt_broker_host or device_placement.DEFAULT_BROKER_HOST,
+                      payload.mqtt_username or "",
+                      payload.mqtt_password or "")
+        return response_models.CreateSEEDSTEMDevicePayload(**payload.dict(exclude_none=True))
+
     url = f"{COMMS_GW_BASE_URL}/fledge/service"
     headers = {"Authorization": get_auth_token()}
 
@@ -962,6 +1003,30 @@ async def update_seed_stem_device(
 
     headers = {"Authorization": get_auth_token()}
 
+    shared_services = placement.services()
+    if placement.find(device_name, shared_services) is not None:
+        service = placement.update(
+            device_name,
+            topic=update_payload.mqtt_topic,
+            asset=None if update_payload.asset_point_id is None else str(update_payload.asset_point_id),
+            broker_host=update_payload.mqtt_broker_host,
+            username=update_payload.mqtt_username,
+            password=update_payload.mqtt_password,
+            services=shared_services
+        )
+        device = service.devices[device_name]
+        refreshed_devices = await get_all_seed_stem_devices()
+        return {
+            "device_name": device_name,
+            "enabled": next((d.enabled for d in refreshed_devices if d.device_name == device_name), False),
+            "comms_protocol": device_placement.SOUTH_PLUGIN,
+            "mqtt_broker_host": service.broker_host,
+            "mqtt_topic": device.get("topic", ""),
+            "mqtt_username": service.username,
+            "mqtt_password": service.password,
+            "asset_point_id": device.get("asset", "")
+        }
+
     # Fields to update in Fledge
     update_fields = {
         "brokerHost": update_payload.mqtt_broker_host,
@@ -1012,6 +1077,14 @@ async def update_seed_stem_device(
     summary="Delete a SEED-STEM device"
 )
 async def delete_seed_stem_device(device_name: str):
+    shared_services = placement.services()
+    if placement.find(device_name, shared_services) is not None:
+        placement.remove(device_name, shared_services)
+        return {
+            "result": f"SEED-STEM device with name {device_name} deleted successfully!",
+            "statusCode": 200
+        }
+
     url = f"{COMMS_GW_BASE_URL}/fledge/service/{device_name}"
     headers = {"Authorization": get_auth_token()}
 
@@ -1037,6 +1110,11 @@ async def delete_seed_stem_device(device_name: str):
     
 )
 async def disable_seed_stem_device(payload: response_models.DeviceSchedulePayload):
+    shared_services = placement.services()
+    if placement.find(payload.device_name, shared_services) is not None:
+        placement.set_enabled(payload.device_name, False, shared_services)
+        return response_models.DeviceScheduleResponseModel(device_name=payload.device_name, enabled=False)
+
     url = f"{COMMS_GW_BASE_URL}/fledge/schedule/disable"
     headers = {"Authorization": get_auth_token()}
     
@@ -1060,6 +1138,11 @@ async def disable_seed_stem_device(payload: response_models.DeviceSchedulePayloa
     response_model=response_models.DeviceScheduleResponseModel
 )
 async def enable_seed_stem_device(payload: response_models.DeviceSchedulePayload):
+    shared_services = placement.services()
+    if placement.find(payload.device_name, shared_services) is not None:
+        placement.set_enabled(payload.device_name, True, shared_services)
+        return response_models.DeviceScheduleResponseModel(device_name=payload.device_name, enabled=True)
+
     url = f"{COMMS_GW_BASE_URL}/fledge/schedule/enable"
     headers = {"Authorization": get_auth_token()}
     
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Code shared by the comms gateway's south plugin, Python filters and north plugins
+
+The package is installed as $FLEDGE_ROOT/python/comms_gateway, which is on the path of every Fledge
+Python plugin and filter script, so they import it rather than carry their own copies.
+"""
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Compact readings of the mqtt-readings-binary south plugin
+
+A compact reading carries the values of a record as one array instead of named datapoints::
+
+    {"schema": "pds", "layout": 1234567890, "values": [...], "timestamp": "...", "topic": "..."}
+
+The ``layout`` ID is a checksum of the datapoint names the values stand for. The south plugin stores those
+names with ``write_layout`` as ``<LAYOUT_DIR>/<schema>.json``; filters and north plugins expand a compact
+reading with ``expand_reading`` when they need named access.
+"""
+
+import json
+import logging
+import os
+import zlib
+
+from comms_gateway import plugin_logging
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+_LOGGER = plugin_logging.setup(__name__, level=logging.WARNING)
+
+_FLEDGE_DATA = os.getenv('FLEDGE_DATA', os.path.join(os.getenv('FLEDGE_ROOT', '/usr/local/fledge'), 'data'))
+LAYOUT_DIR = os.path.join(_FLEDGE_DATA, 'layouts')
+
+# datapoints of a compact reading besides its values
+_HEADER_KEYS = ('schema', 'layout', 'values')
+
+# schema name -> its last read layout document
+_layouts = {}
+# a missing layout is looked for on every reading, but only logged now and then
+_missing = plugin_logging.Sampler(1000)
+
+
+def layout_id(keys):
+    """ Layout ID of the values of the datapoints ``keys``, in order """
+    return zlib.crc32('\n'.join(keys).encode('utf-8'))
+
+
+def write_layout(schema, layout, keys, directory=LAYOUT_DIR):
+    """ Store the datapoint names ``keys`` of layout ``layout`` of ``schema`` as ``<directory>/<schema>.json`` """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, schema + '.json')
+    with open(path + '.tmp', 'w') as layout_file:
+        json.dump({'schema': schema, 'layout': layout, 'keys': list(keys)}, layout_file)
+    # readers never see a partly written layout
+    os.replace(path + '.tmp', path)
+
+
+def compact_keys(schema, layout, directory=LAYOUT_DIR):
+    """ Datapoint names of the values of a compact reading, None when its layout is unknown """
+    cached = _layouts.get(schema)
+    if cached is None or cached['layout'] != layout:
+        try:
+            with open(os.path.join(directory, schema + '.json')) as layout_file:
+                cached = _layouts[schema] = json.load(layout_file)
+        except (OSError, ValueError) as ex:
+            if _missing(schema):
+                _LOGGER.warning("Unable to load the compact layout of %s: %s", schema, str(ex))
+            return None
+    return cached['keys'] if cached['layout'] == layout else None
+
+
+def expand_reading(reading, value=None):
+    """ Named datapoints of a compact reading with string keys; other readings, and those of an unknown layout,
+    are returned as they are. ``value``, when given, converts every value
+    """
+    if 'values' not in reading or 'layout' not in reading:
+        return reading
+    schema = reading['schema']
+    keys = compact_keys(schema.decode('utf-8') if isinstance(schema, bytes) else schema, int(reading['layout']))
+    if keys is None:
+        return reading
+    expanded = {key: item for key, item in reading.items() if key not in _HEADER_KEYS}
+    values = reading['values']
+    expanded.update(zip(keys, values if value is None else map(value, values)))
+    return expanded
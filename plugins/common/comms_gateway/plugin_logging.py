@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Logging of the comms gateway plugins that never holds up the message hot path
+
+``setup`` returns the same logger as ``fledge.common.logger.setup``, but its records only pass through a
+bounded queue: one background thread formats them and hands them to the handlers Fledge configured. A
+record is formatted on that thread, so its arguments are only turned into text there and only when its
+level is enabled; ``Lazy`` defers an expensive argument, such as the hex of a payload, the same way.
+Any other argument that may still change, e.g. a dict, is copied when the record is queued, so a record
+shows the values of the moment it was logged; a ``Lazy`` is only safe over values that never change.
+When the queue is full a record is dropped rather than waited for.
+
+``StructuredMessage`` logs an event with named fields as one JSON object, and a ``Sampler`` lets 1 in N
+events per key through, e.g. one message log per topic every N frames::
+
+    if _LOGGER.isEnabledFor(logging.INFO) and self.log_sampler(msg.topic):
+        _LOGGER.info(StructuredMessage('frame', topic=msg.topic, size=len(msg.payload),
+                                       payload=Lazy(msg.payload.hex)))
+
+Outside Fledge, e.g. in the command line tools and the tests of the plugins, the loggers write to stderr.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+
+try:
+    from fledge.common import logger
+except ImportError:
+    logger = None
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+QUEUE_SIZE = 10000
+# keys are bounded by the device fleet; the cap only guards against a misbehaving publisher
+_MAX_SAMPLED_KEYS = 10000
+
+
+class Lazy(object):
+    """ A log argument computed by ``function(*args)`` only when the record is formatted """
+
+    __slots__ = ['function', 'args']
+
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+
+    def __str__(self):
+        return str(self.function(*self.args))
+
+
+class StructuredMessage(object):
+    """ An event and its fields, rendered as one JSON object when the record is formatted """
+
+    __slots__ = ['event', 'fields']
+
+    def __init__(self, event, **fields):
+        self.event = event
+        self.fields = fields
+
+    def __str__(self):
+        document = {'event': self.event}
+        document.update(self.fields)
+        return json.dumps(document, default=str)
+
+
+class Sampler(object):
+    """ Lets the first and then every ``every``-th event of each key through """
+
+    __slots__ = ['every', '_counts']
+
+    def __init__(self, every):
+        self.every = max(1, every)
+        self._counts = {}
+
+    def __call__(self, key):
+        count = self._counts.get(key, 0)
+        if count == 0 and len(self._counts) >= _MAX_SAMPLED_KEYS:
+            self._counts.clear()
+        self._counts[key] = (count + 1) % self.every
+        return count == 0
+
+
+# argument types a queued record can keep as they are
+_IMMUTABLE = (str, bytes, int, float, complex, bool, type(None), Lazy)
+
+
+def _frozen(value):
+    """ ``value`` as it is now, for a record formatted later """
+    if isinstance(value, _IMMUTABLE):
+        return value
+    try:
+        return copy.deepcopy(value)
+    except Exception:
+        return str(value)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """ Queues records unformatted and drops them when the queue is full """
+
+    def __init__(self, record_queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if isinstance(record.args, tuple):
+            record.args = tuple(_frozen(arg) for arg in record.args)
+        elif isinstance(record.args, dict):
+            record.args = {key: _frozen(arg) for key, arg in record.args.items()}
+        if isinstance(record.msg, StructuredMessage):
+            record.msg = StructuredMessage(record.msg.event,
+                                           **{key: _frozen(field) for key, field in record.msg.fields.items()})
+        if record.exc_info:
+            # rendered while the traceback is still at hand, the message itself is formatted by the listener
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Dispatcher(logging.Handler):
+    """ Hands a record to the handlers of the logger it was logged on """
+
+    def __init__(self):
+        super().__init__()
+        self.handlers = {}
+
+    def emit(self, record):
+        for handler in self.handlers.get(record.name, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+_queue = queue.Queue(QUEUE_SIZE)
+_handler = _QueueHandler(_queue)
+_dispatcher = _Dispatcher()
+_listener = None
+_lock = threading.Lock()
+
+
+def _handlers(log):
+    """ The handlers a record of ``log`` would reach """
+    handlers = []
+    while log is not None:
+        handlers.extend(log.handlers)
+        if not log.propagate:
+            break
+        log = log.parent
+    return handlers
+
+
+def _standalone(name, level):
+    """ A logger writing to stderr, when there is no Fledge to configure one """
+    log = logging.getLogger(name)
+    log.setLevel(level)
+    if not _handlers(log):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        log.addHandler(handler)
+    return log
+
+
+def setup(name, level=logging.WARNING):
+    """ A Fledge logger for ``name`` whose records are written by the background thread """
+    global _listener
+    with _lock:
+        if name in _dispatcher.handlers:
+            # Fledge would add its handlers a second time
+            log = logging.getLogger(name)
+            log.setLevel(level)
+            return log
+        log = logger.setup(name, level=level) if logger is not None else _standalone(name, level)
+        _dispatcher.handlers[name] = _handlers(log)
+        log.handlers = [_handler]
+        log.propagate = False
+        if _listener is None:
+            _listener = logging.handlers.QueueListener(_queue, _dispatcher)
+            _listener.start()
+            atexit.register(_listener.stop)
+    return log
+
+
+def stats():
+    return {'queued': _queue.qsize(), 'dropped': _handler.dropped}
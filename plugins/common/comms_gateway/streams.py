@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Stream types of the readings of the mqtt-readings-binary south plugin
+
+With an asset name template such as ``{asset}_{stream}`` the asset name of a reading ends in its stream
+type; with the default ``{asset}`` only the topic of the reading tells it.
+"""
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+STREAMS = ("pds", "pqs", "ads", "dds")
+STREAM_SUFFIXES = tuple("_" + stream for stream in STREAMS)
+
+
+def asset_stream(elem, stream):
+    """ True for a reading ``elem`` of stream type ``stream``, False for one of another stream type and None
+    when its asset name does not tell, leaving it to the topic
+    """
+    asset = elem.get("asset_code", b"")
+    asset = asset.decode("utf-8") if isinstance(asset, bytes) else asset
+    if asset.endswith("_" + stream):
+        return True
+    return False if asset.endswith(STREAM_SUFFIXES) else None
@@ -1,8 +1,14 @@
 import json
 
+# Readings of another stream type are passed through as they are
+from comms_gateway.streams import asset_stream
+
 # Global variables for configuration values
 config_values = {}
 
+# Stream type of the readings of this filter
+STREAM = "ads"
+
 def set_filter_config(configuration):
     """
     Reads the JSON configuration and stores the necessary values in global variables.
@@ -37,7 +43,7 @@ def find_tap_position(data, ana_ch, tapsubF):
         
     return 0,0  # Return 0 if no tap position matches
 
-def doit(reading):
+def doit(reading, stream=None):
     """
     Processes the reading using the global configuration values.
     """
@@ -47,11 +53,13 @@ def doit(reading):
      # Decode byte keys in `reading`
     reading_c = {k.decode("utf-8") if isinstance(k, bytes) else k: v for k, v in reading.items()}
 
-    # Extract and decode topic safely
-    topic = reading_c.get("topic", b"").decode("utf-8") if isinstance(reading_c.get("topic"), bytes) else reading_c.get("topic", "")
+    # The asset name tells the stream type, older assets only the topic
+    if stream is None:
+        # Extract and decode topic safely
+        topic = reading_c.get("topic", b"").decode("utf-8") if isinstance(reading_c.get("topic"), bytes) else reading_c.get("topic", "")
+        stream = "adstop" in topic
 
-    # Check for "ddstop" in topic
-    if "adstop" in topic:
+    if stream:
 
         # Example channel mapping (ANALOG_CHANNELS from configuration)
         analog_channels = config_values['ANALOG_CHANNELS']
@@ -111,7 +119,9 @@ def doit(reading):
 # process one or more readings
 def calculate_ads_values(readings):
     for elem in list(readings):
-        doit(elem['reading'])
+        stream = asset_stream(elem, STREAM)
+        if stream is not False:
+            doit(elem['reading'], stream)
     return readings
 
 # Main entry point for testing
@@ -0,0 +1,33 @@
+# Compact readings of the mqtt-readings-binary south plugin are expanded for named access
+from comms_gateway.compact import expand_reading
+
+
+def expand(reading):
+    """
+    Named datapoints of a compact reading, keyed like the reading the filter was given.
+    Other readings, and those of an unknown layout, are returned as they are.
+    """
+    # Decode byte keys in `reading`
+    reading_c = {k.decode("utf-8") if isinstance(k, bytes) else k: v for k, v in reading.items()}
+    expanded = expand_reading(reading_c)
+    if expanded is reading_c:
+        return reading
+    return {key.encode("utf-8"): value for key, value in expanded.items()}
+
+
+# process one or more readings
+def expand_compact_readings(readings):
+    """
+    North tasks such as the http_north ones of PDS_POST, PQS_POST, ADS_POST and DDS_POST send readings
+    as they are, so compact readings are expanded to named datapoints first.
+    """
+    for elem in list(readings):
+        elem['reading'] = expand(elem['reading'])
+    return readings
+
+
+#Test the implementation
+if __name__ == "__main__":
+
+    readings = [{'asset_code': b'mqtt-', 'reading': {b'Voltage': 230.0, b'topic': b'dev1/pdstop'}}]
+    print(expand_compact_readings(readings))
@@ -1,6 +1,14 @@
 import json
+import logging
 import requests
 
+# Logs are written by the background thread of the comms gateway's shared logging
+from comms_gateway.plugin_logging import setup as setup_logger
+# Readings of another stream type are passed through as they are
+from comms_gateway.streams import asset_stream
+
+_LOGGER = setup_logger(__name__, level=logging.INFO)
+
 # 🔹 Global dictionary for storing configuration
 config_values = {}
 
@@ -10,6 +18,9 @@ previous_values = {}
 # 🔹 Base URL for fetching previous state
 FLEDGE_BASE_URL = "http://fledge-api:8000"  # Update with actual URL
 
+# Stream type of the readings of this filter
+STREAM = "dds"
+
 def fetch_previous_values(asset):
     """
     Fetches the last known DI values from the Fledge API.
@@ -25,7 +36,7 @@ def fetch_previous_values(asset):
                 previous_values=data[0]["reading"] # Update previous state with last known values
                 #print(previous_values)
     except requests.RequestException as e:
-        print(f"Error fetching previous values: {e}")
+        _LOGGER.warning("Error fetching previous values of %s: %s", asset, e)
         
     return True
 
@@ -56,7 +67,7 @@ def set_filter_config(configuration):
     
     return True
   
-def doit(reading, asset):
+def doit(reading, asset, stream=None):
     """
     Processes the digital input readings and generates events when values change.
     """
@@ -66,11 +77,13 @@ def doit(reading, asset):
     # Decode byte keys in `reading`
     reading_c = {k.decode("utf-8") if isinstance(k, bytes) else k: v for k, v in reading.items()}
 
-    # Extract and decode topic safely
-    topic = reading_c.get("topic", b"").decode("utf-8") if isinstance(reading_c.get("topic"), bytes) else reading_c.get("topic", "")
+    # The asset name tells the stream type, older assets only the topic
+    if stream is None:
+        # Extract and decode topic safely
+        topic = reading_c.get("topic", b"").decode("utf-8") if isinstance(reading_c.get("topic"), bytes) else reading_c.get("topic", "")
+        stream = "ddstop" in topic
 
-    # Check for "ddstop" in topic
-    if "ddstop" in topic:
+    if stream:
    
         if "Digi1" not in previous_values:
             fetch_previous_values(asset)  # Fetch previous values if not already stored
@@ -133,8 +146,8 @@ def doit(reading, asset):
         # Sort events by channel position before storing in `reading`
         events.sort(key=lambda x: x[0])  
 
-        if events:
-            print("Generated Events:", [e[1] for e in events])
+        if events and _LOGGER.isEnabledFor(logging.INFO):
+            _LOGGER.info("Generated events of %s: %s", asset, [e[1] for e in events])
 
         for channel_pos, event in events:
             for key, value in event.items():
@@ -147,8 +160,11 @@ def generate_di_events(readings):
     Wrapper function that processes readings and generates DI events.
     """
     for reading in list(readings):
+        stream = asset_stream(reading, STREAM)
+        if stream is False:
+            continue
         asset = reading.get("asset_code", b"").decode("utf-8")
-        doit(reading['reading'],asset)
+        doit(reading['reading'],asset,stream)
     return readings
 
 # 🔹 Test the implementation
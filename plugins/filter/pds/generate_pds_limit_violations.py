@@ -1,11 +1,19 @@
 import json
 
+# Compact readings of the mqtt-readings-binary south plugin are expanded for named access
+from comms_gateway.compact import expand_reading
+# Readings of another stream type are passed through as they are
+from comms_gateway.streams import asset_stream
+
 
 
 # Global variable to store limits
 LIMITS = {}
 MAX_LIMIT_VIOLATION = 10
 
+# Stream type of the readings of this filter
+STREAM = "pds"
+
 def set_filter_config(configuration):
     """
     Reads the JSON configuration and stores the necessary values in the LIMITS dictionary.
@@ -24,7 +32,7 @@ def set_filter_config(configuration):
 
     return True
 
-def doit(reading):
+def doit(reading, stream=None):
     """
     Check if sensor readings exceed predefined limits and append limit violation info.
     """
@@ -35,11 +43,16 @@ def doit(reading):
      # Decode byte keys in `reading`
     reading_c = {k.decode("utf-8") if isinstance(k, bytes) else k: v for k, v in reading.items()}
 
-    # Extract and decode topic safely
-    topic = reading_c.get("topic", b"").decode("utf-8") if isinstance(reading_c.get("topic"), bytes) else reading_c.get("topic", "")
+    # The asset name tells the stream type, older assets only the topic
+    if stream is None:
+        # Extract and decode topic safely
+        topic = reading_c.get("topic", b"").decode("utf-8") if isinstance(reading_c.get("topic"), bytes) else reading_c.get("topic", "")
+        stream = "pdstop" in topic
+
+    if stream:
 
-    # Check for "pdstop" in topic
-    if "pdstop" in topic:
+      # Named access is only needed from here on
+      reading_c = expand_reading(reading_c)
 
       for param, value in reading_c.items():
           if param in LIMITS and recorded_count < MAX_LIMIT_VIOLATION:
@@ -76,7 +89,9 @@ def doit(reading):
 # process one or more readings
 def generate_pds_limit_violations(readings):
     for elem in list(readings):
-        doit(elem['reading'])
+        stream = asset_stream(elem, STREAM)
+        if stream is not False:
+            doit(elem['reading'], stream)
     return readings
 
 
@@ -2,10 +2,13 @@ import asyncio
 import websockets
 import json
 import logging
-from fledge.common import logger
 
-# Configure logging
-_LOGGER = logger.setup(__name__, level=logging.INFO)
+# Configure logging, written by the background thread of the comms gateway's shared logging
+from comms_gateway.plugin_logging import setup as setup_logger
+# Compact readings of the mqtt-readings-binary south plugin are sent with named datapoints
+from comms_gateway.compact import expand_reading
+
+_LOGGER = setup_logger(__name__, level=logging.INFO)
 
 def stream_to_websocket(readings):
     """
@@ -25,6 +28,8 @@ def stream_to_websocket(readings):
                for reading in list(readings):
                     # Decode byte-encoded keys and values
                     decoded_reading = convert_bytes_to_str(reading)
+                    # Consumers expect named datapoints
+                    decoded_reading["reading"] = expand_reading(decoded_reading.get("reading", {}))
 
                     # Serialize to JSON and send over WebSocket
                     message = json.dumps(decoded_reading)
@@ -59,4 +64,4 @@ def convert_bytes_to_str(data):
     elif isinstance(data, bytes):
         return data.decode('utf-8')
     else:
-        return data
\ No newline at end of file
+        return data
@@ -13,15 +13,17 @@ import base64
 import websockets
 import numpy as np
 
-from fledge.common import logger
 from fledge.plugins.north.common.common import *
+from comms_gateway.compact import expand_reading
+from comms_gateway.plugin_logging import setup as _setup_logger
 
 __author__ = "Sanjeev Kumar"
 __copyright__ = "Copyright (c) 2017 OrxaGrid, Ltd"
 __license__ = "Apache 2.0"
 __version__ = "${VERSION}"
 
-_LOGGER = logger.setup(__name__, level=logging.INFO)
+# logs are written by the background thread of the comms gateway's shared logging
+_LOGGER = _setup_logger(__name__, level=logging.INFO)
 
 ws_north = None
 config = ""
@@ -127,7 +129,7 @@ class WebSocketNorthPlugin:
                 last_object_id = p["id"]
                 read = {
                     "asset": p["asset_code"],
-                    "readings": p["reading"],
+                    "readings": expand_reading(p["reading"], float),
                     "timestamp": p["user_ts"]
                 }
                 for k, v in read["readings"].items():
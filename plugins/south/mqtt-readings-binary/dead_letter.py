@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Dead-letter spool for frames that could not be decoded
+
+Undecodable frames are appended raw to a spool file instead of being ingested as readings. Each record
+is a fixed header followed by the topic, the failure reason and the payload:
+
+    magic        4 bytes, b'DLQ1'
+    received     float64, epoch seconds the frame was received
+    topic size   uint16
+    reason size  uint16
+    payload size uint32
+
+When the spool reaches ``max_size`` bytes it is moved aside to ``<path>.1``, replacing the previous one,
+so at most twice ``max_size`` bytes are kept.
+
+Once a schema is fixed the spool can be decoded offline::
+
+    python3 dead_letter.py <spool> [--schemas <dir>] [--stream <name>]
+
+which prints one JSON reading per record that decodes, and the reason for every record that still fails.
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+MAGIC = b'DLQ1'
+_HEADER = struct.Struct('<4sdHHI')
+# topic and reason sizes are uint16
+_MAX_TEXT = 0xFFFF
+
+_FLEDGE_DATA = os.getenv('FLEDGE_DATA', os.path.join(os.getenv('FLEDGE_ROOT', '/usr/local/fledge'), 'data'))
+DEFAULT_SPOOL_DIR = os.path.join(_FLEDGE_DATA, 'dead-letters')
+
+
+class DeadLetter(object):
+    """ One spooled frame """
+
+    __slots__ = ['received', 'topic', 'reason', 'payload']
+
+    def __init__(self, received, topic, reason, payload):
+        self.received = received
+        self.topic = topic
+        self.reason = reason
+        self.payload = payload
+
+
+class DeadLetterSpool(object):
+    """ Size-capped, append-only spool file of undecodable frames """
+
+    __slots__ = ['path', 'max_size', 'count', 'bytes_written', 'rotations', 'write_errors', '_file', '_size']
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self.count = 0
+        self.bytes_written = 0
+        self.rotations = 0
+        self.write_errors = 0
+        self._file = None
+        self._size = 0
+
+    def continue_from(self, spool):
+        """ Carry on the counters of ``spool``, the spool this one replaces """
+        self.count += spool.count
+        self.bytes_written += spool.bytes_written
+        self.rotations += spool.rotations
+        self.write_errors += spool.write_errors
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'ab')
+        self._size = self._file.tell()
+
+    def append(self, topic, payload, reason, received=None):
+        """ Spool one frame; returns False when the spool file could not be written """
+        topic = topic.encode('utf-8', 'replace')[:_MAX_TEXT]
+        reason = reason.encode('utf-8', 'replace')[:_MAX_TEXT]
+        payload = bytes(payload)
+        record = _HEADER.pack(MAGIC, time.time() if received is None else received, len(topic), len(reason),
+                              len(payload)) + topic + reason + payload
+        try:
+            if self._file is None:
+                self._open()
+            if self._size and self._size + len(record) > self.max_size:
+                self._rotate()
+            self._file.write(record)
+            self._file.flush()
+        except OSError:
+            self.write_errors += 1
+            self.close()
+            return False
+        self._size += len(record)
+        self.bytes_written += len(record)
+        self.count += 1
+        return True
+
+    def _rotate(self):
+        self._file.close()
+        os.replace(self.path, self.path + '.1')
+        self.rotations += 1
+        self._open()
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def stats(self):
+        return {'spooled': self.count, 'bytes': self.bytes_written, 'rotations': self.rotations,
+                'write_errors': self.write_errors}
+
+
+def read_spool(path):
+    """ Yield the DeadLetters of a spool file, oldest first; a torn last record is skipped """
+    with open(path, 'rb') as spool:
+        data = spool.read()
+    offset = 0
+    while offset + _HEADER.size <= len(data):
+        magic, received, topic_size, reason_size, payload_size = _HEADER.unpack_from(data, offset)
+        if magic != MAGIC:
+            raise ValueError("{} is not a dead-letter spool, bad record at offset {}".format(path, offset))
+        start = offset + _HEADER.size
+        end = start + topic_size + reason_size + payload_size
+        if end > len(data):
+            break
+        topic = data[start:start + topic_size].decode('utf-8', 'replace')
+        reason = data[start + topic_size:start + topic_size + reason_size].decode('utf-8', 'replace')
+        yield DeadLetter(received, topic, reason, data[end - payload_size:end])
+        offset = end
+
+
+def main(argv=None):
+    """ Re-decode a dead-letter spool with the current frame schemas """
+    from schema_registry import SchemaRegistry
+    from topic_router import DEFAULT_ROUTES, TopicRouter
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('spool', help='spool file to decode')
+    parser.add_argument('--schemas', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='directory of the frame schema files (default: the plugin directory)')
+    parser.add_argument('--stream', help='decode every frame as this stream type instead of routing its topic')
+    args = parser.parse_args(argv)
+
+    schemas = SchemaRegistry(args.schemas)
+    schemas.load()
+    router = TopicRouter(DEFAULT_ROUTES['streams'], DEFAULT_ROUTES['revisions'])
+    decoded = failed = 0
+    for letter in read_spool(args.spool):
+        route = router.route(letter.topic)
+        stream = args.stream or (route.stream if route is not None else None)
+        topic_schema = route.schema if route is not None and not args.stream else stream
+        schema_name = schemas.detect(stream, len(letter.payload), topic_schema) if stream else None
+        try:
+            if schema_name is None:
+                raise ValueError("No frame schema for topic {}".format(letter.topic))
+            schema = schemas.get(schema_name)
+            for values in schema.unpack_records(letter.payload):
+                print(json.dumps({'received': letter.received, 'schema': schema_name,
+                                  'reading': schema.reading(values, letter.topic)}))
+            decoded += 1
+        except Exception as ex:
+            failed += 1
+            print("{} {} ({} bytes): {} [spooled: {}]".format(letter.received, letter.topic, len(letter.payload),
+                                                               ex, letter.reason), file=sys.stderr)
+    print("{} frames decoded, {} still failing".format(decoded, failed), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
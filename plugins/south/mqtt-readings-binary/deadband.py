@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Report-by-exception filtering of readings against the deadbands of their frame schema
+
+Stable feeders report the same values frame after frame. For a schema with a ``deadband`` (see
+schema_registry) the datapoints that stayed within their band around the last value reported for the
+device are removed from a reading, and a reading left with no datapoint at all is not ingested. The first
+reading of a device, and the first one after every ``integrity_interval`` seconds of RTC time, is
+reported whole and restarts the bands.
+"""
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+# always kept, they are no measurement
+_CONTEXT_KEYS = ('timestamp', 'topic')
+
+
+class DeviceReport(object):
+    """ Last reported datapoint values of one (stream type, device) pair """
+
+    __slots__ = ['values', 'integrity_at']
+
+    def __init__(self):
+        self.values = {}
+        self.integrity_at = None
+
+
+class ReportByException(object):
+    """ Applies the deadbands of frame schemas per (stream type, device) """
+
+    __slots__ = ['_devices']
+
+    def __init__(self):
+        self._devices = {}
+
+    def filter(self, schema, route, rtc, reading, metrics):
+        """ Strip the unchanged datapoints of ``reading``, whose RTC is ``rtc`` epoch seconds or None; returns
+        None when nothing changed. Readings of a schema without a deadband are returned as they are.
+        """
+        deadband = schema.deadband
+        if deadband is None:
+            return reading
+        try:
+            report = self._devices[route.stream, route.device]
+        except KeyError:
+            report = self._devices[route.stream, route.device] = DeviceReport()
+        last = report.values
+        if report.integrity_at is None or (schema.integrity_interval is not None and rtc is not None and not
+                                           0 <= rtc - report.integrity_at < schema.integrity_interval):
+            report.integrity_at = rtc if rtc is not None else report.integrity_at or 0
+            last.clear()
+            last.update((key, reading[key]) for key in deadband if key in reading)
+            return reading
+        changed = False
+        for key, (absolute, percent) in deadband.items():
+            if key not in reading:
+                continue
+            value = reading[key]
+            previous = last.get(key)
+            if previous is None or _moved(value, previous, absolute, percent):
+                last[key] = value
+                changed = True
+            else:
+                del reading[key]
+        if changed or any(key not in deadband and key not in _CONTEXT_KEYS for key in reading):
+            return reading
+        metrics.suppressed += 1
+        return None
+
+
+def _moved(value, previous, absolute, percent):
+    try:
+        return abs(value - previous) > max(absolute, abs(previous) * percent / 100.0)
+    except TypeError:
+        # strings and other values without a distance report on any change
+        return value != previous
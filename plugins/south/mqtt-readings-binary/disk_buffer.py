@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Disk-backed ring buffer between MQTT receive and ingest
+
+DiskFrameQueue is a drop-in replacement of the in-memory FrameQueue that parks raw frames in a fixed-size,
+memory-mapped file instead of RAM. The file survives a restart of the south service: frames that were
+received but not yet ingested are decoded after the restart. A crash of the service process loses nothing
+either, its writes are in the page cache already; the ring is only written through to the disk on
+``release`` and on an ``ack`` at most once per FLUSH_INTERVAL seconds, so a crash of the host may lose the
+frames of the last interval.
+
+The file starts with a one page header (magic, data capacity, head, tail, used bytes, frame count and
+overflow count) followed by the data ring. Each frame is stored as
+
+    payload size  uint32
+    received      float64, epoch seconds
+    topic size    uint16
+    topic, payload
+
+A frame that does not fit before the end of the ring is written at its start instead, after a wrap marker.
+Frames taken by the worker stay in the file until ``ack`` once they were ingested, so a restart replays
+them rather than losing them.
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+
+from ingest_worker import BLOCK, DROP_OLDEST
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+_FLEDGE_DATA = os.getenv('FLEDGE_DATA', os.path.join(os.getenv('FLEDGE_ROOT', '/usr/local/fledge'), 'data'))
+DEFAULT_BUFFER_DIR = os.path.join(_FLEDGE_DATA, 'buffers')
+
+MAGIC = b'MQTTRNG1'
+_HEADER = struct.Struct('<8sQQQQQQ')
+_DATA_OFFSET = mmap.PAGESIZE
+_RECORD = struct.Struct('<IdH')
+_WRAP = 0xFFFFFFFF
+_WRAP_MARKER = struct.Struct('<I')
+
+# frames handed to the worker per take, the rest waits on disk
+DRAIN_BATCH = 1000
+# seconds between two writes of the ring through to the disk
+FLUSH_INTERVAL = 1.0
+
+
+class BufferedFrame(object):
+    """ A frame read back from the ring, standing in for the paho MQTTMessage it was received as """
+
+    __slots__ = ['topic', 'payload', 'timestamp', 'qos']
+
+    def __init__(self, topic, payload, timestamp):
+        self.topic = topic
+        self.payload = payload
+        # monotonic, like MQTTMessage.timestamp
+        self.timestamp = timestamp
+        self.qos = None
+
+
+class DiskFrameQueue(object):
+    """ Bounded, thread-safe, persistent FIFO of frames with the FrameQueue interface
+
+    ``put`` stores the topic and payload of a (route, msg) item; ``take_all`` re-routes the frames it
+    reads back through ``route(topic)``, frames of a topic no longer routed go to ``unrouted(frame)``
+    when set. When the ring is full the stream's backpressure policy applies;
+    drop-oldest evicts the oldest frames of any stream type.
+    """
+
+    persistent = True
+
+    __slots__ = ['path', 'capacity', 'route', 'unrouted', 'default_policy', 'policies', 'on_ready', 'closed',
+                 'high_water', 'blocked', 'dropped', 'overflows', '_file', '_map', '_head', '_tail', '_used', '_count',
+                 '_cursor', '_taken', '_taken_bytes', '_flushed', '_lock', '_not_full']
+
+    def __init__(self, path, capacity, route, default_policy=BLOCK, policies=None):
+        self.path = path
+        self.capacity = capacity
+        self.route = route
+        self.unrouted = None
+        self.default_policy = default_policy
+        self.policies = policies or {}
+        self.on_ready = None
+        self.closed = False
+        self.high_water = 0
+        self.blocked = 0
+        self.dropped = {}
+        self.overflows = 0
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._taken = 0
+        self._taken_bytes = 0
+        self._flushed = time.monotonic()
+        self._open()
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a+b')
+        try:
+            # two services on one ring file would corrupt it
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._file.close()
+            raise
+        size = _DATA_OFFSET + self.capacity
+        if os.fstat(self._file.fileno()).st_size != size:
+            self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        magic, capacity, head, tail, used, count, overflows = _HEADER.unpack_from(self._map, 0)
+        if magic == MAGIC and capacity == self.capacity and head < capacity and tail < capacity and used <= capacity:
+            self._head, self._tail, self._used, self._count, self.overflows = head, tail, used, count, overflows
+        else:
+            self._head = self._tail = self._used = self._count = 0
+            self._sync_header()
+        self._cursor = self._head
+
+    def _sync_header(self):
+        _HEADER.pack_into(self._map, 0, MAGIC, self.capacity, self._head, self._tail, self._used, self._count,
+                          self.overflows)
+
+    def put(self, stream, item):
+        """ Store the frame of a (route, msg) item; returns False when it was dropped """
+        msg = item[1]
+        topic = msg.topic.encode('utf-8')[:0xFFFF]
+        payload = msg.payload
+        size = _RECORD.size + len(topic) + len(payload)
+        with self._lock:
+            if self.closed:
+                return False
+            if size > self.capacity:
+                self._drop(stream)
+                return False
+            while self._space_needed(size) > self.capacity - self._used:
+                if not self._make_room(stream):
+                    self._drop(stream)
+                    return False
+                if self.closed:
+                    return False
+            was_empty = len(self) == 0
+            self._write(topic, payload, size)
+            if len(self) > self.high_water:
+                self.high_water = len(self)
+        if was_empty and self.on_ready is not None:
+            self.on_ready()
+        return True
+
+    def _space_needed(self, size):
+        if self._tail + size > self.capacity:
+            # the frame goes to the start of the ring, the end of it is skipped
+            return size + self.capacity - self._tail
+        return size
+
+    def _write(self, topic, payload, size):
+        if self._tail + size > self.capacity:
+            skipped = self.capacity - self._tail
+            if skipped >= _WRAP_MARKER.size:
+                _WRAP_MARKER.pack_into(self._map, _DATA_OFFSET + self._tail, _WRAP)
+            self._used += skipped
+            self._tail = 0
+        offset = _DATA_OFFSET + self._tail
+        _RECORD.pack_into(self._map, offset, len(payload), time.time(), len(topic))
+        offset += _RECORD.size
+        self._map[offset:offset + len(topic)] = topic
+        offset += len(topic)
+        self._map[offset:offset + len(payload)] = payload
+        self._tail = (self._tail + size) % self.capacity
+        self._used += size
+        self._count += 1
+        self._sync_header()
+
+    def _make_room(self, stream):
+        policy = self.policies.get(stream, self.default_policy)
+        if policy == BLOCK:
+            self.blocked += 1
+            self._not_full.wait(1.0)
+            return True
+        if policy == DROP_OLDEST and self._count and not self._taken:
+            # while the worker holds taken frames the oldest ones are not evictable, the new frame is dropped
+            self._read_at(self._head, evict=True)
+            self._drop(stream)
+            return True
+        return False
+
+    def _drop(self, stream):
+        self.dropped[stream] = self.dropped.get(stream, 0) + 1
+        self.overflows += 1
+        self._sync_header()
+
+    def _read_at(self, position, evict=False):
+        """ Read the frame at ``position``; returns (frame, position after it, bytes it occupied) """
+        skipped = 0
+        if self.capacity - position < _RECORD.size or _WRAP_MARKER.unpack_from(
+                self._map, _DATA_OFFSET + position)[0] == _WRAP:
+            skipped = self.capacity - position
+            position = 0
+        offset = _DATA_OFFSET + position
+        payload_size, received, topic_size = _RECORD.unpack_from(self._map, offset)
+        offset += _RECORD.size
+        size = _RECORD.size + topic_size + payload_size
+        if evict:
+            self._head = self._cursor = (position + size) % self.capacity
+            self._used -= skipped + size
+            self._count -= 1
+            return None
+        topic = bytes(self._map[offset:offset + topic_size]).decode('utf-8', 'replace')
+        offset += topic_size
+        payload = bytes(self._map[offset:offset + payload_size])
+        # a receive time from before a restart still yields the right queue wait
+        frame = BufferedFrame(topic, payload, time.monotonic() - (time.time() - received))
+        return frame, (position + size) % self.capacity, skipped + size
+
+    def take_all(self):
+        """ Return up to DRAIN_BATCH waiting (stream, (route, frame)) pairs; they stay on disk until ``ack`` """
+        items = []
+        with self._lock:
+            frames = []
+            if self._map.closed:
+                return items
+            while self._count - self._taken and len(frames) < DRAIN_BATCH:
+                frame, self._cursor, size = self._read_at(self._cursor)
+                self._taken += 1
+                self._taken_bytes += size
+                frames.append(frame)
+        for frame in frames:
+            route = self.route(frame.topic)
+            if route is not None:
+                items.append((route.stream, (route, frame)))
+            elif self.unrouted is not None:
+                # buffered before a reconfiguration removed its topic; acked with the others
+                self.unrouted(frame)
+        return items
+
+    def ack(self):
+        """ Release the frames of the last ``take_all`` once they were ingested """
+        with self._lock:
+            if not self._taken or self._map.closed:
+                return
+            self._head = self._cursor
+            self._used -= self._taken_bytes
+            self._count -= self._taken
+            self._taken = self._taken_bytes = 0
+            if not self._count:
+                self._head = self._tail = self._cursor = self._used = 0
+            self._sync_header()
+            self._not_full.notify_all()
+            now = time.monotonic()
+            if now - self._flushed >= FLUSH_INTERVAL:
+                self._map.flush()
+                self._flushed = now
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            self._not_full.notify_all()
+
+    def release(self):
+        """ Flush the ring to disk and unmap it; frames not acknowledged are replayed by the next start
+
+        Only once the worker thread has exited: ``take_all`` and ``ack`` of a consumer still running find the
+        ring unmapped and leave its frames to the next start.
+        """
+        with self._lock:
+            if self._map.closed:
+                return
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+
+    def __len__(self):
+        return self._count - self._taken
+
+    def stats(self):
+        return {'depth': len(self), 'high_water': self.high_water, 'blocked': self.blocked,
+                'dropped': dict(self.dropped), 'fill': round(self._used / self.capacity, 4),
+                'overflows': self.overflows}
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Compressed archive of raw frames, indexed by device and RTC time
+
+A decoded frame stored as a JSON reading is about ten times the size of the frame itself. With the
+archive enabled every decodable frame is also appended raw to a directory of segment files, so months of
+history fit on the gateway disk and can be decoded on demand.
+
+Frames are collected into blocks of about ``block_size`` bytes, each zlib compressed and appended to the
+current segment ``<epoch it was opened>.seg``. A block starts with a header
+
+    magic           4 bytes, b'ARB1'
+    compressed size uint32
+    raw size        uint32
+
+and holds records of
+
+    rtc             int64, epoch seconds of the RTC of the first record, -1 when it is no valid date
+    received        float64, epoch seconds
+    device size     uint16
+    topic size      uint16
+    payload size    uint32
+    device, topic, payload
+
+Every block written adds one JSON line to the segment's ``.idx`` index: its offset and size, the RTC
+range and the devices of its frames, so a read only decompresses the blocks it needs. A segment is
+closed once it reaches ``segment_size`` bytes; the oldest segments are deleted while the archive exceeds
+``max_size`` bytes.
+
+The archive is decoded with the current frame schemas by::
+
+    python3 frame_archive.py <archive directory> [--from <time>] [--to <time>] [--device <id>] [--schemas <dir>]
+
+with times in the RTC format of the readings, e.g. ``2025-06-01 00:00:00``.
+"""
+
+import argparse
+import calendar
+import glob
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+MAGIC = b'ARB1'
+_BLOCK = struct.Struct('<4sII')
+_RECORD = struct.Struct('<qdHHI')
+_MAX_TEXT = 0xFFFF
+NO_RTC = -1
+
+_FLEDGE_DATA = os.getenv('FLEDGE_DATA', os.path.join(os.getenv('FLEDGE_ROOT', '/usr/local/fledge'), 'data'))
+DEFAULT_ARCHIVE_DIR = os.path.join(_FLEDGE_DATA, 'archive')
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+# a partly filled block is written with the first frame after it got this many seconds old
+DEFAULT_BLOCK_LINGER = 60.0
+
+
+class ArchivedFrame(object):
+    """ One archived frame """
+
+    __slots__ = ['rtc', 'received', 'device', 'topic', 'payload']
+
+    def __init__(self, rtc, received, device, topic, payload):
+        self.rtc = rtc
+        self.received = received
+        self.device = device
+        self.topic = topic
+        self.payload = payload
+
+
+class FrameArchive(object):
+    """ Appends raw frames to compressed, indexed, size-capped segment files of a directory """
+
+    __slots__ = ['directory', 'segment_size', 'max_size', 'block_size', 'block_linger', 'frames', 'blocks',
+                 'raw_bytes', 'compressed_bytes', 'write_errors', '_segment', '_index', '_segment_bytes',
+                 '_block', '_block_bytes', '_block_frames', '_block_devices', '_block_rtc', '_block_started']
+
+    def __init__(self, directory, segment_size, max_size, block_size=DEFAULT_BLOCK_SIZE,
+                 block_linger=DEFAULT_BLOCK_LINGER):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_size = max_size
+        self.block_size = block_size
+        self.block_linger = block_linger
+        self.frames = 0
+        self.blocks = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.write_errors = 0
+        self._segment = None
+        self._index = None
+        self._segment_bytes = 0
+        self._new_block()
+
+    def _new_block(self):
+        self._block = []
+        self._block_bytes = 0
+        self._block_frames = 0
+        self._block_devices = set()
+        self._block_rtc = None
+        self._block_started = None
+
+    def append(self, device, topic, payload, rtc, received):
+        """ Archive one frame; ``rtc`` are the epoch seconds of its first record, or None """
+        device = device.encode('utf-8', 'replace')[:_MAX_TEXT]
+        topic = topic.encode('utf-8', 'replace')[:_MAX_TEXT]
+        payload = bytes(payload)
+        rtc = NO_RTC if rtc is None else int(rtc)
+        self._block.append(_RECORD.pack(rtc, received, len(device), len(topic), len(payload)))
+        self._block.extend((device, topic, payload))
+        self._block_bytes += _RECORD.size + len(device) + len(topic) + len(payload)
+        self._block_frames += 1
+        self._block_devices.add(device)
+        if rtc != NO_RTC:
+            low, high = self._block_rtc or (rtc, rtc)
+            self._block_rtc = (min(low, rtc), max(high, rtc))
+        now = time.monotonic()
+        if self._block_started is None:
+            self._block_started = now
+        self.frames += 1
+        if self._block_bytes >= self.block_size or now - self._block_started >= self.block_linger:
+            self.flush()
+
+    def flush(self):
+        """ Compress and write the current block """
+        if not self._block_frames:
+            return
+        raw = b''.join(self._block)
+        self.raw_bytes += len(raw)
+        compressed = zlib.compress(raw)
+        entry = {'offset': None, 'size': _BLOCK.size + len(compressed), 'frames': self._block_frames,
+                 'rtc': list(self._block_rtc) if self._block_rtc else None,
+                 'devices': sorted(device.decode('utf-8', 'replace') for device in self._block_devices)}
+        self._new_block()
+        try:
+            if self._segment is None or self._segment_bytes >= self.segment_size:
+                self._open_segment()
+            entry['offset'] = self._segment_bytes
+            self._segment.write(_BLOCK.pack(MAGIC, len(compressed), len(raw)) + compressed)
+            self._segment.flush()
+            self._index.write(json.dumps(entry) + '\n')
+            self._index.flush()
+        except OSError:
+            self.write_errors += 1
+            self.close()
+            return
+        self._segment_bytes += entry['size']
+        self.compressed_bytes += entry['size']
+        self.blocks += 1
+
+    def _open_segment(self):
+        self._close_segment()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, '{:.6f}.seg'.format(time.time()))
+        self._segment = open(path, 'ab')
+        self._index = open(path[:-len('.seg')] + '.idx', 'a')
+        self._segment_bytes = self._segment.tell()
+        self._expire()
+
+    def _expire(self):
+        """ Delete the oldest segments while the archive is larger than ``max_size`` """
+        segments = sorted(glob.glob(os.path.join(self.directory, '*.seg')), key=_segment_start)
+        sizes = [os.path.getsize(path) for path in segments]
+        total = sum(sizes)
+        # never the segment just opened
+        for path, size in zip(segments[:-1], sizes):
+            if total <= self.max_size:
+                break
+            for name in (path, path[:-len('.seg')] + '.idx'):
+                try:
+                    os.remove(name)
+                except OSError:
+                    pass
+            total -= size
+
+    def _close_segment(self):
+        for handle in (self._segment, self._index):
+            if handle is not None:
+                try:
+                    handle.close()
+                except OSError:
+                    pass
+        self._segment = self._index = None
+
+    def close(self):
+        """ Write the pending block and close the segment """
+        self.flush()
+        self._close_segment()
+
+    def stats(self):
+        return {'frames': self.frames, 'blocks': self.blocks, 'raw_bytes': self.raw_bytes,
+                'compressed_bytes': self.compressed_bytes, 'write_errors': self.write_errors}
+
+
+def _segment_start(path):
+    try:
+        return float(os.path.basename(path)[:-len('.seg')])
+    except ValueError:
+        return 0.0
+
+
+def read_archive(directory, start=None, end=None, devices=None):
+    """ Yield the ArchivedFrames of an archive directory whose RTC lies in [start, end], oldest segment first
+
+    ``start`` and ``end`` are epoch seconds, None for unbounded; ``devices`` limits the frames to a
+    collection of device IDs. Frames without a valid RTC are only yielded when the range is unbounded.
+    """
+    bounded = start is not None or end is not None
+    low = float('-inf') if start is None else start
+    high = float('inf') if end is None else end
+    for segment in sorted(glob.glob(os.path.join(directory, '*.seg')), key=_segment_start):
+        try:
+            with open(segment[:-len('.seg')] + '.idx', 'r') as index:
+                entries = [json.loads(line) for line in index if line.strip()]
+        except (OSError, ValueError):
+            continue
+        with open(segment, 'rb') as data:
+            for entry in entries:
+                rtc = entry.get('rtc')
+                if bounded and (rtc is None or rtc[1] < low or rtc[0] > high):
+                    continue
+                if devices is not None and not set(entry['devices']) & set(devices):
+                    continue
+                data.seek(entry['offset'])
+                block = data.read(entry['size'])
+                magic, compressed_size, raw_size = _BLOCK.unpack_from(block)
+                if magic != MAGIC or len(block) != _BLOCK.size + compressed_size:
+                    raise ValueError("{} has a bad block at offset {}".format(segment, entry['offset']))
+                raw = zlib.decompress(block[_BLOCK.size:])
+                for frame in _records(raw):
+                    if bounded and (frame.rtc == NO_RTC or not low <= frame.rtc <= high):
+                        continue
+                    if devices is not None and frame.device not in devices:
+                        continue
+                    yield frame
+
+
+def _records(raw):
+    offset = 0
+    while offset < len(raw):
+        rtc, received, device_size, topic_size, payload_size = _RECORD.unpack_from(raw, offset)
+        offset += _RECORD.size
+        device = raw[offset:offset + device_size].decode('utf-8', 'replace')
+        offset += device_size
+        topic = raw[offset:offset + topic_size].decode('utf-8', 'replace')
+        offset += topic_size
+        yield ArchivedFrame(rtc, received, device, topic, raw[offset:offset + payload_size])
+        offset += payload_size
+
+
+def parse_time(value):
+    """ Epoch seconds of a time in the RTC format of the readings, ``YYYY-MM-DD[ HH:MM:SS]`` """
+    for layout in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return calendar.timegm(time.strptime(value, layout))
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError("'{}' is not a YYYY-MM-DD[ HH:MM:SS] time".format(value))
+
+
+def main(argv=None):
+    """ Decode the archived frames of a time range with the current frame schemas """
+    from schema_registry import SchemaRegistry
+    from topic_router import DEFAULT_ROUTES, TopicRouter
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('archive', help='archive directory to read')
+    parser.add_argument('--from', dest='start', type=parse_time, help='first RTC time to decode')
+    parser.add_argument('--to', dest='end', type=parse_time, help='last RTC time to decode')
+    parser.add_argument('--device', action='append', help='decode only frames of this device, repeatable')
+    parser.add_argument('--schemas', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='directory of the frame schema files (default: the plugin directory)')
+    args = parser.parse_args(argv)
+
+    schemas = SchemaRegistry(args.schemas)
+    schemas.load()
+    router = TopicRouter(DEFAULT_ROUTES['streams'], DEFAULT_ROUTES['revisions'])
+    decoded = failed = 0
+    for frame in read_archive(args.archive, args.start, args.end, args.device):
+        route = router.route(frame.topic)
+        schema_name = schemas.detect(route.stream, len(frame.payload), route.schema) if route is not None else None
+        try:
+            if schema_name is None:
+                raise ValueError("No frame schema for topic {}".format(frame.topic))
+            schema = schemas.get(schema_name)
+            for values in schema.unpack_records(frame.payload):
+                print(json.dumps({'device': frame.device, 'received': frame.received, 'schema': schema_name,
+                                  'reading': schema.reading(values, frame.topic)}))
+            decoded += 1
+        except Exception as ex:
+            failed += 1
+            print("{} {} ({} bytes): {}".format(frame.received, frame.topic, len(frame.payload), ex), file=sys.stderr)
+    print("{} frames decoded, {} failed".format(decoded, failed), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
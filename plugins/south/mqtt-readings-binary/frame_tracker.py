@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Duplicate suppression and RTC sequence tracking of the frames of each device
+
+With QoS 1 a device resends the frames it has no PUBACK for after a reconnect, and the broker redelivers
+unacknowledged ones. A FrameTracker remembers the last ``cache_size`` frames of every (stream type, device)
+pair, keyed by the RTC of their first record and a hash of their payload, and reports a frame it has
+already seen so it is dropped before it is decoded.
+
+The RTC of every record, read straight from the payload, also feeds the sequence of its device:
+
+    reorders  a record whose RTC is older than the newest one seen
+    gaps      a step between consecutive records of more than GAP_FACTOR times the device's period, the
+              smallest step seen so far
+"""
+
+import collections
+
+from schema_registry import rtc_seconds
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+GAP_FACTOR = 1.5
+
+
+class DeviceSequence(object):
+    """ Recently seen frames and the RTC sequence of one (stream type, device) pair """
+
+    __slots__ = ['seen', 'last_rtc', 'period']
+
+    def __init__(self):
+        self.seen = collections.OrderedDict()
+        self.last_rtc = None
+        self.period = None
+
+
+class FrameTracker(object):
+    """ LRU duplicate cache and sequence counters per (stream type, device) """
+
+    __slots__ = ['cache_size', '_devices']
+
+    def __init__(self, cache_size):
+        self.cache_size = cache_size
+        self._devices = {}
+
+    def check(self, schema, route, payload, metrics):
+        """ Return True when ``payload`` repeats a recently seen frame of the route's device
+
+        Counts duplicates, gaps and reorders on ``metrics``. Payloads that are not a whole number of
+        ``schema`` records are left to fail decoding.
+        """
+        count, remainder = divmod(len(payload), schema.size)
+        if remainder or not count:
+            return False
+        try:
+            sequence = self._devices[route.stream, route.device]
+        except KeyError:
+            sequence = self._devices[route.stream, route.device] = DeviceSequence()
+        key = (schema.rtc_values(payload), hash(payload))
+        seen = sequence.seen
+        if key in seen:
+            seen.move_to_end(key)
+            metrics.duplicates += 1
+            return True
+        seen[key] = None
+        # the cache size may have been lowered since
+        while len(seen) > self.cache_size:
+            seen.popitem(last=False)
+        for offset in range(0, len(payload), schema.size):
+            self._follow(sequence, rtc_seconds(schema.rtc_values(payload, offset)), metrics)
+        return False
+
+    @staticmethod
+    def _follow(sequence, rtc, metrics):
+        if rtc is None:
+            return
+        last = sequence.last_rtc
+        if last is not None:
+            step = rtc - last
+            if step < 0:
+                metrics.reorders += 1
+                return
+            if step:
+                if sequence.period is not None and step > sequence.period * GAP_FACTOR:
+                    metrics.gaps += 1
+                if sequence.period is None or step < sequence.period:
+                    sequence.period = step
+        sequence.last_rtc = rtc
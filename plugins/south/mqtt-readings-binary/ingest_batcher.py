@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Batches decoded readings into one ingest call
+
+Crossing into the C ingest callback costs the same for one reading as for a list of them, so readings
+are collected and flushed as a list once ``max_size`` readings are pending or the oldest pending reading
+has waited ``max_linger`` seconds. All methods run on the ingest worker's event loop.
+"""
+
+import asyncio
+import time
+
+from metrics import BATCH_SIZE_BUCKETS, Histogram
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+
+class IngestBatcher(object):
+    """ Collects readings and hands them to ``send(readings)`` in batches """
+
+    __slots__ = ['send', 'max_size', 'max_linger', 'batch_sizes', '_pending', '_timings', '_timer']
+
+    def __init__(self, send, max_size, max_linger):
+        self.send = send
+        self.max_size = max(1, max_size)
+        self.max_linger = max(0.0, max_linger)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self._pending = []
+        # (StreamMetrics, monotonic receive time) of the pending readings that are timed
+        self._timings = []
+        self._timer = None
+
+    async def add(self, reading, metrics=None, received=None, immediate=False):
+        """ Queue ``reading``; when ``metrics`` is given the time from ``received`` until the reading is sent
+        is observed in its ``ingest_ms``. An ``immediate`` reading is sent at once, with the readings pending
+        before it
+        """
+        self._pending.append(reading)
+        if metrics is not None:
+            self._timings.append((metrics, received))
+        if immediate or len(self._pending) >= self.max_size or self.max_linger == 0:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_event_loop().call_later(self.max_linger, self._linger_expired)
+
+    def _linger_expired(self):
+        self._timer = None
+        asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        readings, self._pending = self._pending, []
+        timings, self._timings = self._timings, []
+        self.batch_sizes.observe(len(readings))
+        await self.send(readings)
+        now = time.monotonic()
+        for metrics, received in timings:
+            metrics.readings += 1
+            metrics.ingest_ms.observe((now - received) * 1000.0)
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Hand-off between the paho network thread and the ingest event loop
+
+``on_message`` only routes a frame and puts it on a bounded FrameQueue; decoding and
+``async_ingest.ingest_callback`` run on the IngestWorker's long-lived event loop thread, so a slow
+ingest never holds up PINGs or socket reads. A queue may hand out only part of its frames per
+``take_all`` and keep them until ``ack`` once they were ingested (see disk_buffer.DiskFrameQueue).
+
+When the queue is full the backpressure policy of the frame's stream type applies:
+
+    block        the network thread waits for room (TCP flow control pushes back to the broker)
+    drop-oldest  the oldest queued frame of the same stream type is discarded
+    drop-newest  the incoming frame is discarded
+
+By default the periodic PDS and PQS frames, each superseded by the next, drop their oldest frame so a
+burst of them never holds up the network thread; every other stream type, DDS events in particular,
+blocks rather than loses a frame.
+"""
+
+import asyncio
+import collections
+import json
+import logging
+import threading
+
+from comms_gateway import plugin_logging
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+_LOGGER = plugin_logging.setup(__name__, level=logging.WARNING)
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+DEFAULT_BACKPRESSURE = {"default": BLOCK, "pds": DROP_OLDEST, "pqs": DROP_OLDEST}
+
+
+def parse_policies(value):
+    """ Parse the ``backpressurePolicy`` JSON configuration item into (default policy, policy per stream) """
+    if isinstance(value, str):
+        value = json.loads(value) if value.strip() else {}
+    policies = dict(DEFAULT_BACKPRESSURE)
+    policies.update(value)
+    for stream, policy in policies.items():
+        if policy not in POLICIES:
+            raise ValueError("Unknown backpressure policy '{}' for '{}', expected one of {}".format(
+                policy, stream, ', '.join(POLICIES)))
+    default = policies.pop('default')
+    return default, policies
+
+
+class FrameQueue(object):
+    """ Bounded, thread-safe FIFO of (stream, item) pairs with a backpressure policy per stream type """
+
+    # frames left on stop are lost rather than kept for the next start
+    persistent = False
+
+    __slots__ = ['maxsize', 'default_policy', 'policies', 'on_ready', 'closed', 'high_water', 'blocked',
+                 'dropped', '_items', '_lock', '_not_full']
+
+    def __init__(self, maxsize, default_policy=BLOCK, policies=None):
+        self.maxsize = maxsize
+        self.default_policy = default_policy
+        self.policies = policies or {}
+        # called without the lock held when the queue turns non-empty
+        self.on_ready = None
+        self.closed = False
+        self.high_water = 0
+        self.blocked = 0
+        self.dropped = collections.Counter()
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+
+    def put(self, stream, item):
+        """ Queue ``item``; returns False when it (or nothing, if closed) was dropped """
+        with self._lock:
+            if len(self._items) >= self.maxsize and not self._make_room(stream):
+                self.dropped[stream] += 1
+                return False
+            if self.closed:
+                return False
+            was_empty = not self._items
+            self._items.append((stream, item))
+            if len(self._items) > self.high_water:
+                self.high_water = len(self._items)
+        if was_empty and self.on_ready is not None:
+            self.on_ready()
+        return True
+
+    def _make_room(self, stream):
+        policy = self.policies.get(stream, self.default_policy)
+        if policy == BLOCK:
+            self.blocked += 1
+            while len(self._items) >= self.maxsize and not self.closed:
+                self._not_full.wait(1.0)
+            return True
+        if policy == DROP_OLDEST:
+            for index, (queued_stream, _) in enumerate(self._items):
+                if queued_stream == stream:
+                    del self._items[index]
+                    self.dropped[stream] += 1
+                    return True
+        return False
+
+    def take_all(self):
+        """ Remove and return every queued (stream, item) pair """
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+            self._not_full.notify_all()
+        return items
+
+    def ack(self):
+        """ Taken frames leave the queue at once """
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            self._not_full.notify_all()
+
+    def release(self):
+        """ Nothing to release once the worker has stopped """
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        return {'depth': len(self._items), 'high_water': self.high_water, 'blocked': self.blocked,
+                'dropped': dict(self.dropped)}
+
+
+class IngestWorker(object):
+    """ Runs ``handler(items)`` on a dedicated event loop thread for every burst of queued (stream, item) pairs
+
+    ``flush``, when given, is awaited once the queue has been drained on stop; a persistent queue is not
+    drained unless asked to, its frames are ingested by the next start. Frames queued before ``start`` are
+    ingested at once.
+    """
+
+    __slots__ = ['queue', 'handler', 'flush', 'name', 'loop', '_thread', '_wakeup', '_stopping', '_drain']
+
+    def __init__(self, queue, handler, flush=None, name='mqtt-ingest'):
+        self.queue = queue
+        self.handler = handler
+        self.flush = flush
+        self.name = name
+        self.loop = None
+        self._thread = None
+        self._wakeup = None
+        self._stopping = False
+        self._drain = True
+        queue.on_ready = self.notify
+
+    def start(self):
+        self._wakeup = None
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,), name=self.name, daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def _run(self, started):
+        asyncio.set_event_loop(self.loop)
+        self._wakeup = asyncio.Event()
+        if len(self.queue):
+            # replayed from disk, or put while the worker was not running; on_ready only fires on an empty queue
+            self._wakeup.set()
+        started.set()
+        try:
+            self.loop.run_until_complete(self._consume())
+        finally:
+            self.loop.close()
+
+    async def _consume(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stopping and not self._drain:
+                # the frames stay queued for the next start, or for the worker the queue is handed over to
+                break
+            items = self.queue.take_all()
+            if items:
+                try:
+                    await self.handler(items)
+                except Exception as ex:
+                    _LOGGER.exception("Unable to ingest %d frames: %s", len(items), str(ex))
+                self.queue.ack()
+            if self._stopping and not len(self.queue):
+                break
+            if len(self.queue):
+                # the queue handed out only part of its frames
+                self._wakeup.set()
+        if self.flush is not None:
+            await self.flush()
+
+    def notify(self):
+        """ Wake the consumer; safe to call from any thread """
+        loop, wakeup = self.loop, self._wakeup
+        if loop is None or wakeup is None:
+            # not started yet; the worker looks at the queue once it has created its wakeup event
+            return
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            # the worker loop is already closed
+            pass
+
+    def stop(self, timeout=5.0, close=True, drain=None):
+        """ Stop accepting frames, ingest what is already queued and join the worker thread
+
+        ``close`` False leaves a persistent queue open for the worker it is handed over to; this one only
+        finishes the burst it is ingesting. ``drain`` defaults to draining all but a persistent queue.
+        Returns False when the thread is still running after ``timeout`` seconds, e.g. in a slow ingest.
+        """
+        if close:
+            self.queue.close()
+        self._drain = not self.queue.persistent if drain is None else drain
+        self._stopping = True
+        self.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                return False
+            self._thread = None
+        return True
@@ -15,10 +15,20 @@ field_names = [
     "IsNlf"
 ]
 
+# Positions of the RTC values and of the flags, datapoint names and fields left out of the reading
+rtc_fields = [8, 15]
+flag_fields = {"IsNlf": 15}
+output_names = {"DigitalData{}".format(channel): "Digi{}".format(channel) for channel in range(1, 9)}
+exclude_fields = field_names[8:]
+
 # Combine the format and field names into a dictionary
 data = {
     "struct_format": struct_format,
-    "field_names": field_names
+    "field_names": field_names,
+    "rtc_fields": rtc_fields,
+    "flag_fields": flag_fields,
+    "output_names": output_names,
+    "exclude_fields": exclude_fields
 }
 
 # Write the dictionary to a JSON file
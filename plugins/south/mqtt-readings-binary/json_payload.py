@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" JSON payloads of the mqtt-readings-binary south plugin
+
+Devices publishing JSON documents instead of binary frames, like the SEED-STEM emulator of mqtt-publisher
+on ``<device>/pdsdata``, ``/adsdata`` and ``/ddsdata``, are routed by the ``json`` tokens of the topic
+routes. A document is mapped onto the datapoints of the frame schema of its route, so its reading carries
+the same datapoint names as one decoded from a binary frame:
+
+    - a key is a field or datapoint name of the schema (``DigitalData1`` or ``Digi1``); the schema of the
+      stream type whose keys cover most of the record is used, see SchemaRegistry.json_schema
+    - another key with a number or boolean value is passed through as a datapoint of its own name, any other
+      is dropped; both are reported as unmapped
+    - an object value stands for its ``value`` or ``state`` member, e.g. ``{"Digi1": {"state": 1, ...}}``
+    - ``timestamp`` is the RTC timestamp of the reading, else the first ``timestamp`` of an object value,
+      else the receive time
+    - an array of objects holds several records, one reading each
+
+The fastest parser available is used: orjson, then ujson, then the standard library json. ``parse_burst``
+parses the payloads of a burst of frames with one call.
+"""
+
+import calendar
+import time
+
+try:
+    import orjson
+    loads = orjson.loads
+    PARSER = 'orjson'
+except ImportError:
+    try:
+        import ujson
+        loads = ujson.loads
+        PARSER = 'ujson'
+    except ImportError:
+        import json
+        loads = json.loads
+        PARSER = 'json'
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+RTC_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# members of an object value holding the datapoint value
+_VALUE_MEMBERS = ('value', 'state')
+# keys of a record that are not datapoints
+_RECORD_KEYS = ('timestamp', 'topic')
+
+
+def parse_records(payload):
+    """ The records of a JSON payload as a list of objects, raising ValueError when it holds none """
+    return _records(loads(payload))
+
+
+def _records(document):
+    records = document if isinstance(document, list) else [document]
+    if not records or not all(isinstance(record, dict) for record in records):
+        raise ValueError("JSON payload is not an object or an array of objects")
+    return records
+
+
+def parse_burst(payloads):
+    """ The records of each of ``payloads``, or the ValueError of a payload that holds none
+
+    The payloads are parsed as the items of one JSON array; when that fails, because one of them is not JSON,
+    each is parsed on its own.
+    """
+    if len(payloads) > 1:
+        try:
+            documents = loads(b'[' + b','.join(payloads) + b']')
+        except ValueError:
+            documents = None
+        # a payload that is not one document on its own does not fit the count
+        if documents is not None and len(documents) == len(payloads):
+            return [_outcome(_records, document) for document in documents]
+    return [_outcome(parse_records, payload) for payload in payloads]
+
+
+def _outcome(parse, item):
+    try:
+        return parse(item)
+    except ValueError as ex:
+        return ex
+
+
+def json_reading(schema, record, topic, received, unmapped=None):
+    """ The reading of one JSON record by the datapoints of ``schema``; ``received`` are epoch seconds
+
+    The keys of the record that are not datapoints of ``schema`` are appended to ``unmapped`` when given.
+    """
+    keys = schema.json_keys
+    timestamp = record.get('timestamp')
+    reading = {}
+    for name, value in record.items():
+        key = keys.get(name)
+        passed = key is None
+        if passed:
+            if name in _RECORD_KEYS:
+                continue
+            if unmapped is not None:
+                unmapped.append(name)
+            key = name
+        if isinstance(value, dict):
+            if timestamp is None:
+                timestamp = value.get('timestamp')
+            value = next((value[member] for member in _VALUE_MEMBERS if member in value), None)
+            if value is None:
+                continue
+        if passed and not isinstance(value, (int, float)):
+            # only numbers and booleans pass through unmapped
+            continue
+        reading[key] = value
+    if not reading:
+        raise ValueError("JSON record has no datapoint")
+    reading['timestamp'] = timestamp if isinstance(timestamp, str) else time.strftime(RTC_FORMAT,
+                                                                                       time.gmtime(received))
+    reading['topic'] = topic
+    return reading
+
+
+def timestamp_seconds(timestamp):
+    """ Seconds since the epoch of a reading timestamp, None when it is not one """
+    try:
+        return calendar.timegm(time.strptime(timestamp, RTC_FORMAT))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Lightweight metrics for the mqtt-readings-binary south plugin
+
+Counters and fixed-bucket histograms are plain attributes updated on the ingest worker thread without
+locking, cheap enough to be always on. They are broken down by stream type and device, exported as JSON
+by a MetricsServer on a local HTTP port and pushed periodically as readings of a statistics asset.
+"""
+
+import bisect
+import http.server
+import json
+import logging
+import threading
+
+from comms_gateway import plugin_logging
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+_LOGGER = plugin_logging.setup(__name__, level=logging.WARNING)
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+OUTAGE_BUCKETS_S = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600)
+
+
+class Histogram(object):
+    """ Fixed-bucket histogram; a value lands in the first bucket whose upper bound is >= value """
+
+    __slots__ = ['bounds', 'counts', 'count', 'total']
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        # the extra last bucket counts values above the highest bound
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def snapshot(self):
+        buckets = {"<={}".format(bound): count for bound, count in zip(self.bounds, self.counts)}
+        buckets[">{}".format(self.bounds[-1])] = self.counts[-1]
+        return {'count': self.count, 'sum': self.total, 'buckets': buckets}
+
+
+class StreamMetrics(object):
+    """ Counters and latency histograms of one (stream type, device) pair
+
+    ``queue_wait_ms`` runs from receipt to the start of decoding, ``decode_ms`` covers decoding a frame
+    and ``ingest_ms`` runs from receipt until the frame's readings were handed to Fledge. ``duplicates``,
+    ``gaps`` and ``reorders`` are counted by the FrameTracker, ``suppressed`` readings by ReportByException.
+    ``unmapped`` counts the keys of JSON records that are not datapoints of their schema.
+    """
+
+    __slots__ = ['stream', 'device', 'messages', 'bytes', 'readings', 'decode_failures', 'duplicates', 'gaps',
+                 'reorders', 'suppressed', 'unmapped', 'queue_wait_ms', 'decode_ms', 'ingest_ms']
+
+    def __init__(self, stream, device):
+        self.stream = stream
+        self.device = device
+        self.messages = 0
+        self.bytes = 0
+        self.readings = 0
+        self.decode_failures = 0
+        self.duplicates = 0
+        self.gaps = 0
+        self.reorders = 0
+        self.suppressed = 0
+        self.unmapped = 0
+        self.queue_wait_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.decode_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.ingest_ms = Histogram(LATENCY_BUCKETS_MS)
+
+    def snapshot(self):
+        return {'stream': self.stream, 'device': self.device, 'messages': self.messages, 'bytes': self.bytes,
+                'readings': self.readings, 'decode_failures': self.decode_failures, 'duplicates': self.duplicates,
+                'gaps': self.gaps, 'reorders': self.reorders, 'suppressed': self.suppressed,
+                'unmapped': self.unmapped, 'queue_wait_ms': self.queue_wait_ms.snapshot(),
+                'decode_ms': self.decode_ms.snapshot(), 'ingest_ms': self.ingest_ms.snapshot()}
+
+    def reading(self):
+        """ Flat datapoints for the statistics asset """
+        return {'stream': self.stream, 'device': self.device, 'messages': self.messages, 'bytes': self.bytes,
+                'readings': self.readings, 'decode_failures': self.decode_failures, 'duplicates': self.duplicates,
+                'gaps': self.gaps, 'reorders': self.reorders, 'suppressed': self.suppressed,
+                'unmapped': self.unmapped, 'queue_wait_ms_avg': self.queue_wait_ms.mean(),
+                'decode_ms_avg': self.decode_ms.mean(), 'ingest_ms_avg': self.ingest_ms.mean()}
+
+
+class IngestMetrics(object):
+    """ StreamMetrics by stream type and device """
+
+    __slots__ = ['_streams']
+
+    def __init__(self):
+        self._streams = {}
+
+    def get(self, stream, device):
+        try:
+            return self._streams[stream, device]
+        except KeyError:
+            metrics = self._streams[stream, device] = StreamMetrics(stream, device)
+            return metrics
+
+    def __iter__(self):
+        # copied, the HTTP endpoint iterates from its own thread
+        return iter(list(self._streams.values()))
+
+
+class ConnectionMetrics(object):
+    """ Broker connection counters
+
+    ``outage_s`` runs from a disconnect to the next CONNACK, ``resubscribe_ms`` from a CONNACK to the
+    SUBACK of the subscriptions sent with it. Updated from the paho network thread.
+    """
+
+    __slots__ = ['connects', 'disconnects', 'connect_failures', 'outage_s', 'resubscribe_ms', 'disconnected_at',
+                 'connected_at']
+
+    def __init__(self):
+        self.connects = 0
+        self.disconnects = 0
+        self.connect_failures = 0
+        self.outage_s = Histogram(OUTAGE_BUCKETS_S)
+        self.resubscribe_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.disconnected_at = None
+        self.connected_at = None
+
+    def snapshot(self):
+        connected = self.connected_at is not None and self.disconnected_at is None
+        return {'connects': self.connects, 'disconnects': self.disconnects,
+                'connect_failures': self.connect_failures, 'connected': connected,
+                'outage_s': self.outage_s.snapshot(), 'resubscribe_ms': self.resubscribe_ms.snapshot()}
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.rstrip('/') not in ('', '/metrics'):
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.provider(), default=str).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(object):
+    """ Serves ``provider()`` as JSON on ``GET /metrics`` from a daemon thread """
+
+    __slots__ = ['host', 'port', 'provider', '_server', '_thread']
+
+    def __init__(self, port, provider, host='127.0.0.1'):
+        self.host = host
+        self.port = port
+        self.provider = provider
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        try:
+            self._server = http.server.ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+        except OSError as ex:
+            _LOGGER.error("Unable to serve metrics on %s:%d: %s", self.host, self.port, str(ex))
+            return
+        self._server.daemon_threads = True
+        self._server.provider = self.provider
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mqtt-metrics', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread = None
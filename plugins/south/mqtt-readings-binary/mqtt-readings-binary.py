@@ -6,10 +6,17 @@
 
 """ MQTT Subscriber 
 
-TODO:
+Shared subscriptions:
+
+    Services with the same sharedSubscriptionGroup subscribe to $share/<group>/<topic>, and the broker
+    delivers each message to only one of them, so several south services (one per core) split a busy
+    topic. With protocolVersion MQTTv5 the session expiry and receive maximum are sent on CONNECT.
+    To try it against the local mosquitto container (mosquitto 2 supports both), start two services
+    with the same group and distinct client IDs, then publish with
+    mosquitto_pub -h localhost -p 1884 -t STMS1/pdstop -f frame.bin --repeat 100;
+    each service's statistics show about half of the messages.
 
-# MQTT v5 support using paho-mqtt v1.5.0 
-    https://github.com/eclipse/paho.mqtt.python/blob/master/ChangeLog.txt
+TODO:
 
 # broker bind_address
     The IP address of a local network interface to bind this client to, assuming multiple interfaces exist
@@ -45,28 +52,66 @@ TODO:
 
 import asyncio
 import copy
+import hashlib
 import json
 import logging
+import os
+import sys
+import time
 
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 
-from fledge.common import logger
 from fledge.plugins.common import utils
 from fledge.services.south import exceptions
 from fledge.services.south.ingest import Ingest
 import async_ingest
-import struct
+
+from comms_gateway import plugin_logging
+from comms_gateway.compact import write_layout
+from comms_gateway.plugin_logging import Lazy, Sampler, StructuredMessage
+
+_PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+if _PLUGIN_DIR not in sys.path:
+    sys.path.append(_PLUGIN_DIR)
+
+from deadband import ReportByException
+from dead_letter import DEFAULT_SPOOL_DIR, DeadLetterSpool
+from disk_buffer import DEFAULT_BUFFER_DIR, DiskFrameQueue
+from frame_archive import DEFAULT_ARCHIVE_DIR, FrameArchive
+from frame_tracker import FrameTracker
+from json_payload import json_reading, parse_burst, parse_records, timestamp_seconds
+from ingest_batcher import IngestBatcher
+from ingest_worker import DEFAULT_BACKPRESSURE, FrameQueue, IngestWorker, parse_policies
+from metrics import ConnectionMetrics, IngestMetrics, MetricsServer
+from priority_lanes import DEFAULT_LANES, DeviceRateLimiter, PriorityFrameQueue, parse_lanes
+from reconnect_backoff import ReconnectBackoff
+from schema_registry import SchemaRegistry, rtc_seconds
+from topic_router import DEFAULT_ROUTES, JSON, TopicRouter
 
 __author__ = "Praveen Garg, Oskar Gert"
 __copyright__ = "Copyright (c) 2024 Dianomic Systems, Inc."
 __license__ = "Apache 2.0"
 __version__ = "${VERSION}"
 
-_LOGGER = logger.setup(__name__, level=logging.WARNING)
+_LOGGER = plugin_logging.setup(__name__, level=logging.WARNING)
+# JSON keys that are not datapoints of their schema are logged now and then per schema and topic
+_UNMAPPED_SAMPLER = Sampler(1000)
+
+# topics are bounded by the device fleet; the cap only guards against a misbehaving publisher
+_MAX_CACHED_ASSETS = 10000
+
+# configuration items that only take effect with a new broker connection
+_CONNECTION_ITEMS = {'brokerHost', 'brokerPort', 'username', 'password', 'keepAliveInterval', 'protocolVersion',
+                     'clientId', 'persistentSession', 'sessionExpiryInterval', 'receiveMaximum'}
+# configuration items applied by subscribing and unsubscribing
+_SUBSCRIPTION_ITEMS = {'topic', 'qos', 'sharedSubscriptionGroup'}
+# seconds a reconfiguration waits for the ingest worker to finish before it reconnects instead
+_HANDOVER_TIMEOUT = 60.0
 
 c_callback = None
 c_ingest_ref = None
-loop = None
 
 _DEFAULT_CONFIG = {
     'plugin': {
@@ -114,7 +159,8 @@ _DEFAULT_CONFIG = {
         'displayName': 'Keep Alive Interval'
     },
     'topic': {
-        'description': 'The subscription topic to subscribe to receive messages',
+        'description': 'The topics to subscribe to receive messages, separated by commas. MQTT wildcards '
+                       'are allowed, e.g. +/pdstop, +/adstop, +/pdsdata',
         'type': 'string',
         'default': 'Room1/conditions',
         'order': '6',
@@ -146,6 +192,356 @@ _DEFAULT_CONFIG = {
         'order': '9',
         'displayName': 'Datapoint Name',
         'group': 'Reading'
+    },
+    'topicRoutes': {
+        'description': 'Topic tokens selecting the frame schema: stream type tokens map to a schema name and '
+                       'hardware revision tokens to a schema name suffix. The schema is detected from the payload '
+                       'length; the revision token only settles schemas of the same frame size. JSON tokens map to '
+                       'the stream type of topics carrying JSON documents, e.g. +/pdsdata, whose keys are mapped '
+                       'onto the datapoints of the stream type\'s schema that covers most of them; other numeric '
+                       'keys are passed through as they are',
+        'type': 'JSON',
+        'default': json.dumps(DEFAULT_ROUTES),
+        'order': '10',
+        'displayName': 'Topic Routes',
+        'group': 'Decoding'
+    },
+    'jsonBatchDecode': {
+        'description': 'Parse the JSON payloads of a burst of received frames with one parser call rather than one '
+                       'call each',
+        'type': 'boolean',
+        'default': 'true',
+        'order': '11',
+        'displayName': 'Batch JSON Decoding',
+        'group': 'Decoding'
+    },
+    'queueSize': {
+        'description': 'Maximum number of received frames waiting to be decoded and ingested',
+        'type': 'integer',
+        'default': '5000',
+        'order': '12',
+        'displayName': 'Receive Queue Size',
+        'minimum': '1',
+        'group': 'Ingest'
+    },
+    'backpressurePolicy': {
+        'description': 'What to do with a frame when the receive queue is full: block, drop-oldest or drop-newest. '
+                       'The "default" policy can be overridden per stream type, e.g. {"default": "block", "pds": "drop-oldest"}. '
+                       'PDS and PQS frames drop the oldest unless overridden',
+        'type': 'JSON',
+        'default': json.dumps(DEFAULT_BACKPRESSURE),
+        'order': '13',
+        'displayName': 'Backpressure Policy',
+        'group': 'Ingest'
+    },
+    'maxBatchSize': {
+        'description': 'Maximum number of readings passed to Fledge in one ingest call',
+        'type': 'integer',
+        'default': '100',
+        'order': '14',
+        'displayName': 'Max Batch Size',
+        'minimum': '1',
+        'group': 'Ingest'
+    },
+    'maxBatchLinger': {
+        'description': 'Maximum time in milliseconds a reading waits for its batch to fill before it is ingested. '
+                       '0 ingests every reading immediately',
+        'type': 'integer',
+        'default': '50',
+        'order': '15',
+        'displayName': 'Max Batch Linger (ms)',
+        'minimum': '0',
+        'group': 'Ingest'
+    },
+    'deadLetterSpool': {
+        'description': 'File that frames which cannot be decoded are appended to, raw. '
+                       'Empty spools to <FLEDGE_DATA>/dead-letters/<asset name>.spool',
+        'type': 'string',
+        'default': '',
+        'order': '16',
+        'displayName': 'Dead Letter Spool',
+        'group': 'Dead Letters'
+    },
+    'deadLetterMaxSize': {
+        'description': 'Size in KB at which the dead letter spool is moved aside to <spool>.1, '
+                       'replacing the previous one',
+        'type': 'integer',
+        'default': '10240',
+        'order': '17',
+        'displayName': 'Dead Letter Spool Size (KB)',
+        'minimum': '1',
+        'group': 'Dead Letters'
+    },
+    'metricsPort': {
+        'description': 'Local port serving the ingest metrics as JSON on http://127.0.0.1:<port>/metrics. 0 disables',
+        'type': 'integer',
+        'default': '0',
+        'order': '18',
+        'displayName': 'Metrics Port',
+        'minimum': '0',
+        'maximum': '65535',
+        'group': 'Metrics'
+    },
+    'statisticsInterval': {
+        'description': 'Interval in seconds at which the ingest metrics of every stream type and device are '
+                       'ingested as readings of the statistics asset. 0 disables. The readings reach every north '
+                       'task that does not filter the statistics asset out',
+        'type': 'integer',
+        'default': '0',
+        'order': '19',
+        'displayName': 'Statistics Interval (s)',
+        'minimum': '0',
+        'group': 'Metrics'
+    },
+    'statisticsAsset': {
+        'description': 'Asset name of the ingest metrics readings. Empty uses the asset name followed by "statistics"',
+        'type': 'string',
+        'default': '',
+        'order': '20',
+        'displayName': 'Statistics Asset',
+        'group': 'Metrics'
+    },
+    'deviceTopicSegment': {
+        'description': 'Position of the device ID among the "/" separated topic segments, counted from 0; '
+                       'negative positions count from the end',
+        'type': 'integer',
+        'default': '0',
+        'order': '21',
+        'displayName': 'Device Topic Segment',
+        'group': 'Reading'
+    },
+    'assetNameTemplate': {
+        'description': 'Asset name of the readings of a device and stream type. {asset} is replaced by the asset '
+                       'name, {device} by the device ID taken from the topic and {stream} by the stream type, e.g. '
+                       '{asset}{device}_{stream}. With a _{stream} suffix the asset filters of the north tasks '
+                       'and the Python filters select the readings of their stream type by asset name instead of '
+                       'passing every asset on; the gateway asset API and the Grafana queries then need the new '
+                       'asset names',
+        'type': 'string',
+        'default': '{asset}',
+        'order': '22',
+        'displayName': 'Asset Name Template',
+        'group': 'Reading'
+    },
+    'devices': {
+        'description': 'Devices served by this service, by device name: {"<name>": {"topic": "<topics>", '
+                       '"asset": "<asset name>"}}. Readings on a device\'s topics take its asset name as the '
+                       '{asset} of the asset name template. Maintained by the gateway device placement',
+        'type': 'JSON',
+        'default': '{}',
+        'order': '23',
+        'displayName': 'Devices',
+        'group': 'Reading'
+    },
+    'protocolVersion': {
+        'description': 'MQTT protocol version. MQTTv5 enables the session expiry and receive maximum settings',
+        'type': 'enumeration',
+        'options': ['MQTTv311', 'MQTTv5'],
+        'default': 'MQTTv311',
+        'order': '24',
+        'displayName': 'MQTT Protocol',
+        'group': 'MQTT Session'
+    },
+    'clientId': {
+        'description': 'MQTT client ID. Empty lets the client generate one; set a unique ID per service to '
+                       'resume a session after a reconnect',
+        'type': 'string',
+        'default': '',
+        'order': '25',
+        'displayName': 'Client ID',
+        'group': 'MQTT Session'
+    },
+    'sharedSubscriptionGroup': {
+        'description': 'Subscribe to every topic as $share/<group>/<topic>; the broker then spreads the messages '
+                       'over all services of the group. Empty subscribes normally',
+        'type': 'string',
+        'default': '',
+        'order': '26',
+        'displayName': 'Shared Subscription Group',
+        'group': 'MQTT Session'
+    },
+    'sessionExpiryInterval': {
+        'description': 'MQTTv5 only: seconds the broker keeps the session, and queues QoS 1/2 messages for it, '
+                       'after a disconnect. 0 ends the session on disconnect',
+        'type': 'integer',
+        'default': '0',
+        'order': '27',
+        'displayName': 'Session Expiry (s)',
+        'minimum': '0',
+        'group': 'MQTT Session'
+    },
+    'receiveMaximum': {
+        'description': 'MQTTv5 only: maximum number of unacknowledged QoS 1/2 messages the broker sends this '
+                       'client at once. 0 leaves the broker default',
+        'type': 'integer',
+        'default': '0',
+        'order': '28',
+        'displayName': 'Receive Maximum',
+        'minimum': '0',
+        'maximum': '65535',
+        'group': 'MQTT Session'
+    },
+    'persistentSession': {
+        'description': 'Keep the session on the broker across disconnects and restarts (clean_session off), so '
+                       'QoS 1/2 messages published meanwhile are delivered on reconnect. Without a client ID a '
+                       'stable one is derived from the broker and the asset name, so services sharing both need '
+                       'a client ID each. With MQTTv5 the session lasts for the session expiry',
+        'type': 'boolean',
+        'default': 'false',
+        'order': '29',
+        'displayName': 'Persistent Session',
+        'group': 'MQTT Session'
+    },
+    'maxInflightMessages': {
+        'description': 'Maximum number of QoS 1/2 messages in flight at once',
+        'type': 'integer',
+        'default': '20',
+        'order': '30',
+        'displayName': 'Max In-flight Messages',
+        'minimum': '1',
+        'group': 'MQTT Session'
+    },
+    'maxQueuedMessages': {
+        'description': 'Maximum number of outgoing messages queued while in-flight messages are pending. 0 is unlimited',
+        'type': 'integer',
+        'default': '0',
+        'order': '31',
+        'displayName': 'Max Queued Messages',
+        'minimum': '0',
+        'group': 'MQTT Session'
+    },
+    'reconnectMinDelay': {
+        'description': 'Delay in seconds before the first reconnect attempt. Later attempts back off '
+                       'exponentially, each delay jittered over the upper half of its range',
+        'type': 'float',
+        'default': '1',
+        'order': '32',
+        'displayName': 'Reconnect Min Delay (s)',
+        'minimum': '0.1',
+        'group': 'MQTT Session'
+    },
+    'reconnectMaxDelay': {
+        'description': 'Longest delay in seconds between reconnect attempts',
+        'type': 'float',
+        'default': '120',
+        'order': '33',
+        'displayName': 'Reconnect Max Delay (s)',
+        'minimum': '1',
+        'group': 'MQTT Session'
+    },
+    'diskBuffer': {
+        'description': 'Park received frames in a memory-mapped ring file instead of the in-memory receive queue. '
+                       'Frames not yet ingested survive a restart of the service',
+        'type': 'boolean',
+        'default': 'false',
+        'order': '34',
+        'displayName': 'Disk Buffer',
+        'group': 'Ingest'
+    },
+    'diskBufferSize': {
+        'description': 'Size in MB of the disk buffer ring. When it is full the backpressure policy applies',
+        'type': 'integer',
+        'default': '64',
+        'order': '35',
+        'displayName': 'Disk Buffer Size (MB)',
+        'minimum': '1',
+        'group': 'Ingest'
+    },
+    'diskBufferFile': {
+        'description': 'Ring file of the disk buffer. Empty uses <FLEDGE_DATA>/buffers/<asset name>.ring',
+        'type': 'string',
+        'default': '',
+        'order': '36',
+        'displayName': 'Disk Buffer File',
+        'group': 'Ingest'
+    },
+    'duplicateCacheSize': {
+        'description': 'Number of recent frames remembered per device and stream type; a frame repeating one of '
+                       'them, e.g. a QoS 1 resend after a reconnect, is dropped before decoding. 0 disables',
+        'type': 'integer',
+        'default': '256',
+        'order': '37',
+        'displayName': 'Duplicate Cache Size',
+        'minimum': '0',
+        'group': 'Decoding'
+    },
+    'archive': {
+        'description': 'Also append every decodable frame raw to compressed segment files indexed by device and '
+                       'RTC time, to be decoded on demand with frame_archive.py',
+        'type': 'boolean',
+        'default': 'false',
+        'order': '38',
+        'displayName': 'Raw Frame Archive',
+        'group': 'Archive'
+    },
+    'archiveDirectory': {
+        'description': 'Directory of the archive segments. Empty uses <FLEDGE_DATA>/archive/<asset name>',
+        'type': 'string',
+        'default': '',
+        'order': '39',
+        'displayName': 'Archive Directory',
+        'group': 'Archive'
+    },
+    'archiveSegmentSize': {
+        'description': 'Size in MB at which an archive segment is closed and a new one started',
+        'type': 'integer',
+        'default': '64',
+        'order': '40',
+        'displayName': 'Archive Segment Size (MB)',
+        'minimum': '1',
+        'group': 'Archive'
+    },
+    'archiveMaxSize': {
+        'description': 'Size in MB of the archive above which its oldest segments are deleted',
+        'type': 'integer',
+        'default': '10240',
+        'order': '41',
+        'displayName': 'Archive Max Size (MB)',
+        'minimum': '1',
+        'group': 'Archive'
+    },
+    'compactStreams': {
+        'description': 'Comma separated stream types, e.g. pds,pqs, ingested as compact readings: the schema, '
+                       'its layout ID and one float array of values instead of named datapoints, flags included. '
+                       'The north tasks set up by the gateway expand them with the expand_compact_readings filter, '
+                       'the PDS, PQS and WebSocket filters and the WebSocket north plugin by themselves; any other '
+                       'consumer receives them compact',
+        'type': 'string',
+        'default': '',
+        'order': '42',
+        'displayName': 'Compact Stream Types',
+        'group': 'Reading'
+    },
+    'priorityLanes': {
+        'description': 'Receive queue lanes from the most to the least urgent, each with its stream types, its weight '
+                       'in the frames taken per burst and whether its readings are ingested immediately. When the '
+                       'queue is full the least urgent lanes are shed first. [] keeps one FIFO for all frames. Not '
+                       'used with the disk buffer, whose bursts are only decoded in lane order',
+        'type': 'JSON',
+        'default': json.dumps(DEFAULT_LANES),
+        'order': '43',
+        'displayName': 'Priority Lanes',
+        'group': 'Ingest'
+    },
+    'deviceRateLimit': {
+        'description': 'Maximum frames per second accepted from one device on one stream type, with bursts of up '
+                       'to two seconds of frames; frames above it are dropped. 0 is unlimited',
+        'type': 'float',
+        'default': '0',
+        'order': '44',
+        'displayName': 'Device Rate Limit (frames/s)',
+        'minimum': '0',
+        'group': 'Ingest'
+    },
+    'logSampling': {
+        'description': 'Log only 1 in this many received messages of a topic when the log level includes info. '
+                       'Log records are written by a background thread, never by the receive or ingest threads',
+        'type': 'integer',
+        'default': '100',
+        'order': '45',
+        'displayName': 'Message Log Sampling',
+        'minimum': '1',
+        'group': 'Metrics'
     }
 }
 
@@ -171,18 +567,17 @@ def plugin_init(config):
     Raises:
     """
     handle = copy.deepcopy(config)
-    handle["_mqtt"] = MqttSubscriberClient(handle)
+    # Frame schemas are compiled once here and only re-read when a schema file changes
+    schemas = SchemaRegistry(_PLUGIN_DIR)
+    schemas.load()
+    handle["_mqtt"] = MqttSubscriberClient(handle, schemas)
     return handle
 
 
 def plugin_start(handle):
-    global loop
-    loop = asyncio.new_event_loop()
-
     _LOGGER.info('Starting MQTT south plugin...')
     try:
         _mqtt = handle["_mqtt"]
-        _mqtt.loop = loop
         _mqtt.start()
     except Exception as e:
         _LOGGER.exception(str(e))
@@ -195,6 +590,10 @@ def plugin_reconfigure(handle, new_config):
     it should be called when the configuration of the plugin is changed during the operation of the South service;
     The new configuration category should be passed.
 
+    Only a change of the broker, the credentials or the session reconnects. Topic and QoS changes are applied by
+    subscribing and unsubscribing, any other change hands the connection over to a client built from the new
+    configuration.
+
     Args:
         handle: handle returned by the plugin initialisation call
         new_config: JSON object representing the new configuration category for the category
@@ -203,13 +602,38 @@ def plugin_reconfigure(handle, new_config):
     Raises:
     """
     _LOGGER.info('Reconfiguring MQTT south plugin...')
-    plugin_shutdown(handle)
+    changed = {key for key in set(handle) | set(new_config)
+               if key != '_mqtt' and _config_value(handle, key) != _config_value(new_config, key)}
+    if changed & _CONNECTION_ITEMS:
+        plugin_shutdown(handle)
+        new_handle = plugin_init(new_config)
+        plugin_start(new_handle)
+        _LOGGER.info('MQTT south plugin reconfigured, reconnected for: %s', ', '.join(sorted(changed)))
+        return new_handle
+
+    new_handle = copy.deepcopy(new_config)
+    _mqtt = handle["_mqtt"]
+    if changed <= _SUBSCRIPTION_ITEMS:
+        topics = [topic.strip() for topic in new_config['topic']['value'].split(',') if topic.strip()]
+        _mqtt.update_subscriptions(topics, int(new_config['qos']['value']),
+                                   new_config['sharedSubscriptionGroup']['value'].strip())
+    else:
+        try:
+            _mqtt = _mqtt.succeed(new_handle)
+        except TimeoutError as ex:
+            _LOGGER.error('Unable to hand the MQTT connection over, reconnecting: %s', str(ex))
+            new_handle = plugin_init(new_config)
+            plugin_start(new_handle)
+            return new_handle
+    new_handle["_mqtt"] = _mqtt
+
+    _LOGGER.info('MQTT south plugin reconfigured: %s', ', '.join(sorted(changed)) or 'no change')
+    return new_handle
 
-    new_handle = plugin_init(new_config)
-    plugin_start(new_handle)
 
-    _LOGGER.info('MQTT south plugin reconfigured.')
-    return new_handle
+def _config_value(config, key):
+    item = config.get(key)
+    return item.get('value') if isinstance(item, dict) else item
 
 
 def plugin_shutdown(handle):
@@ -222,14 +646,11 @@ def plugin_shutdown(handle):
     Returns:
     Raises:
     """
-    global loop
     try:
         _LOGGER.info('Shutting down MQTT south plugin...')
         _mqtt = handle["_mqtt"]
         _mqtt.stop()
-        
-        loop.stop()
-        loop = None
+        _LOGGER.info("Ingest statistics: %s", _mqtt.statistics())
     except Exception as e:
         _LOGGER.exception(str(e))
     else:
@@ -248,91 +669,563 @@ def plugin_register_ingest(handle, callback, ingest_ref):
     c_ingest_ref = ingest_ref
 
 
+def _service_name():
+    """ Name of the Fledge service running the plugin, from the --name= argument of the service process
+
+    The embedded interpreter of a C south service does not get the command line as sys.argv, hence /proc.
+    """
+    try:
+        with open('/proc/self/cmdline', 'rb') as cmdline:
+            arguments = cmdline.read().decode('utf-8', 'replace').split('\0')
+    except OSError:
+        arguments = sys.argv
+    for argument in arguments:
+        if argument.startswith('--name='):
+            return argument[len('--name='):]
+    return ''
+
+
 class MqttSubscriberClient(object):
     """ mqtt listener class"""
 
-    __slots__ = ['mqtt_client', 'broker_host', 'broker_port', 'username', 'password', 'topic', 'qos', 'keep_alive_interval', 'asset', 'reading_datapoint_name_for_primitive_value', 'loop']
+    __slots__ = ['mqtt_client', 'broker_host', 'broker_port', 'username', 'password', 'topic', 'qos', 'keep_alive_interval', 'asset', 'reading_datapoint_name_for_primitive_value', 'schemas', 'router', 'dead_letters', 'metrics', 'metrics_server', 'statistics_interval', 'statistics_asset', '_statistics_task', 'topics', 'asset_template', 'devices', '_assets', 'protocol', 'client_id', 'shared_group', 'session_expiry', 'receive_maximum', 'persistent_session', 'backoff', 'connection', '_subscribe_mid', 'queue', 'worker', 'batcher', 'tracker', 'exceptions', 'archive', 'compact_streams', '_layouts', 'rate_limiter', 'immediate_streams', '_ranks', 'log_sampler', 'json_batch']
 
-    def __init__(self, config):
-        self.mqtt_client = mqtt.Client()
+    def __init__(self, config, schemas, previous=None):
+        """ ``previous``, the client being replaced, hands its broker connection, counters and device state over,
+        see ``succeed``
+        """
+        self.schemas = schemas
         self.broker_host = config['brokerHost']['value']
         self.broker_port = int(config['brokerPort']['value'])
         self.username = config['username']['value']
         self.password = config['password']['value']
         self.topic = config['topic']['value']
+        self.topics = [topic.strip() for topic in self.topic.split(',') if topic.strip()]
         self.qos = int(config['qos']['value'])
         self.keep_alive_interval = int(config['keepAliveInterval']['value'])
         
         self.asset = config['assetName']['value']
         self.reading_datapoint_name_for_primitive_value = config['reading_datapoint_name_for_primitive_value']['value']
 
-    def on_connect(self, client, userdata, flags, rc):
+        self.protocol = mqtt.MQTTv5 if config['protocolVersion']['value'] == 'MQTTv5' else mqtt.MQTTv311
+        self.shared_group = config['sharedSubscriptionGroup']['value'].strip()
+        self.session_expiry = int(config['sessionExpiryInterval']['value'])
+        self.receive_maximum = int(config['receiveMaximum']['value'])
+        self.client_id = config['clientId']['value'].strip()
+        self.persistent_session = config['persistentSession']['value'] == 'true' or bool(
+            self.protocol == mqtt.MQTTv5 and self.client_id and self.session_expiry)
+        if self.persistent_session and not self.client_id:
+            self.client_id = self.stable_client_id()
+        if previous is None:
+            # clean_session is an MQTT 3.1.1 notion, MQTTv5 uses clean_start on connect
+            session = {} if self.protocol == mqtt.MQTTv5 else {'clean_session': not self.persistent_session}
+            self.mqtt_client = mqtt.Client(client_id=self.client_id, protocol=self.protocol, **session)
+            self.connection = ConnectionMetrics()
+            self._subscribe_mid = None
+        else:
+            # the session stays that of the connection taken over
+            self.client_id = previous.client_id
+            self.mqtt_client = previous.mqtt_client
+            self.connection = previous.connection
+            self._subscribe_mid = previous._subscribe_mid
+        self.mqtt_client.max_inflight_messages_set(int(config['maxInflightMessages']['value']))
+        self.mqtt_client.max_queued_messages_set(int(config['maxQueuedMessages']['value']))
+        self.backoff = ReconnectBackoff(float(config['reconnectMinDelay']['value']),
+                                        float(config['reconnectMaxDelay']['value']))
+
+        self.asset_template = config['assetNameTemplate']['value'].strip() or '{asset}'
+        try:
+            self.asset_template.format(asset=self.asset, device='', stream='')
+        except (KeyError, IndexError, ValueError) as ex:
+            _LOGGER.error("Invalid asset name template '%s' (%s), using the asset name", self.asset_template, str(ex))
+            self.asset_template = '{asset}'
+        self.devices = config['devices']['value']
+        if isinstance(self.devices, str):
+            self.devices = json.loads(self.devices) if self.devices.strip() else {}
+        # asset name per topic
+        self._assets = {}
+
+        self.router = TopicRouter.from_config(config['topicRoutes']['value'],
+                                              int(config['deviceTopicSegment']['value']))
+        self.json_batch = config['jsonBatchDecode']['value'] == 'true'
+
+        spool_path = config['deadLetterSpool']['value'].strip() or os.path.join(DEFAULT_SPOOL_DIR,
+                                                                                 self.asset + '.spool')
+        self.dead_letters = DeadLetterSpool(spool_path, int(config['deadLetterMaxSize']['value']) * 1024)
+        cache_size = int(config['duplicateCacheSize']['value'])
+        self.tracker = FrameTracker(cache_size) if cache_size > 0 else None
+        self.exceptions = ReportByException()
+        if previous is not None:
+            # the duplicate cache and the last reported values go on across a reconfiguration
+            if self.tracker is not None and previous.tracker is not None:
+                self.tracker = previous.tracker
+                self.tracker.cache_size = cache_size
+            self.exceptions = previous.exceptions
+        self.compact_streams = {stream.strip() for stream in config['compactStreams']['value'].split(',')
+                                if stream.strip()}
+        # schema name -> layout ID written to the layout directory
+        self._layouts = {}
+        self.archive = None
+        if config['archive']['value'] == 'true':
+            archive_dir = config['archiveDirectory']['value'].strip() or os.path.join(DEFAULT_ARCHIVE_DIR, self.asset)
+            self.archive = FrameArchive(archive_dir, int(config['archiveSegmentSize']['value']) * 1024 * 1024,
+                                        int(config['archiveMaxSize']['value']) * 1024 * 1024)
+
+        self.metrics = IngestMetrics() if previous is None else previous.metrics
+        metrics_port = int(config['metricsPort']['value'])
+        self.metrics_server = MetricsServer(metrics_port, self.statistics) if metrics_port else None
+        self.statistics_interval = int(config['statisticsInterval']['value'])
+        self.statistics_asset = config['statisticsAsset']['value'].strip() or self.asset + 'statistics'
+        self._statistics_task = None
+        self.log_sampler = Sampler(int(config['logSampling']['value']))
+
+        default_policy, policies = parse_policies(config['backpressurePolicy']['value'])
+        lanes = parse_lanes(config['priorityLanes']['value'])
+        self.immediate_streams = {stream for streams, lane in lanes if lane.immediate for stream in streams}
+        # stream type -> lane rank, the order in which a burst of queued frames is decoded
+        self._ranks = {stream: lane.rank for streams, lane in lanes for stream in streams}
+        rate_limit = float(config['deviceRateLimit']['value'])
+        self.rate_limiter = DeviceRateLimiter(rate_limit) if rate_limit > 0 else None
+        self.queue = None
+        if config['diskBuffer']['value'] == 'true':
+            ring_path = config['diskBufferFile']['value'].strip() or os.path.join(DEFAULT_BUFFER_DIR,
+                                                                                   self.asset + '.ring')
+            ring_size = int(config['diskBufferSize']['value']) * 1024 * 1024
+            if previous is not None and previous.queue.persistent and previous.queue.path == ring_path:
+                # the ring file is locked by the previous client; its frames are handed over with it
+                self.queue = previous.queue
+                self.queue.route = self.router.route
+                self.queue.unrouted = self.dead_letter_unrouted
+                self.queue.default_policy, self.queue.policies = default_policy, policies
+                if self.queue.capacity != ring_size:
+                    _LOGGER.warning("The new size of disk buffer %s applies from the next start", ring_path)
+            else:
+                try:
+                    self.queue = DiskFrameQueue(ring_path, ring_size, self.router.route, default_policy, policies)
+                    self.queue.unrouted = self.dead_letter_unrouted
+                except (OSError, ValueError) as ex:
+                    _LOGGER.error("Unable to open disk buffer %s, buffering in memory: %s", ring_path, str(ex))
+        if self.queue is None and lanes:
+            self.queue = PriorityFrameQueue(int(config['queueSize']['value']), lanes, default_policy, policies)
+        if self.queue is None:
+            self.queue = FrameQueue(int(config['queueSize']['value']), default_policy, policies)
+        self.batcher = IngestBatcher(self.send, int(config['maxBatchSize']['value']),
+                                     int(config['maxBatchLinger']['value']) / 1000.0)
+        self.worker = IngestWorker(self.queue, self.ingest, self.batcher.flush)
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
         """ The callback for when the client receives a CONNACK response from the server
         """
+        if rc != 0:
+            # paho drops the connection next, on_disconnect schedules the retry
+            _LOGGER.warning("MQTT connection refused: %s", mqtt.connack_string(rc) if isinstance(rc, int) else rc)
+            self.connection.connect_failures += 1
+            return
         client.connected_flag = True
-        # subscribe at given Topic on connect
-        client.subscribe(self.topic, self.qos)
-        _LOGGER.info("MQTT connected. Subscribed the topic: %s", self.topic)
-
-    def on_disconnect(self, client, userdata, rc):
-        pass
+        now = time.monotonic()
+        connection = self.connection
+        connection.connects += 1
+        if connection.disconnected_at is not None:
+            connection.outage_s.observe(now - connection.disconnected_at)
+            connection.disconnected_at = None
+        connection.connected_at = now
+        self.backoff.reset()
+        if flags.get('session present'):
+            _LOGGER.info("MQTT session resumed")
+        # subscribe at given Topics on connect, also on a resumed session as the topics may have changed
+        subscriptions = [self.subscription(topic) for topic in self.topics]
+        _, self._subscribe_mid = client.subscribe([(subscription, self.qos) for subscription in subscriptions])
+        _LOGGER.info("MQTT connected. Subscribed the topics: %s", ', '.join(subscriptions))
+
+    def on_disconnect(self, client, userdata, rc, properties=None):
+        client.connected_flag = False
+        if self.connection.disconnected_at is None:
+            self.connection.disconnects += 1
+            self.connection.disconnected_at = time.monotonic()
+        if rc != 0:
+            _LOGGER.warning("MQTT connection lost (%s)", rc)
+        self.schedule_reconnect(client)
+
+    def on_connect_fail(self, client, userdata):
+        self.connection.connect_failures += 1
+        if self.connection.disconnected_at is None:
+            self.connection.disconnected_at = time.monotonic()
+        self.schedule_reconnect(client)
+
+    def schedule_reconnect(self, client):
+        """ Make the network loop wait a jittered, exponentially growing delay before its next attempt """
+        delay = self.backoff.next_delay()
+        client.reconnect_delay_set(delay, delay)
+        _LOGGER.info("MQTT reconnect attempt %d in %.1f s", self.backoff.attempts, delay)
+
+    def subscription(self, topic):
+        """ Subscription filter of ``topic``, shared when a shared subscription group is configured """
+        return "$share/{}/{}".format(self.shared_group, topic) if self.shared_group else topic
 
     def on_message(self, client, userdata, msg):
         """ The callback for when a PUBLISH message is received from the server
         """
-        _LOGGER.info("MQTT Received message; Topic: %s, Payload: %s  with QoS: %s", str(msg.topic), str(msg.payload),
-                     str(msg.qos))
-
-        #Save ADS data
-        if "adstop" in str(msg.topic) and "ph8" in str(msg.topic):
-          self.loop.run_until_complete(self.save_ads_ph8(msg))
-        elif "adstop" in str(msg.topic):
-          self.loop.run_until_complete(self.save_ads_ph7(msg))
-
-        #Save PDS data
-        if "pdstop" in str(msg.topic) and "ph8" in str(msg.topic):
-            self.loop.run_until_complete(self.save_pds_ph8(msg))
-        elif "pdstop" in str(msg.topic):
-          self.loop.run_until_complete(self.save_pds_ph7(msg))
-
-        #Save DDS data
-        if "ddstop" in str(msg.topic) and "ph8" in str(msg.topic):
-            self.loop.run_until_complete(self.save_dds_ph8(msg))
-        elif "ddstop" in str(msg.topic):
-          self.loop.run_until_complete(self.save_dds_ph7(msg))
-        
-        #Save PQ data
-        if "pqstop" in str(msg.topic) and "ph8" in str(msg.topic):
-            self.loop.run_until_complete(self.save_pq_ph8(msg))
-        elif "pqstop" in str(msg.topic):
-          self.loop.run_until_complete(self.save_pq_ph7(msg))
+        if _LOGGER.isEnabledFor(logging.INFO) and self.log_sampler(msg.topic):
+            _LOGGER.info(StructuredMessage('mqtt_message', topic=msg.topic, qos=msg.qos, size=len(msg.payload),
+                                           payload=Lazy(msg.payload.hex)))
+
+        route = self.router.route(msg.topic)
+        if route is None:
+            _LOGGER.debug("No decoder routed for topic %s", msg.topic)
+            return
+        if self.rate_limiter is not None and not self.rate_limiter.allow(route, msg.timestamp):
+            return
+        # decode and ingest run on the worker thread, never on the paho network thread
+        self.queue.put(route.stream, (route, msg))
+
+    async def ingest(self, items):
+        """ Decode and ingest a burst of queued frames, runs on the worker event loop
+
+        The schema of each frame is detected from its payload length. Duplicates of recent frames of the same
+        device are dropped, the others archived when enabled. Frames are decoded in the order of their priority
+        lanes.
+        JSON payloads are mapped onto the datapoints of a schema of their stream type instead, parsed all at once
+        when batch JSON decoding is on.
+        """
+        if self._ranks and self.queue.persistent:
+            # the priority queue hands its frames out in lane order already
+            last = len(self._ranks)
+            items = sorted(items, key=lambda item: self._ranks.get(item[0], last))
+        parsed = None
+        if self.json_batch:
+            payloads = [bytes(msg.payload) for _, (route, msg) in items if route.encoding == JSON]
+            if len(payloads) > 1:
+                parsed = iter(parse_burst(payloads))
+        now = time.monotonic()
+        for stream, (route, msg) in items:
+            metrics = self.metrics.get(route.stream, route.device)
+            metrics.messages += 1
+            metrics.bytes += len(msg.payload)
+            # paho stamps messages with time.monotonic() on receipt
+            metrics.queue_wait_ms.observe((now - msg.timestamp) * 1000.0)
+            if route.encoding == JSON:
+                await self.ingest_json(route, msg, metrics, next(parsed) if parsed is not None else None)
+                continue
+            schema_name = self.schemas.detect(route.stream, len(msg.payload), route.schema)
+            if schema_name is None:
+                await self.dead_letter(route, msg, "No single frame schema of stream {} for {} bytes".format(
+                    route.stream, len(msg.payload)))
+                continue
+            schema = self.schemas.get(schema_name)
+            if self.tracker is not None and self.tracker.check(schema, route, msg.payload, metrics):
+                continue
+            if self.archive is not None:
+                self.archive_frame(schema, route, msg)
+            await self.ingest_frame(schema_name, route, msg)
+
+    async def ingest_frame(self, schema_name, route, msg):
+        try:
+            await self.decode_frame(schema_name, route, msg)
+        except Exception as ex:
+            _LOGGER.exception("Unable to ingest frame on topic %s: %s", route.topic, str(ex))
 
-    def on_subscribe(self, client, userdata, mid, granted_qos):
-        pass
+    async def ingest_json(self, route, msg, metrics, records=None):
+        """ Map the records of a JSON payload onto the datapoints of a schema of the route's stream type and queue
+        their readings; ``records`` are those of the payload when already parsed, or its ValueError
+        """
+        started = time.monotonic()
+        received = time.time() - (started - msg.timestamp)
+        try:
+            if records is None:
+                records = parse_records(bytes(msg.payload))
+            elif isinstance(records, ValueError):
+                raise records
+            readings = []
+            for record in records:
+                schema = self.schemas.json_schema(route.stream, record, route.schema)
+                unmapped = []
+                try:
+                    readings.append((schema, json_reading(schema, record, msg.topic, received, unmapped)))
+                except ValueError:
+                    schema.failure_count += 1
+                    raise
+                if unmapped:
+                    metrics.unmapped += len(unmapped)
+                    if _UNMAPPED_SAMPLER((schema.name, msg.topic)):
+                        _LOGGER.warning("%d keys of a JSON record on topic %s are not datapoints of schema %s, "
+                                        "e.g. %s", len(unmapped), msg.topic, schema.name, ', '.join(unmapped[:5]))
+        except KeyError:
+            await self.dead_letter(route, msg, "No frame schema for JSON stream {}".format(route.stream))
+            return
+        except ValueError as ex:
+            await self.dead_letter(route, msg, "{} JSON: {}".format(route.stream, ex))
+            return
+        metrics.decode_ms.observe((time.monotonic() - started) * 1000.0)
+        for schema, reading in readings:
+            schema.decode_count += 1
+            if schema.deadband is not None:
+                reading = self.exceptions.filter(schema, route, timestamp_seconds(reading['timestamp']), reading,
+                                                 metrics)
+                if reading is None:
+                    continue
+            await self.batcher.add({
+                'asset': self.asset_name(route),
+                'timestamp': utils.local_timestamp(),
+                'readings': reading
+            }, metrics, msg.timestamp, route.stream in self.immediate_streams)
+
+    def record_reading(self, schema, route, values, topic, metrics):
+        """ The reading of one decoded record, compact for the compact stream types; None when the schema's
+        deadbands suppress it
+        """
+        if route.stream not in self.compact_streams:
+            reading = schema.reading(values, topic)
+            if schema.deadband is None:
+                return reading
+            return self.exceptions.filter(schema, route, rtc_seconds(values[schema.rtc_slice]), reading, metrics)
+        # a compact reading carries every value, the deadbands only decide whether it is reported
+        if schema.deadband is not None and self.exceptions.filter(schema, route, rtc_seconds(values[schema.rtc_slice]),
+                                                                  schema.reading(values, topic), metrics) is None:
+            return None
+        if self._layouts.get(schema.name) != schema.layout:
+            try:
+                write_layout(schema.name, schema.layout, schema.layout_keys)
+                self._layouts[schema.name] = schema.layout
+            except OSError as ex:
+                _LOGGER.error("Unable to write the compact layout of %s: %s", schema.name, str(ex))
+        return schema.compact(values, topic)
+
+    def archive_frame(self, schema, route, msg):
+        """ Append a frame to the raw archive, indexed by the RTC of its first record """
+        if not msg.payload or len(msg.payload) % schema.size:
+            # left to the dead letters
+            return
+        rtc = rtc_seconds(schema.rtc_values(msg.payload))
+        self.archive.append(route.device, msg.topic, msg.payload, rtc, time.time() - (time.monotonic() - msg.timestamp))
+
+    async def dead_letter(self, route, msg, reason):
+        """ Spool an undecodable frame and ingest a counter reading in its place """
+        _LOGGER.debug("Dead letter on topic %s: %s", msg.topic, reason)
+        self.metrics.get(route.stream, route.device).decode_failures += 1
+        received = time.time() - (time.monotonic() - msg.timestamp)
+        self.dead_letters.append(msg.topic, msg.payload, reason, received)
+        await self.batcher.add({
+            'asset': self.asset_name(route),
+            'timestamp': utils.local_timestamp(),
+            'readings': {
+                'dead_letters': self.dead_letters.count,
+                'stream': route.stream,
+                'payload_size': len(msg.payload)
+            }
+        })
+
+    def dead_letter_unrouted(self, frame):
+        """ Spool a buffered frame whose topic no longer routes to a decoder, e.g. after a reconfiguration """
+        _LOGGER.warning("Dead letter on topic %s: no decoder routed for the buffered frame", frame.topic)
+        received = time.time() - (time.monotonic() - frame.timestamp)
+        self.dead_letters.append(frame.topic, frame.payload, 'No route for topic', received)
 
-    def on_unsubscribe(self, client, userdata, mid):
+    def asset_name(self, route):
+        """ Asset name of the readings of ``route``'s device and stream type """
+        try:
+            return self._assets[route.topic]
+        except KeyError:
+            asset = self.asset_template.format(asset=self.device_asset(route.topic) or self.asset, device=route.device,
+                                               stream=route.stream)
+            if len(self._assets) >= _MAX_CACHED_ASSETS:
+                self._assets.clear()
+            self._assets[route.topic] = asset
+            return asset
+
+    def device_asset(self, topic):
+        """ Asset name of the placed device subscribed to ``topic``, if any """
+        for device in self.devices.values():
+            for subscription in device.get('topic', '').split(','):
+                subscription = subscription.strip()
+                if subscription and device.get('asset') and mqtt.topic_matches_sub(subscription, topic):
+                    return device['asset']
+        return None
+
+    async def report_statistics(self):
+        """ Ingest the metrics of every stream type and device every ``statistics_interval`` seconds """
+        while True:
+            await asyncio.sleep(self.statistics_interval)
+            for metrics in self.metrics:
+                await self.batcher.add({
+                    'asset': self.statistics_asset,
+                    'timestamp': utils.local_timestamp(),
+                    'readings': metrics.reading()
+                })
+
+    def statistics(self):
+        """ Every plugin metric, as served by the metrics endpoint """
+        return {
+            'streams': [metrics.snapshot() for metrics in self.metrics],
+            'routes': self.router.stats(),
+            'schemas': self.schemas.stats(),
+            'schema_topic_fallbacks': self.schemas.topic_fallbacks,
+            'schema_ambiguous_lengths': self.schemas.ambiguous_lengths,
+            'queue': self.queue.stats(),
+            'batch_sizes': self.batcher.batch_sizes.snapshot(),
+            'connection': self.connection.snapshot(),
+            'dead_letters': self.dead_letters.stats(),
+            'archive': self.archive.stats() if self.archive is not None else None,
+            'rate_limits': self.rate_limiter.stats() if self.rate_limiter is not None else None,
+            'logging': plugin_logging.stats()
+        }
+
+    async def send(self, readings):
+        """ Pass a batch of readings to Fledge """
+        try:
+            await async_ingest.ingest_callback(c_callback, c_ingest_ref, readings)
+        except Exception as ex:
+            _LOGGER.exception("Unable to ingest %d readings: %s", len(readings), str(ex))
+
+    def on_subscribe(self, client, userdata, mid, granted_qos, properties=None):
+        if mid == self._subscribe_mid and self.connection.connected_at is not None:
+            self._subscribe_mid = None
+            self.connection.resubscribe_ms.observe((time.monotonic() - self.connection.connected_at) * 1000.0)
+
+    def on_unsubscribe(self, client, userdata, mid, properties=None, reason_codes=None):
         pass
 
     def start(self):
+        self.start_pipeline()
+
         if self.username and len(self.username.strip()) and self.password and len(self.password):
             # no strip on pwd len check, as it can be all spaces?!
             self.mqtt_client.username_pw_set(self.username, password=self.password)
-        # event callbacks
+        self.bind()
+
+        # the network loop makes the first attempt and retries it, so a broker that is down at start is not fatal
+        self.mqtt_client.reconnect_delay_set(self.backoff.min_delay, self.backoff.min_delay)
+        self.mqtt_client.connect_async(self.broker_host, self.broker_port, self.keep_alive_interval,
+                                       **self.connect_properties())
+        _LOGGER.info("MQTT connecting..., Broker Host: %s, Port: %s", self.broker_host, self.broker_port)
+
+        self.mqtt_client.loop_start()
+
+    def start_pipeline(self):
+        """ Start the ingest worker, the statistics task and the metrics endpoint """
+        self.worker.start()
+        if self.statistics_interval > 0:
+            self._statistics_task = asyncio.run_coroutine_threadsafe(self.report_statistics(), self.worker.loop)
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+
+    def bind(self):
+        """ Point the event callbacks of the MQTT client at this object """
         self.mqtt_client.on_connect = self.on_connect
 
         self.mqtt_client.on_subscribe = self.on_subscribe
+        self.mqtt_client.on_unsubscribe = self.on_unsubscribe
         self.mqtt_client.on_message = self.on_message
 
         self.mqtt_client.on_disconnect = self.on_disconnect
+        self.mqtt_client.on_connect_fail = self.on_connect_fail
 
-        self.mqtt_client.connect(self.broker_host, self.broker_port, self.keep_alive_interval)
-        _LOGGER.info("MQTT connecting..., Broker Host: %s, Port: %s", self.broker_host, self.broker_port)
+    def update_subscriptions(self, topics, qos, shared_group):
+        """ Subscribe the topics that were added and unsubscribe those that were removed, without reconnecting
 
-        self.mqtt_client.loop_start()
+        A changed QoS resubscribes every topic. While disconnected, the next CONNACK subscribes the new topics.
+        """
+        previous = {self.subscription(topic) for topic in self.topics}
+        resubscribe = qos != self.qos
+        self.topics, self.qos, self.shared_group = topics, qos, shared_group
+        self.topic = ','.join(topics)
+        if not self.mqtt_client.is_connected():
+            return
+        current = {self.subscription(topic) for topic in self.topics}
+        removed = sorted(previous - current)
+        added = sorted(current if resubscribe else current - previous)
+        if removed:
+            self.mqtt_client.unsubscribe(removed)
+            _LOGGER.info("MQTT unsubscribed the topics: %s", ', '.join(removed))
+        if added:
+            self.mqtt_client.subscribe([(subscription, self.qos) for subscription in added])
+            _LOGGER.info("MQTT subscribed the topics: %s", ', '.join(added))
+
+    def succeed(self, config):
+        """ Return a client for ``config`` that takes the broker connection of this one over
+
+        The network loop keeps running, so the broker sees neither a reconnect nor a missed PINGREQ. Once the
+        successor is bound, received frames go to its queue; its worker only starts after this client's worker
+        has ingested the frames queued before and exited, so every frame is decoded once, by either client,
+        and never by both at a time. A disk buffer on the same file is handed over with its frames.
+
+        Raises TimeoutError, with the connection closed, when this client's worker is still running after
+        _HANDOVER_TIMEOUT seconds.
+        """
+        try:
+            successor = MqttSubscriberClient(config, self.schemas, previous=self)
+        except Exception:
+            self.stop()
+            raise
+        topics, qos, shared_group = successor.topics, successor.qos, successor.shared_group
+        # the successor starts from this client's subscriptions
+        successor.topics, successor.qos, successor.shared_group = self.topics, self.qos, self.shared_group
+        # paho swaps a callback under the lock its callbacks run under: once bound, no frame is put on this
+        # client's queue any more
+        successor.bind()
+        successor.update_subscriptions(topics, qos, shared_group)
+        if not self.stop_pipeline(successor):
+            # the successor's worker must not run alongside this one
+            self.mqtt_client.disconnect()
+            self.mqtt_client.loop_stop()
+            raise TimeoutError("ingest worker still running after {:.0f} s".format(_HANDOVER_TIMEOUT))
+        # the dead letter count ingested with every dead letter goes on, from this client's last one
+        successor.dead_letters.continue_from(self.dead_letters)
+        successor.start_pipeline()
+        return successor
+
+    def stable_client_id(self):
+        """ Client ID that stays the same across restarts of this service
+
+        Neither the host name, which changes whenever the container is recreated, nor the topics, which change
+        whenever devices are placed on the service, are part of it: a new ID would orphan the session. The
+        service name is, so that services keeping the default asset name do not take over each other's session.
+        """
+        identity = '|'.join([_service_name(), self.broker_host, str(self.broker_port), self.asset])
+        return 'fledge-' + hashlib.sha1(identity.encode('utf-8')).hexdigest()[:16]
+
+    def connect_properties(self):
+        """ MQTTv5 CONNECT properties, as keyword arguments of ``Client.connect`` """
+        if self.protocol != mqtt.MQTTv5:
+            return {}
+        properties = Properties(PacketTypes.CONNECT)
+        if self.session_expiry:
+            properties.SessionExpiryInterval = self.session_expiry
+        if self.receive_maximum:
+            properties.ReceiveMaximum = self.receive_maximum
+        # a persistent session is resumed, even across a service restart
+        clean_start = False if self.persistent_session else mqtt.MQTT_CLEAN_START_FIRST_ONLY
+        return {'clean_start': clean_start, 'properties': properties}
 
     def stop(self):
         self.mqtt_client.disconnect()
         self.mqtt_client.loop_stop()
+        self.stop_pipeline()
+
+    def stop_pipeline(self, successor=None):
+        """ Ingest the queued frames and stop the worker, the statistics task and the metrics endpoint
+
+        A queue handed over to ``successor`` is left to it, neither drained nor released; a disk buffer it does
+        not take over is drained before it is released. The worker is given up to _HANDOVER_TIMEOUT seconds
+        then. Returns False when the worker is still running.
+        """
+        if self._statistics_task is not None:
+            self._statistics_task.cancel()
+        shared = successor is not None and successor.queue is self.queue
+        if successor is None:
+            stopped = self.worker.stop()
+        else:
+            stopped = self.worker.stop(_HANDOVER_TIMEOUT, close=not shared, drain=not shared)
+        if not stopped:
+            # the worker may still read the queue, a disk buffer stays mapped until the process exits
+            _LOGGER.warning("Ingest worker still running after stop, the receive queue is not released")
+        elif not shared:
+            self.queue.release()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        self.dead_letters.close()
+        if self.archive is not None:
+            self.archive.close()
+        return stopped
 
     def convert(self, msg):
         constructors = [json.loads, int, float, str]
@@ -349,492 +1242,34 @@ class MqttSubscriberClient(object):
                return converted_msg
         _LOGGER.exception("Unable to convert payload '%s' to a suitable type", str(msg)) 
         
-    async def save_ads_ph7(self, msg):
-        """Store msg content to Fledge with support for binary and JSON payloads."""
-        try:
-            
-            # Read the data back from the JSON file
-            with open('/usr/local/fledge/python/fledge/plugins/south/mqtt-readings-binary/ads.json', 'r') as json_file:
-                ads_data = json.load(json_file)
-
-            # Access the struct_format and field_names
-            struct_format = ads_data['struct_format']
-            field_names = ads_data['field_names']
-
-            struct_size = struct.calcsize(struct_format)
-
-            # Ensure payload size matches struct size
-            if len(msg.payload) != struct_size:
-                raise ValueError(f"Payload size {len(msg.payload)} does not match expected size {struct_size}.")
-
-            # Unpack the payload
-            unpacked_data = struct.unpack(struct_format, msg.payload)
-
-            # Extract data
-            analog_data = unpacked_data[:4]
-            timestamp = unpacked_data[4:11]  # seconds, minutes, hours, weekday, date, month, year
-            is_nlf = unpacked_data[11]
-
-            # Handle year correctly
-            year = timestamp[6] if timestamp[6] > 99 else 2000 + timestamp[6]
-
-            # Format timestamp
-            formatted_timestamp = f"{year}-{timestamp[5]:02d}-{timestamp[4]:02d} {timestamp[2]:02d}:{timestamp[1]:02d}:{timestamp[0]:02d}"
-
-            # Build the JSON object
-            payload_data = {
-                "ANASEN_CH1": analog_data[0],
-                "ANASEN_CH2": analog_data[1],
-                "ANASEN_CH3": analog_data[2],
-                "ANASEN_CH4": analog_data[3],
-                "timestamp": formatted_timestamp,
-                "IsNlf": is_nlf,
-                "topic": str(msg.topic)
-            }
-        except:
-                # If decoding fails, treat it as binary data
-            payload_data = {
-                'binary_data': list(msg.payload)  # Convert binary payload to a list of integers
-            }
-        
-        # Prepare data for ingestion
-        _LOGGER.debug("Ingesting data on topic %s: %s", str(msg.topic), payload_data)
-        data = {
-            'asset': self.asset,
-            'timestamp': utils.local_timestamp(),
-            'readings': payload_data
-        }
-        
-        # Use async_ingest callback to save data
-        await async_ingest.ingest_callback(c_callback, c_ingest_ref, data)
+    async def decode_frame(self, schema_name, route, msg):
+        """ Decode one MQTT message into one reading per record and queue them for ingest
 
-    async def save_ads_ph8(self, msg):
-        """Store msg content to Fledge with support for binary and JSON payloads."""
-        try:
-            
-            # Read the data back from the JSON file
-            with open('/usr/local/fledge/python/fledge/plugins/south/mqtt-readings-binary/ads_ph8.json', 'r') as json_file:
-                ads_data = json.load(json_file)
-
-            # Access the struct_format and field_names
-            struct_format = ads_data['struct_format']
-            field_names = ads_data['field_names']
-
-            struct_size = struct.calcsize(struct_format)
-
-            # Ensure payload size matches struct size
-            if len(msg.payload) != struct_size:
-                raise ValueError(f"Payload size {len(msg.payload)} does not match expected size {struct_size}.")
-
-            # Unpack the payload
-            unpacked_data = struct.unpack(struct_format, msg.payload)
-
-            # Extract data
-            analog_data = unpacked_data[:6]
-            timestamp = unpacked_data[6:13]  # seconds, minutes, hours, weekday, date, month, year
-            is_nlf = unpacked_data[13]
-
-            # Handle year correctly
-            year = timestamp[6] if timestamp[6] > 99 else 2000 + timestamp[6]
-
-            # Format timestamp
-            formatted_timestamp = f"{year}-{timestamp[5]:02d}-{timestamp[4]:02d} {timestamp[2]:02d}:{timestamp[1]:02d}:{timestamp[0]:02d}"
-
-            # Build the JSON object
-            payload_data = {
-                "ANASEN_CH1": analog_data[0],
-                "ANASEN_CH2": analog_data[1],
-                "ANASEN_CH3": analog_data[2],
-                "ANASEN_CH4": analog_data[3],
-                "ANASEN_CH5": analog_data[4],
-                "ANASEN_CH6": analog_data[5],
-                "timestamp": formatted_timestamp,
-                "IsNlf": is_nlf,
-                "topic": str(msg.topic)
-            }
-        except:
-                # If decoding fails, treat it as binary data
-            payload_data = {
-                'binary_data': list(msg.payload)  # Convert binary payload to a list of integers
-            }
-        
-        # Prepare data for ingestion
-        _LOGGER.debug("Ingesting data on topic %s: %s", str(msg.topic), payload_data)
-        data = {
-            'asset': self.asset,
-            'timestamp': utils.local_timestamp(),
-            'readings': payload_data
-        }
-        
-        # Use async_ingest callback to save data
-        await async_ingest.ingest_callback(c_callback, c_ingest_ref, data)
-
-
-
-    async def save_pds_ph7(self, msg):
-        """Store msg content to Fledge with support for binary and JSON payloads."""
-        try:
-            # Read the data back from the JSON file
-            with open('/usr/local/fledge/python/fledge/plugins/south/mqtt-readings-binary/pds.json', 'r') as json_file:
-                pds_data = json.load(json_file)
-
-            # Access the struct_format and field_names
-            struct_format = pds_data['struct_format']
-            field_names = pds_data['field_names']
-            #Calculate struct size
-            struct_size = struct.calcsize(struct_format)
-
-            # Ensure payload size matches struct size
-            if len(msg.payload) != struct_size:
-                raise ValueError(f"Payload size {len(msg.payload)} does not match expected size {struct_size}.")
-
-
-            #Unpack the payload
-            unpacked_data = struct.unpack(struct_format, msg.payload)
-            
-            #convert into json payload
-            json_payload = {field_name: value for field_name, value in zip(field_names, unpacked_data)}
-
-           # Parse and format timestamp
-            timestamp_data = unpacked_data[-8:-1]
-            seconds, minutes, hours, weekday, date, month, year = timestamp_data
-            year = int(year) if year > 99 else 2000 + int(year)
-            formatted_timestamp = f"{year}-{int(month):02d}-{int(date):02d} {int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}"
-            json_payload["timestamp"] = formatted_timestamp
-            
-            # Convert IsNlf to boolean
-            json_payload["IsNlf"] = bool(unpacked_data[-1])
-
-            # send topic type
-            json_payload["topic"] = str(msg.topic)
-
-            #Assign to payload_data
-            payload_data = json_payload
-
-        except:
-                # If decoding fails, treat it as binary data
-            payload_data = {
-                'binary_data': list(msg.payload)  # Convert binary payload to a list of integers
-            }
-        
-        # Prepare data for ingestion
-        _LOGGER.debug("Ingesting data on topic %s: %s", str(msg.topic), payload_data)
-        data = {
-            'asset': self.asset,
-            'timestamp': utils.local_timestamp(),
-            'readings': payload_data
-        }
-        
-        # Use async_ingest callback to save data
-        await async_ingest.ingest_callback(c_callback, c_ingest_ref, data)
-
-    async def save_pds_ph8(self, msg):
-        """Store msg content to Fledge with support for binary and JSON payloads."""
-        try:
-            # Read the data back from the JSON file
-            with open('/usr/local/fledge/python/fledge/plugins/south/mqtt-readings-binary/pds_ph8.json', 'r') as json_file:
-                pds_data = json.load(json_file)
-
-            # Access the struct_format and field_names
-            struct_format = pds_data['struct_format']
-            field_names = pds_data['field_names']
-            #Calculate struct size
-            struct_size = struct.calcsize(struct_format)
-
-            # Ensure payload size matches struct size
-            if len(msg.payload) != struct_size:
-                raise ValueError(f"Payload size {len(msg.payload)} does not match expected size {struct_size}.")
-
-
-            #Unpack the payload
-            unpacked_data = struct.unpack(struct_format, msg.payload)
-            
-            #convert into json payload
-            json_payload = {field_name: value for field_name, value in zip(field_names, unpacked_data)}
-
-           # Parse and format timestamp
-            timestamp_data = unpacked_data[-8:-1]
-            seconds, minutes, hours, weekday, date, month, year = timestamp_data
-            year = int(year) if year > 99 else 2000 + int(year)
-            formatted_timestamp = f"{year}-{int(month):02d}-{int(date):02d} {int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}"
-            json_payload["timestamp"] = formatted_timestamp
-            
-            # Convert IsNlf to boolean
-            json_payload["IsNlf"] = bool(unpacked_data[-1])
-
-            # send topic type
-            json_payload["topic"] = str(msg.topic)
-
-            #Assign to payload_data
-            payload_data = json_payload
-
-        except:
-                # If decoding fails, treat it as binary data
-            payload_data = {
-                'binary_data': list(msg.payload)  # Convert binary payload to a list of integers
-            }
-        
-        # Prepare data for ingestion
-        _LOGGER.debug("Ingesting data on topic %s: %s", str(msg.topic), payload_data)
-        data = {
-            'asset': self.asset,
-            'timestamp': utils.local_timestamp(),
-            'readings': payload_data
-        }
-        
-        # Use async_ingest callback to save data
-        await async_ingest.ingest_callback(c_callback, c_ingest_ref, data)
-
-    async def save_dds_ph7(self, msg):
-        """Store msg content to Fledge with support for binary and JSON payloads."""
-        try:
-
-            with open('/usr/local/fledge/python/fledge/plugins/south/mqtt-readings-binary/dds.json', 'r') as json_file:
-                dds_data = json.load(json_file)
-
-            # Access the struct_format and field_names
-            struct_format = dds_data['struct_format']
-            field_names = dds_data['field_names']
-
-            struct_size = struct.calcsize(struct_format)
-
-            # Ensure payload size matches struct size
-            if len(msg.payload) != struct_size:
-                raise ValueError(f"Payload size {len(msg.payload)} does not match expected size {struct_size}.")
-
-            # Unpack the payload
-            unpacked_data = struct.unpack(struct_format, msg.payload)
-
-            # Extract data
-            digital_data = unpacked_data[:8]
-            timestamp = unpacked_data[8:15]  # seconds, minutes, hours, weekday, date, month, year
-            is_nlf = unpacked_data[15]
-
-            # Handle year correctly
-            year = timestamp[6] if timestamp[6] > 99 else 2000 + timestamp[6]
-
-            # Format timestamp
-            formatted_timestamp = f"{year}-{timestamp[5]:02d}-{timestamp[4]:02d} {timestamp[2]:02d}:{timestamp[1]:02d}:{timestamp[0]:02d}"
-
-            # Build the JSON object
-            payload_data = {
-            "Digi1": digital_data[0],
-            "Digi2": digital_data[1],
-            "Digi3": digital_data[2],
-            "Digi4": digital_data[3],
-            "Digi5": digital_data[4],
-            "Digi6": digital_data[5],
-            "Digi7": digital_data[6],
-            "Digi8": digital_data[7],
-            "timestamp": formatted_timestamp,
-            "IsNlf": is_nlf,
-            "topic": str(msg.topic)
-            }
-        except:
-                # If decoding fails, treat it as binary data
-            payload_data = {
-                'binary_data': list(msg.payload)  # Convert binary payload to a list of integers
-            }
-        
-        # Prepare data for ingestion
-        _LOGGER.debug("Ingesting data on topic %s: %s", str(msg.topic), payload_data)
-        data = {
-            'asset': self.asset,
-            'timestamp': utils.local_timestamp(),
-            'readings': payload_data
-        }
-        
-        # Use async_ingest callback to save data
-        await async_ingest.ingest_callback(c_callback, c_ingest_ref, data)
-
-    async def save_dds_ph8(self, msg):
-        """Store msg content to Fledge with support for binary and JSON payloads."""
-        try:
-
-            with open('/usr/local/fledge/python/fledge/plugins/south/mqtt-readings-binary/dds_ph8.json', 'r') as json_file:
-                dds_data = json.load(json_file)
-
-            # Access the struct_format and field_names
-            struct_format = dds_data['struct_format']
-            field_names = dds_data['field_names']
-
-            struct_size = struct.calcsize(struct_format)
-
-            # Ensure payload size matches struct size
-            if len(msg.payload) != struct_size:
-                raise ValueError(f"Payload size {len(msg.payload)} does not match expected size {struct_size}.")
-
-            # Unpack the payload
-            unpacked_data = struct.unpack(struct_format, msg.payload)
-
-            # Extract data
-            digital_data = unpacked_data[:22]
-            timestamp = unpacked_data[22:29]  # seconds, minutes, hours, weekday, date, month, year
-            is_nlf = unpacked_data[29]
-
-            # Handle year correctly
-            year = timestamp[6] if timestamp[6] > 99 else 2000 + timestamp[6]
-
-            # Format timestamp
-            formatted_timestamp = f"{year}-{timestamp[5]:02d}-{timestamp[4]:02d} {timestamp[2]:02d}:{timestamp[1]:02d}:{timestamp[0]:02d}"
-
-            # Build the JSON object
-            payload_data = {
-            "Digi1": digital_data[0],
-            "Digi2": digital_data[1],
-            "Digi3": digital_data[2],
-            "Digi4": digital_data[3],
-            "Digi5": digital_data[4],
-            "Digi6": digital_data[5],
-            "Digi7": digital_data[6],
-            "Digi8": digital_data[7],
-            "Digi9": digital_data[8],
-            "Digi10": digital_data[9],
-            "Digi11": digital_data[10],
-            "Digi12": digital_data[11],
-            "Digi13": digital_data[12],
-            "Digi14": digital_data[13],
-            "Digi15": digital_data[14],
-            "Digi16": digital_data[15],
-            "Digi17": digital_data[16],
-            "Digi18": digital_data[17],
-            "Digi19": digital_data[18],
-            "Digi20": digital_data[19],
-            "Digi21": digital_data[20],
-            "Digi22": digital_data[21],
-            "timestamp": formatted_timestamp,
-            "IsNlf": is_nlf,
-            "topic": str(msg.topic)
-            }
-        except:
-                # If decoding fails, treat it as binary data
-            payload_data = {
-                'binary_data': list(msg.payload)  # Convert binary payload to a list of integers
-            }
-        
-        # Prepare data for ingestion
-        _LOGGER.debug("Ingesting data on topic %s: %s", str(msg.topic), payload_data)
-        data = {
-            'asset': self.asset,
-            'timestamp': utils.local_timestamp(),
-            'readings': payload_data
-        }
-        
-        # Use async_ingest callback to save data
-        await async_ingest.ingest_callback(c_callback, c_ingest_ref, data)
-
-    async def save_pq_ph7(self, msg):
-        """Store msg content to Fledge with support for binary and JSON payloads."""
+        A payload may carry several records back to back, e.g. from a device that buffered during a
+        backhaul outage; each record becomes its own reading with its own RTC timestamp.
+        """
+        schema = self.schemas.get(schema_name)
+        metrics = self.metrics.get(route.stream, route.device)
+        started = time.monotonic()
         try:
-            # Read the data back from the JSON file
-            with open('/usr/local/fledge/python/fledge/plugins/south/mqtt-readings-binary/pqs.json', 'r') as json_file:
-                pqs_data = json.load(json_file)
-
-            # Access the struct_format and field_names
-            struct_format = pqs_data ['struct_format']
-            field_names = pqs_data ['field_names']
-
-            #Calculate struct size
-            struct_size = struct.calcsize(struct_format)
-
-            # Ensure payload size matches struct size
-            if len(msg.payload) != struct_size:
-                raise ValueError(f"Payload size {len(msg.payload)} does not match expected size {struct_size}.")
-
-
-            #Unpack the payload
-            unpacked_data = struct.unpack(struct_format, msg.payload)
-            
-            #convert into json payload
-            json_payload = {field_name: value for field_name, value in zip(field_names, unpacked_data)}
-
-           # Parse and format timestamp
-            timestamp_data = unpacked_data[-8:-1]
-            seconds, minutes, hours, weekday, date, month, year = timestamp_data
-            year = int(year) if year > 99 else 2000 + int(year)
-            formatted_timestamp = f"{year}-{int(month):02d}-{int(date):02d} {int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}"
-            json_payload["timestamp"] = formatted_timestamp
-            
-            # Convert IsNlf to boolean
-            json_payload["IsNlf"] = bool(unpacked_data[-1])
-
-             # send topic type
-            json_payload["topic"] = str(msg.topic)
-
-            #Assign to payload_data
-            payload_data = json_payload
-
-        except:
-                # If decoding fails, treat it as binary data
-            payload_data = {
-                'binary_data': list(msg.payload)  # Convert binary payload to a list of integers
+            # Unpack every record, the schema rejects payloads that are not a whole number of records
+            records = [self.record_reading(schema, route, unpacked_data, msg.topic, metrics)
+                       for unpacked_data in schema.unpack_records(msg.payload)]
+        except Exception as ex:
+            await self.dead_letter(route, msg, "{}: {}".format(schema_name, ex))
+            return
+        metrics.decode_ms.observe((time.monotonic() - started) * 1000.0)
+
+        for payload_data in records:
+            if payload_data is None:
+                continue
+            # Prepare data for ingestion
+            _LOGGER.debug("Ingesting data on topic %s: %s", msg.topic, payload_data)
+            data = {
+                'asset': self.asset_name(route),
+                'timestamp': utils.local_timestamp(),
+                'readings': payload_data
             }
-        
-        # Prepare data for ingestion
-        _LOGGER.debug("Ingesting PQ data on topic %s: %s", str(msg.topic), payload_data)
-        data = {
-            'asset': self.asset,
-            'timestamp': utils.local_timestamp(),
-            'readings': payload_data
-        }
-        
-        # Use async_ingest callback to save data
-        await async_ingest.ingest_callback(c_callback, c_ingest_ref, data)
 
-    async def save_pq_ph8(self, msg):
-        """Store msg content to Fledge with support for binary and JSON payloads."""
-        try:
-            # Read the data back from the JSON file
-            with open('/usr/local/fledge/python/fledge/plugins/south/mqtt-readings-binary/pqs_ph8.json', 'r') as json_file:
-                pqs_data = json.load(json_file)
-
-            # Access the struct_format and field_names
-            struct_format = pqs_data ['struct_format']
-            field_names = pqs_data ['field_names']
-
-            #Calculate struct size
-            struct_size = struct.calcsize(struct_format)
-
-            # Ensure payload size matches struct size
-            if len(msg.payload) != struct_size:
-                raise ValueError(f"Payload size {len(msg.payload)} does not match expected size {struct_size}.")
-
-
-            #Unpack the payload
-            unpacked_data = struct.unpack(struct_format, msg.payload)
-            
-            #convert into json payload
-            json_payload = {field_name: value for field_name, value in zip(field_names, unpacked_data)}
-
-           # Parse and format timestamp
-            timestamp_data = unpacked_data[-8:-1]
-            seconds, minutes, hours, weekday, date, month, year = timestamp_data
-            year = int(year) if year > 99 else 2000 + int(year)
-            formatted_timestamp = f"{year}-{int(month):02d}-{int(date):02d} {int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}"
-            json_payload["timestamp"] = formatted_timestamp
-            
-            # Convert IsNlf to boolean
-            json_payload["IsNlf"] = bool(unpacked_data[-1])
-
-             # send topic type
-            json_payload["topic"] = str(msg.topic)
-
-            #Assign to payload_data
-            payload_data = json_payload
-
-        except:
-                # If decoding fails, treat it as binary data
-            payload_data = {
-                'binary_data': list(msg.payload)  # Convert binary payload to a list of integers
-            }
-        
-        # Prepare data for ingestion
-        _LOGGER.debug("Ingesting PQ data on topic %s: %s", str(msg.topic), payload_data)
-        data = {
-            'asset': self.asset,
-            'timestamp': utils.local_timestamp(),
-            'readings': payload_data
-        }
-        
-        # Use async_ingest callback to save data
-        await async_ingest.ingest_callback(c_callback, c_ingest_ref, data)
+            # Queue for the next batched ingest call
+            await self.batcher.add(data, metrics, msg.timestamp, route.stream in self.immediate_streams)
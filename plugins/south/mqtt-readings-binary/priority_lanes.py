@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Priority lanes of the receive queue and per-device rate caps
+
+A breaker opening reported on ``ddstop`` must not wait behind a backlog of PDS frames. The
+``priorityLanes`` configuration item lists the lanes from the most to the least urgent, e.g.::
+
+    [{"streams": ["dds"], "weight": 8, "immediate": true},
+     {"streams": ["ads"], "weight": 4},
+     {"streams": ["pds", "pqs"], "weight": 1}]
+
+Every lane has its own FIFO. A ``take_all`` hands out at most LANE_QUANTUM frames per unit of weight in
+total, filled lane by lane in priority order with each lane first getting its weighted share, so the
+ingest worker gets back to the urgent lanes after every such burst. Stream types in no lane join the
+last one. The readings of an ``immediate`` lane are ingested at once instead of lingering in their batch.
+
+When the queue is full a frame sheds the oldest frame of the least urgent lane below its own before its
+backpressure policy applies: PDS/PQS frames are lost long before DDS frames wait.
+
+A DeviceRateLimiter caps the frames per second of every (stream type, device) pair with a token bucket,
+so one misbehaving device cannot flood the queue.
+"""
+
+import collections
+import json
+import threading
+import time
+
+from ingest_worker import BLOCK, DROP_OLDEST
+from metrics import LATENCY_BUCKETS_MS, Histogram
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+DEFAULT_LANES = [
+    {"streams": ["dds"], "weight": 8, "immediate": True},
+    {"streams": ["ads"], "weight": 4},
+    {"streams": ["pds", "pqs"], "weight": 1}
+]
+
+# frames per unit of lane weight handed out by one take_all
+LANE_QUANTUM = 25
+# seconds of frames at the capped rate a device may send in one burst
+DEVICE_BURST = 2.0
+
+
+class Lane(object):
+    """ FIFO and counters of one priority class """
+
+    __slots__ = ['name', 'rank', 'weight', 'immediate', 'items', 'high_water', 'taken', 'shed', 'wait_ms']
+
+    def __init__(self, name, rank, weight, immediate):
+        self.name = name
+        self.rank = rank
+        self.weight = weight
+        self.immediate = immediate
+        # (monotonic put time, stream, item)
+        self.items = collections.deque()
+        self.high_water = 0
+        self.taken = 0
+        self.shed = 0
+        self.wait_ms = Histogram(LATENCY_BUCKETS_MS)
+
+    def stats(self):
+        return {'depth': len(self.items), 'high_water': self.high_water, 'taken': self.taken, 'shed': self.shed,
+                'wait_ms': self.wait_ms.snapshot()}
+
+
+def parse_lanes(value):
+    """ Parse the ``priorityLanes`` JSON configuration item into a list of Lanes, most urgent first """
+    if isinstance(value, str):
+        value = json.loads(value) if value.strip() else []
+    lanes = []
+    for rank, lane in enumerate(value):
+        streams = lane.get('streams') or []
+        if not streams:
+            raise ValueError("Priority lane {} has no stream types".format(rank + 1))
+        weight = int(lane.get('weight', 1))
+        if weight < 1:
+            raise ValueError("Priority lane {} has weight {}, expected at least 1".format(rank + 1, weight))
+        lanes.append((streams, Lane('/'.join(streams), rank, weight, bool(lane.get('immediate', False)))))
+    return lanes
+
+
+class PriorityFrameQueue(object):
+    """ Bounded, thread-safe queue of (stream, item) pairs with one FIFO per priority lane
+
+    Same interface as ingest_worker.FrameQueue; ``maxsize`` bounds the frames of all lanes together.
+    """
+
+    persistent = False
+
+    __slots__ = ['maxsize', 'default_policy', 'policies', 'on_ready', 'closed', 'high_water', 'blocked',
+                 'dropped', 'lanes', 'burst', '_lanes', '_last', '_size', '_lock', '_not_full']
+
+    def __init__(self, maxsize, lanes, default_policy=BLOCK, policies=None):
+        self.maxsize = maxsize
+        self.default_policy = default_policy
+        self.policies = policies or {}
+        self.on_ready = None
+        self.closed = False
+        self.high_water = 0
+        self.blocked = 0
+        self.dropped = collections.Counter()
+        self.lanes = [lane for _, lane in lanes]
+        self.burst = sum(lane.weight for lane in self.lanes) * LANE_QUANTUM
+        # stream type -> Lane
+        self._lanes = {stream: lane for streams, lane in lanes for stream in streams}
+        self._last = self.lanes[-1]
+        self._size = 0
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+
+    def lane(self, stream):
+        return self._lanes.get(stream, self._last)
+
+    def put(self, stream, item):
+        """ Queue ``item``; returns False when it (or nothing, if closed) was dropped """
+        lane = self.lane(stream)
+        with self._lock:
+            if self._size >= self.maxsize and not self._shed(lane) and not self._make_room(lane, stream):
+                self.dropped[stream] += 1
+                return False
+            if self.closed:
+                return False
+            was_empty = not self._size
+            lane.items.append((time.monotonic(), stream, item))
+            self._size += 1
+            if len(lane.items) > lane.high_water:
+                lane.high_water = len(lane.items)
+            if self._size > self.high_water:
+                self.high_water = self._size
+        if was_empty and self.on_ready is not None:
+            self.on_ready()
+        return True
+
+    def _shed(self, lane):
+        """ Drop the oldest frame of the least urgent non-empty lane below ``lane`` """
+        for lower in reversed(self.lanes[lane.rank + 1:]):
+            if lower.items:
+                lower.items.popleft()
+                lower.shed += 1
+                self._size -= 1
+                return True
+        return False
+
+    def _make_room(self, lane, stream):
+        policy = self.policies.get(stream, self.default_policy)
+        if policy == BLOCK:
+            self.blocked += 1
+            while self._size >= self.maxsize and not self.closed:
+                self._not_full.wait(1.0)
+            return True
+        if policy == DROP_OLDEST:
+            for index, (_, queued_stream, _) in enumerate(lane.items):
+                if queued_stream == stream:
+                    del lane.items[index]
+                    self.dropped[stream] += 1
+                    self._size -= 1
+                    return True
+        return False
+
+    def take_all(self):
+        """ Remove and return up to ``burst`` queued (stream, item) pairs, most urgent lane first """
+        now = time.monotonic()
+        taken = []
+        with self._lock:
+            budget = self.burst
+            shares = [min(len(lane.items), lane.weight * LANE_QUANTUM) for lane in self.lanes]
+            budget -= sum(shares)
+            # the share a lane leaves unused goes to the most urgent lanes with frames left
+            for index, lane in enumerate(self.lanes):
+                extra = min(len(lane.items) - shares[index], budget)
+                shares[index] += extra
+                budget -= extra
+            for lane, share in zip(self.lanes, shares):
+                for _ in range(share):
+                    queued, stream, item = lane.items.popleft()
+                    lane.wait_ms.observe((now - queued) * 1000.0)
+                    taken.append((stream, item))
+                lane.taken += share
+            self._size -= len(taken)
+            self._not_full.notify_all()
+        return taken
+
+    def ack(self):
+        """ Taken frames leave the queue at once """
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            self._not_full.notify_all()
+
+    def release(self):
+        """ Nothing to release once the worker has stopped """
+
+    def __len__(self):
+        return self._size
+
+    def stats(self):
+        return {'depth': self._size, 'high_water': self.high_water, 'blocked': self.blocked,
+                'dropped': dict(self.dropped), 'lanes': {lane.name: lane.stats() for lane in self.lanes}}
+
+
+class TokenBucket(object):
+
+    __slots__ = ['tokens', 'updated']
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class DeviceRateLimiter(object):
+    """ Caps the frames per second of every (stream type, device) pair; used from the paho network thread """
+
+    __slots__ = ['rate', 'capacity', 'limited', '_buckets']
+
+    def __init__(self, rate, burst=DEVICE_BURST):
+        self.rate = rate
+        self.capacity = max(1.0, rate * burst)
+        # frames dropped per device
+        self.limited = collections.Counter()
+        self._buckets = {}
+
+    def allow(self, route, now):
+        """ Return False when the route's device is over its rate at monotonic time ``now`` """
+        try:
+            bucket = self._buckets[route.stream, route.device]
+        except KeyError:
+            bucket = self._buckets[route.stream, route.device] = TokenBucket(self.capacity, now)
+        bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+        if bucket.tokens < 1.0:
+            self.limited[route.device] += 1
+            return False
+        bucket.tokens -= 1.0
+        return True
+
+    def stats(self):
+        return {'rate': self.rate, 'limited': dict(self.limited)}
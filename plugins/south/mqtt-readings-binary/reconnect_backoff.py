@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Jittered exponential reconnect backoff for the MQTT subscriber
+
+paho's network loop doubles its reconnect delay between fixed bounds, so every client that lost the same
+broker retries in lockstep. Before each wait the plugin sets both bounds to the next delay of a
+ReconnectBackoff, which grows exponentially with the failed attempts and is jittered over its upper half,
+spreading a fleet's reconnects over time.
+"""
+
+import random
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+
+class ReconnectBackoff(object):
+    """ Delays of consecutive reconnect attempts: uniform in [ceiling / 2, ceiling] where the ceiling is
+    ``min_delay * 2 ** (attempts + 1)`` capped at ``max_delay``
+    """
+
+    __slots__ = ['min_delay', 'max_delay', 'attempts', '_random']
+
+    def __init__(self, min_delay, max_delay, seed=None):
+        self.min_delay = max(0.1, float(min_delay))
+        self.max_delay = max(self.min_delay, float(max_delay))
+        self.attempts = 0
+        self._random = random.Random(seed)
+
+    def next_delay(self):
+        ceiling = min(self.max_delay, self.min_delay * 2 ** min(self.attempts + 1, 32))
+        self.attempts += 1
+        return max(self.min_delay, self._random.uniform(ceiling / 2, ceiling))
+
+    def reset(self):
+        self.attempts = 0
@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Frame schema registry for the mqtt-readings-binary south plugin
+
+Every ``*.json`` file in the plugin directory that carries a ``struct_format`` is a frame schema.
+Schemas are loaded and compiled once into a ``struct.Struct``; the files are only re-read when their
+mtime changes, and the mtime check itself is throttled to ``refresh_interval`` seconds so the hot path
+never touches the filesystem.
+
+A schema declares how its frames become readings:
+
+    struct_format   the frame layout
+    field_names     the name of each value, by position; values past the end of the list are not emitted
+    rtc_fields      [start, stop] positions of the RTC seconds, minutes, hours, weekday, date, month, year
+    flag_fields     flag name -> position, emitted as a boolean
+    output_names    field name -> datapoint name, for fields whose datapoint is named differently
+    exclude_fields  field names not emitted as datapoints
+    deadband        optional report-by-exception bands, see below
+    selected_fields optional names of the only fields to decode and emit
+
+Every reading carries its fields, the formatted RTC ``timestamp``, its flags and the ``topic``. A new
+hardware revision only needs a new schema file.
+
+A schema belongs to the stream type named by its file name up to the first ``_`` (``pds_ph8`` -> ``pds``),
+or by an explicit ``stream`` key. The registry indexes the schemas of each stream type by frame size, so
+the decoder of a frame is picked from its payload length alone; the schema named by the topic is only
+consulted when several schemas of the stream share that size (``pqs`` and ``pqs_ph8``).
+
+A ``deadband`` reports a datapoint only when it moved out of its band around the last reported value of
+the device::
+
+    "deadband": {
+        "integrity_interval": 900,
+        "default": {"absolute": 0},
+        "fields": {"Voltage_PN1": {"percent": 0.5}, "ANASEN_CH1": {"absolute": 0.01}}
+    }
+
+``fields`` sets the band of single fields, ``default`` that of every other field and flag; without a
+``default`` only the listed fields are banded. A band is ``absolute``, ``percent`` of the last reported
+value, or both, the wider one applying. Every ``integrity_interval`` seconds of RTC time a full reading
+is reported regardless.
+
+With ``selected_fields`` every other field is compiled to pad bytes, so ``struct`` skips it instead of
+converting it, and readings carry only the selected datapoints besides the timestamp, flags and topic. The
+RTC and flag values are always decoded.
+
+A compact reading carries the values of a record as one float array instead of named datapoints::
+
+    {"schema": "pds", "layout": 1234567890, "values": [...], "timestamp": "...", "topic": "..."}
+
+The ``layout`` ID is a checksum of the datapoint names the values stand for, see comms_gateway.compact,
+where filters and north plugins look them up to expand a compact reading when they need named access.
+
+JSON payloads are mapped onto the same datapoints through ``json_keys``, see json_payload.
+"""
+
+import calendar
+import glob
+import json
+import logging
+import operator
+import os
+import re
+import struct
+import time
+
+from comms_gateway import plugin_logging
+from comms_gateway.compact import layout_id
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+_LOGGER = plugin_logging.setup(__name__, level=logging.WARNING)
+
+DEFAULT_RTC_FIELDS = (-8, -1)
+DEFAULT_FLAG_FIELDS = {"IsNlf": -1}
+
+_FORMAT_TOKEN = re.compile(r'\s*(\d*)([xcbB?hHiIlLqQnNefdspP])')
+
+
+def expand_format(struct_format):
+    """ Split a struct format into its byte order character and one type code per item
+
+    Pad bytes are kept as ``x`` items; ``s`` and ``p`` items keep their length prefix, e.g. ``'4s'``.
+    """
+    byte_order = struct_format[:1] if struct_format[:1] in '@=<>!' else '@'
+    body = struct_format[1:] if struct_format[:1] in '@=<>!' else struct_format
+    codes = []
+    for count, code in _FORMAT_TOKEN.findall(body):
+        if code in 'sp':
+            codes.append(count + code)
+        else:
+            codes.extend([code] * int(count or 1))
+    return byte_order, codes
+
+
+def _format(byte_order, codes):
+    """ Join type codes back into a struct format, runs of pad bytes as one ``<n>x`` item """
+    items = []
+    for code in codes:
+        if code == 'x' and items and items[-1][0] == 'x':
+            items[-1][1] += 1
+        else:
+            items.append([code, 1])
+    return byte_order + ''.join(code if count == 1 else '{}{}'.format(count, code) for code, count in items)
+
+
+def project(definition):
+    """ Return a copy of a schema definition whose ``selected_fields``, field or datapoint names, are its only
+    decoded fields
+
+    Unselected values become pad bytes of their size. The RTC and flag values stay decoded and their
+    positions are renumbered; unselected ones are excluded from the reading.
+    """
+    selected = definition.get('selected_fields')
+    if not selected:
+        return definition
+    byte_order, codes = expand_format(definition['struct_format'])
+    if byte_order == '@':
+        raise ValueError("selected_fields needs a standard size byte order, native alignment would move fields")
+    field_names = list(definition['field_names'])
+    output_names = definition.get('output_names', {})
+    # fields may be selected by their field or their datapoint name
+    unknown = set(selected) - set(field_names) - {output_names.get(name) for name in field_names}
+    if unknown:
+        raise ValueError("selected_fields {} are not fields of the schema".format(', '.join(sorted(unknown))))
+    selected = {name for name in field_names if name in selected or output_names.get(name) in selected}
+    count = sum(1 for code in codes if code != 'x')
+    start, stop = definition.get('rtc_fields', DEFAULT_RTC_FIELDS)
+    rtc_positions = list(range(count)[slice(start, stop)])
+    flag_positions = {name: int(index) % count
+                      for name, index in definition.get('flag_fields', DEFAULT_FLAG_FIELDS).items()}
+    keep = set(rtc_positions) | set(flag_positions.values())
+    keep.update(index for index, name in enumerate(field_names[:count]) if name in selected)
+
+    projected_codes, renumbered, names = [], {}, []
+    position = 0
+    for code in codes:
+        if code == 'x':
+            projected_codes.append(code)
+            continue
+        if position in keep:
+            renumbered[position] = len(renumbered)
+            projected_codes.append(code)
+            if position < len(field_names):
+                names.append(field_names[position])
+        else:
+            projected_codes.extend('x' * struct.calcsize(byte_order + code))
+        position += 1
+
+    projected = dict(definition)
+    projected['struct_format'] = _format(byte_order, projected_codes)
+    projected['field_names'] = names
+    if rtc_positions:
+        projected['rtc_fields'] = [renumbered[rtc_positions[0]], renumbered[rtc_positions[-1]] + 1]
+    projected['flag_fields'] = {name: renumbered[index] for name, index in flag_positions.items()}
+    projected['exclude_fields'] = [name for name in names if name not in selected and name not in flag_positions]
+    projected['exclude_fields'].extend(definition.get('exclude_fields', ()))
+    return projected
+
+
+def rtc_timestamp(timestamp):
+    """ Format the RTC fields (seconds, minutes, hours, weekday, date, month, year) of a frame """
+    seconds, minutes, hours, weekday, date, month, year = timestamp
+    # Handle year correctly
+    year = int(year) if year > 99 else 2000 + int(year)
+    return f"{year}-{int(month):02d}-{int(date):02d} {int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}"
+
+
+def rtc_seconds(timestamp):
+    """ Seconds since the epoch of the RTC fields of a frame, None when they are not a valid date """
+    seconds, minutes, hours, weekday, date, month, year = timestamp
+    year = int(year) if year > 99 else 2000 + int(year)
+    try:
+        return calendar.timegm((year, int(month), int(date), int(hours), int(minutes), int(seconds)))
+    except (ValueError, OverflowError):
+        return None
+
+
+def _item_picker(indices):
+    """ Return a function picking ``indices`` out of a value tuple, always as a tuple """
+    if not indices:
+        return lambda values: ()
+    if len(indices) == 1:
+        index = indices[0]
+        return lambda values: (values[index],)
+    return operator.itemgetter(*indices)
+
+
+class FrameSchema(object):
+    """ A compiled frame schema """
+
+    __slots__ = ['name', 'path', 'mtime', 'struct_format', 'struct', 'size', 'byte_order', 'codes', 'field_names',
+                 'stream', 'rtc_slice', 'rtc_offset', 'rtc_struct', 'keys', 'layout_keys', 'layout', 'deadband',
+                 'integrity_interval', 'json_keys',
+                 'decode_count', 'failure_count', '_pick', '_pick_flags', '_to_bool']
+
+    def __init__(self, name, path, mtime, definition):
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+        definition = project(definition)
+        self.struct_format = definition['struct_format']
+        self.struct = struct.Struct(self.struct_format)
+        self.size = self.struct.size
+        self.byte_order, self.codes = expand_format(self.struct_format)
+        self.field_names = tuple(definition['field_names'])
+        self.stream = definition.get('stream', name.split('_', 1)[0])
+        self.decode_count = 0
+        self.failure_count = 0
+        self._compile_template(definition)
+
+    def _compile_template(self, definition):
+        """ Precompute the datapoint names of a reading and the value positions that fill them """
+        value_codes = [code for code in self.codes if code != 'x']
+        count = len(value_codes)
+
+        def position(index):
+            index = int(index)
+            if not -count <= index < count:
+                raise ValueError("Position {} is outside the {} values of the frame".format(index, count))
+            return index % count
+
+        start, stop = definition.get('rtc_fields', DEFAULT_RTC_FIELDS)
+        self.rtc_slice = slice(start, stop)
+        if len(range(count)[self.rtc_slice]) != 7:
+            raise ValueError("rtc_fields must span the 7 RTC values")
+        self._compile_rtc(range(count)[self.rtc_slice])
+        flags = {name: position(index) for name, index in definition.get('flag_fields', DEFAULT_FLAG_FIELDS).items()}
+        output_names = definition.get('output_names', {})
+        exclude = set(definition.get('exclude_fields', ()))
+        # '?' values already unpack as bool, other flag types need converting
+        to_bool = [output_names.get(name, name) for name, index in flags.items() if value_codes[index] != '?']
+
+        keys, indices = [], []
+        for index, name in enumerate(self.field_names[:count]):
+            if name in exclude:
+                continue
+            keys.append(output_names.get(name, name))
+            # a flag that is also an emitted field keeps its place but takes the flag's value
+            indices.append(flags.pop(name, index))
+        keys.append('timestamp')
+        keys.extend(output_names.get(name, name) for name in flags)
+        keys.append('topic')
+
+        self.keys = tuple(keys)
+        # the values of a compact reading, in the order of the reading template
+        self.layout_keys = tuple(key for key in self.keys if key not in ('timestamp', 'topic'))
+        self.layout = layout_id(self.layout_keys)
+        # JSON records name a datapoint by its datapoint or its field name
+        json_keys = {key: key for key in self.layout_keys}
+        json_keys.update((name, output_names[name]) for name in self.field_names if output_names.get(name) in json_keys)
+        self.json_keys = json_keys
+        self._pick = _item_picker(indices)
+        self._pick_flags = _item_picker(list(flags.values()))
+        self._to_bool = tuple(to_bool)
+        self._compile_deadband(definition.get('deadband'), output_names)
+
+    def _compile_deadband(self, definition, output_names):
+        """ Resolve the deadband of each datapoint into (absolute, percent) """
+        self.deadband = None
+        self.integrity_interval = None
+        if not definition:
+            return
+
+        def band(spec):
+            absolute, percent = float(spec.get('absolute', 0)), float(spec.get('percent', 0))
+            if absolute < 0 or percent < 0:
+                raise ValueError("Deadband bands cannot be negative")
+            return absolute, percent
+
+        datapoints = [key for key in self.keys if key not in ('timestamp', 'topic')]
+        default = definition.get('default')
+        deadband = {key: band(default) for key in datapoints} if default is not None else {}
+        for name, spec in definition.get('fields', {}).items():
+            key = output_names.get(name, name)
+            if key not in datapoints:
+                raise ValueError("Deadband field {} is not a datapoint of the schema".format(name))
+            deadband[key] = band(spec)
+        self.deadband = deadband
+        interval = definition.get('integrity_interval')
+        self.integrity_interval = float(interval) if interval else None
+
+    def _compile_rtc(self, positions):
+        """ Locate the bytes of the RTC values, so they can be read without unpacking the whole record """
+        self.rtc_offset = None
+        self.rtc_struct = None
+        if self.byte_order == '@' or list(positions) != list(range(positions[0], positions[-1] + 1)):
+            # native alignment depends on what precedes a field, such frames are unpacked whole
+            return
+        value_codes = [index for index, code in enumerate(self.codes) if code != 'x']
+        first, last = value_codes[positions[0]], value_codes[positions[-1]]
+        self.rtc_offset = struct.calcsize(self.byte_order + ''.join(self.codes[:first]))
+        self.rtc_struct = struct.Struct(self.byte_order + ''.join(self.codes[first:last + 1]))
+
+    def rtc_values(self, payload, offset=0):
+        """ The 7 RTC values of the record at ``offset`` of ``payload`` """
+        if self.rtc_struct is None:
+            return self.struct.unpack_from(payload, offset)[self.rtc_slice]
+        return self.rtc_struct.unpack_from(payload, offset + self.rtc_offset)
+
+    def reading(self, values, topic):
+        """ Fill the reading template with one record's values """
+        reading = dict(zip(self.keys, self._pick(values) + (rtc_timestamp(values[self.rtc_slice]),) +
+                           self._pick_flags(values) + (topic,)))
+        for key in self._to_bool:
+            reading[key] = bool(reading[key])
+        return reading
+
+    def compact(self, values, topic):
+        """ One record's values as a compact reading """
+        return {'schema': self.name, 'layout': self.layout,
+                'values': [float(value) for value in self._pick(values) + self._pick_flags(values)],
+                'timestamp': rtc_timestamp(values[self.rtc_slice]), 'topic': topic}
+
+    def unpack_records(self, payload):
+        """ Unpack a payload of one or more back-to-back records without copying it
+
+        Returns the list of value tuples, raising ValueError unless the payload is a whole number of records.
+        """
+        count, remainder = divmod(len(payload), self.size)
+        if remainder or not count:
+            self.failure_count += 1
+            raise ValueError("Payload size {} is not a multiple of the record size {}.".format(len(payload), self.size))
+        records = list(self.struct.iter_unpack(memoryview(payload)))
+        self.decode_count += count
+        return records
+
+
+class SchemaRegistry(object):
+    """ Loads, compiles and caches the frame schemas of a directory """
+
+    __slots__ = ['schema_dir', 'refresh_interval', 'topic_fallbacks', 'ambiguous_lengths', '_schemas', '_by_size',
+                 '_by_stream', '_ambiguous', '_next_check']
+
+    def __init__(self, schema_dir, refresh_interval=5.0):
+        self.schema_dir = schema_dir
+        self.refresh_interval = refresh_interval
+        self.topic_fallbacks = 0
+        self.ambiguous_lengths = 0
+        self._schemas = {}
+        # stream type -> frame size -> names of the schemas of that size
+        self._by_size = {}
+        # stream type -> names of its schemas
+        self._by_stream = {}
+        # (stream type, payload length) pairs already logged as ambiguous
+        self._ambiguous = set()
+        self._next_check = 0.0
+
+    def load(self):
+        """ (Re)load every schema file whose mtime changed since it was last compiled """
+        seen = set()
+        changed = False
+        for path in sorted(glob.glob(os.path.join(self.schema_dir, '*.json'))):
+            name = os.path.splitext(os.path.basename(path))[0]
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            seen.add(name)
+            current = self._schemas.get(name)
+            if current is not None and current.mtime == mtime:
+                continue
+            try:
+                with open(path, 'r') as json_file:
+                    definition = json.load(json_file)
+                if 'struct_format' not in definition:
+                    continue
+                schema = FrameSchema(name, path, mtime, definition)
+            except (ValueError, KeyError, struct.error) as ex:
+                # keep serving the last good compilation of a schema that was broken by an edit
+                _LOGGER.error("Unable to compile frame schema %s: %s", path, str(ex))
+                continue
+            if current is not None:
+                schema.decode_count = current.decode_count
+                schema.failure_count = current.failure_count
+                _LOGGER.info("Frame schema %s reloaded", name)
+            self._schemas[name] = schema
+            changed = True
+        for name in set(self._schemas) - seen:
+            del self._schemas[name]
+            changed = True
+        if changed:
+            self._index_sizes()
+        self._next_check = time.monotonic() + self.refresh_interval
+
+    def get(self, name):
+        """ Return the compiled schema ``name``; raises KeyError when unknown """
+        if time.monotonic() >= self._next_check:
+            self.load()
+        return self._schemas[name]
+
+    def _index_sizes(self):
+        by_size = {}
+        for name in sorted(self._schemas):
+            schema = self._schemas[name]
+            by_size.setdefault(schema.stream, {}).setdefault(schema.size, []).append(name)
+        self._by_size = {stream: {size: tuple(names) for size, names in sizes.items()}
+                         for stream, sizes in by_size.items()}
+        self._by_stream = {stream: tuple(sorted(name for names in sizes.values() for name in names))
+                           for stream, sizes in by_size.items()}
+        self._ambiguous = set()
+
+    def detect(self, stream, length, topic_schema):
+        """ Return the name of the ``stream`` schema whose frames make up a ``length`` byte payload
+
+        An exact frame size match wins over a payload of several back-to-back records. ``topic_schema``, the
+        schema named by the topic, settles a tie between schemas of the same size and is also returned when
+        no schema fits, so the frame still fails to decode the way it used to. Returns None when the stream
+        type has no schema at all, and when the payload is a whole number of records of several sizes
+        (527 bytes are 31 dds or 17 dds_ph8 records) and the topic names none of them.
+        """
+        if time.monotonic() >= self._next_check:
+            self.load()
+        sizes = self._by_size.get(stream)
+        if not sizes:
+            return None
+        candidates = sizes.get(length)
+        if candidates is None and length:
+            candidates = tuple(name for size, names in sizes.items() if length % size == 0 for name in names)
+        if candidates and len(candidates) == 1:
+            return candidates[0]
+        if candidates:
+            self.topic_fallbacks += 1
+            if topic_schema in candidates:
+                return topic_schema
+            if len({self._schemas[name].size for name in candidates}) > 1:
+                self.ambiguous_lengths += 1
+                if (stream, length) not in self._ambiguous:
+                    self._ambiguous.add((stream, length))
+                    _LOGGER.warning("A %d byte %s payload is a whole number of records of %s", length, stream,
+                                    ', '.join(candidates))
+                return None
+            return candidates[0]
+        return topic_schema if topic_schema in self._schemas else None
+
+    def json_schema(self, stream, record, topic_schema):
+        """ Return the ``stream`` schema whose JSON keys cover most of the keys of a JSON ``record``
+
+        ``topic_schema``, the schema named by the topic, settles a tie; raises KeyError when the stream type
+        has no schema.
+        """
+        if time.monotonic() >= self._next_check:
+            self.load()
+        best, covered = self._schemas.get(topic_schema), -1
+        if best is not None:
+            covered = sum(1 for key in record if key in best.json_keys)
+        for name in self._by_stream.get(stream, ()):
+            schema = self._schemas[name]
+            if schema is best:
+                continue
+            count = sum(1 for key in record if key in schema.json_keys)
+            if count > covered:
+                best, covered = schema, count
+        if best is None:
+            raise KeyError(topic_schema)
+        return best
+
+    def names(self):
+        return sorted(self._schemas)
+
+    def stats(self):
+        """ Decode and failure counts per schema """
+        return {name: {'decoded': schema.decode_count, 'failed': schema.failure_count}
+                for name, schema in self._schemas.items()}
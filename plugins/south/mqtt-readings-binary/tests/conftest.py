@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Puts the mqtt-readings-binary plugin modules and the shared comms_gateway package on the path, the way
+Fledge loads them
+"""
+
+import os
+import sys
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(PLUGIN_DIR)))
+
+for path in (PLUGIN_DIR, os.path.join(REPO_DIR, 'plugins', 'common')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Compact readings: layout IDs, layout files and expansion """
+
+import importlib.util
+import os
+import struct
+import zlib
+
+import pytest
+
+from comms_gateway import compact
+from conftest import REPO_DIR
+from schema_registry import FrameSchema
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+DEFINITION = {
+    "struct_format": "<3f 7B ?",
+    "field_names": ["Voltage", "Current", "Power"]
+}
+VALUES = (230.0, 5.0, 1000.0, 0, 0, 12, 3, 1, 1, 25, True)
+
+
+@pytest.fixture(autouse=True)
+def layouts(monkeypatch):
+    monkeypatch.setattr(compact, '_layouts', {})
+
+
+@pytest.fixture
+def schema():
+    return FrameSchema('pds_test', 'pds_test.json', 0, DEFINITION)
+
+
+def test_the_layout_id_is_the_crc_of_the_datapoint_names(schema):
+    assert schema.layout_keys == ('Voltage', 'Current', 'Power', 'IsNlf')
+    assert schema.layout == compact.layout_id(schema.layout_keys) == zlib.crc32(b'Voltage\nCurrent\nPower\nIsNlf')
+    assert compact.layout_id(['Current', 'Voltage']) != compact.layout_id(['Voltage', 'Current'])
+
+
+def test_a_compact_reading_expands_to_the_full_reading(schema, tmp_path):
+    compact.write_layout(schema.name, schema.layout, schema.layout_keys, str(tmp_path))
+    assert compact.compact_keys(schema.name, schema.layout, str(tmp_path)) == list(schema.layout_keys)
+    values = struct.unpack(DEFINITION['struct_format'], struct.pack(DEFINITION['struct_format'], *VALUES))
+    reading = schema.compact(values, 'dev1/pds')
+    assert compact.expand_reading(reading) == schema.reading(values, 'dev1/pds')
+
+
+def test_a_filter_reading_with_bytes_keys_expands(schema, tmp_path):
+    compact.write_layout(schema.name, schema.layout, schema.layout_keys, str(tmp_path))
+    compact.compact_keys(schema.name, schema.layout, str(tmp_path))
+    reading = {'schema': schema.name.encode(), 'layout': schema.layout, 'values': [1, 2, 3, 0],
+               'timestamp': 't', 'topic': 'dev1/pds'}
+    assert compact.expand_reading(reading, float) == {'timestamp': 't', 'topic': 'dev1/pds', 'Voltage': 1.0,
+                                                      'Current': 2.0, 'Power': 3.0, 'IsNlf': 0.0}
+
+
+def test_a_reading_of_another_layout_stays_compact(schema, tmp_path):
+    compact.write_layout(schema.name, schema.layout, schema.layout_keys, str(tmp_path))
+    assert compact.compact_keys(schema.name, schema.layout + 1, str(tmp_path)) is None
+    reading = {'schema': schema.name, 'layout': schema.layout + 1, 'values': [1.0], 'timestamp': 't'}
+    assert compact.expand_reading(reading) is reading
+
+
+def test_a_missing_layout_file_is_no_error(tmp_path):
+    assert compact.compact_keys('pds_missing', 1, str(tmp_path)) is None
+
+
+def test_other_readings_are_returned_as_they_are():
+    reading = {'Voltage': 230.0, 'timestamp': 't'}
+    assert compact.expand_reading(reading) is reading
+
+
+def test_the_north_filter_expands_compact_readings(schema, tmp_path):
+    spec = importlib.util.spec_from_file_location(
+        'expand_compact_readings', os.path.join(REPO_DIR, 'plugins', 'filter', 'compact', 'expand_compact_readings.py'))
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+    compact.write_layout(schema.name, schema.layout, schema.layout_keys, str(tmp_path))
+    compact.compact_keys(schema.name, schema.layout, str(tmp_path))
+    # python35 filters get byte keys
+    readings = [{'asset_code': b'mqtt-', 'reading': {b'schema': schema.name.encode(), b'layout': schema.layout,
+                                                     b'values': [1.0, 2.0, 3.0, 0.0], b'topic': b'dev1/pds'}},
+                {'asset_code': b'mqtt-', 'reading': {b'Voltage': 230.0}}]
+    expanded = script.expand_compact_readings(readings)
+    assert expanded[0]['reading'] == {b'topic': b'dev1/pds', b'Voltage': 1.0, b'Current': 2.0, b'Power': 3.0,
+                                      b'IsNlf': 0.0}
+    assert expanded[1]['reading'] == {b'Voltage': 230.0}
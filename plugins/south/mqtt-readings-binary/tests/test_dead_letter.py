@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" DeadLetterSpool: spooling, rotation and reading the spool back """
+
+import os
+import struct
+
+import pytest
+
+from conftest import PLUGIN_DIR
+from dead_letter import DeadLetterSpool, main, read_spool
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+
+@pytest.fixture
+def spool_path(tmp_path):
+    return str(tmp_path / 'spool' / 'dead.spool')
+
+
+def test_spooled_frames_are_read_back_in_order(spool_path):
+    spool = DeadLetterSpool(spool_path, 1024 * 1024)
+    assert spool.append('STMS1/pdstop', b'\x01\x02', 'Payload size 2', received=100.0)
+    assert spool.append('STMS1/ddstop', memoryview(b'\x03'), 'No route for topic', received=101.0)
+    spool.close()
+    letters = list(read_spool(spool_path))
+    assert [(letter.received, letter.topic, letter.reason, letter.payload) for letter in letters] == [
+        (100.0, 'STMS1/pdstop', 'Payload size 2', b'\x01\x02'),
+        (101.0, 'STMS1/ddstop', 'No route for topic', b'\x03')]
+    assert spool.stats()['spooled'] == 2
+
+
+def test_a_full_spool_is_moved_aside(spool_path):
+    spool = DeadLetterSpool(spool_path, 200)
+    for number in range(5):
+        assert spool.append('STMS1/pdstop', bytes([number]) * 50, 'reason')
+    spool.close()
+    assert spool.rotations == 2
+    assert os.path.getsize(spool_path) <= 200
+    # the spool and its predecessor hold the latest frames
+    payloads = [letter.payload[0] for path in (spool_path + '.1', spool_path) for letter in read_spool(path)]
+    assert payloads == [2, 3, 4]
+
+
+def test_a_torn_last_record_is_skipped(spool_path):
+    spool = DeadLetterSpool(spool_path, 1024)
+    spool.append('STMS1/pdstop', b'\x01' * 10, 'reason')
+    spool.append('STMS1/pdstop', b'\x02' * 10, 'reason')
+    spool.close()
+    with open(spool_path, 'r+b') as spool_file:
+        spool_file.truncate(os.path.getsize(spool_path) - 3)
+    assert [letter.payload for letter in read_spool(spool_path)] == [b'\x01' * 10]
+
+
+def test_another_file_is_no_spool(tmp_path):
+    path = tmp_path / 'other'
+    path.write_bytes(b'\x00' * 64)
+    with pytest.raises(ValueError):
+        list(read_spool(str(path)))
+
+
+def test_an_unwritable_spool_counts_the_error(tmp_path):
+    # a directory stands where the spool file should be
+    spool = DeadLetterSpool(str(tmp_path), 1024)
+    assert not spool.append('STMS1/pdstop', b'\x01', 'reason')
+    assert spool.write_errors == 1
+
+
+def test_spooled_frames_are_decoded_offline(spool_path, capsys):
+    spool = DeadLetterSpool(spool_path, 1024)
+    record = struct.pack('<8BB B B B B B H?', *range(8), 1, 30, 12, 3, 15, 6, 2025, False)
+    spool.append('STMS1/ddstop', record * 2, 'reason')
+    spool.append('STMS1/ddstop', b'\x01', 'reason')
+    spool.close()
+    assert main([spool_path, '--schemas', PLUGIN_DIR]) == 1
+    out, err = capsys.readouterr()
+    assert len(out.splitlines()) == 2
+    assert '1 frames decoded, 1 still failing' in err
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Report-by-exception deadbands and integrity readings """
+
+import types
+
+import pytest
+
+from deadband import ReportByException
+from schema_registry import FrameSchema
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+DEFINITION = {
+    "struct_format": "<3f 7B ?",
+    "field_names": ["Voltage", "Current", "Power"],
+    "deadband": {
+        "integrity_interval": 900,
+        "default": {"absolute": 0},
+        "fields": {"Voltage": {"percent": 1}, "Current": {"absolute": 0.5}}
+    }
+}
+RTC = 1735732800  # 2025-01-01 12:00:00
+DEVICE1 = types.SimpleNamespace(stream='pds', device='dev1')
+DEVICE2 = types.SimpleNamespace(stream='pds', device='dev2')
+
+
+@pytest.fixture
+def schema():
+    return FrameSchema('pds_test', 'pds_test.json', 0, DEFINITION)
+
+
+@pytest.fixture
+def metrics():
+    return types.SimpleNamespace(suppressed=0)
+
+
+def reading(voltage=230.0, current=5.0, power=1000.0, flag=False):
+    return {'Voltage': voltage, 'Current': current, 'Power': power, 'timestamp': '2025-01-01 12:00:00',
+            'IsNlf': flag, 'topic': 'dev1/pds'}
+
+
+def test_the_first_reading_is_reported_whole(schema, metrics):
+    exceptions = ReportByException()
+    assert exceptions.filter(schema, DEVICE1, RTC, reading(), metrics) == reading()
+
+
+def test_datapoints_within_their_band_are_stripped(schema, metrics):
+    exceptions = ReportByException()
+    exceptions.filter(schema, DEVICE1, RTC, reading(), metrics)
+    reported = exceptions.filter(schema, DEVICE1, RTC + 1, reading(voltage=231.0, current=5.6), metrics)
+    assert reported == {'Current': 5.6, 'timestamp': '2025-01-01 12:00:00', 'topic': 'dev1/pds'}
+
+
+def test_a_percent_band_follows_the_last_reported_value(schema, metrics):
+    exceptions = ReportByException()
+    exceptions.filter(schema, DEVICE1, RTC, reading(), metrics)
+    assert exceptions.filter(schema, DEVICE1, RTC + 1, reading(voltage=232.0), metrics) is None
+    assert 'Voltage' in exceptions.filter(schema, DEVICE1, RTC + 2, reading(voltage=233.0), metrics)
+    # the band is now around 233
+    assert exceptions.filter(schema, DEVICE1, RTC + 3, reading(voltage=234.0), metrics) is None
+
+
+def test_an_unchanged_reading_is_suppressed(schema, metrics):
+    exceptions = ReportByException()
+    exceptions.filter(schema, DEVICE1, RTC, reading(), metrics)
+    assert exceptions.filter(schema, DEVICE1, RTC + 1, reading(), metrics) is None
+    assert metrics.suppressed == 1
+
+
+def test_the_default_band_applies_to_flags(schema, metrics):
+    exceptions = ReportByException()
+    exceptions.filter(schema, DEVICE1, RTC, reading(), metrics)
+    assert exceptions.filter(schema, DEVICE1, RTC + 1, reading(flag=True), metrics)['IsNlf'] is True
+
+
+def test_devices_have_their_own_bands(schema, metrics):
+    exceptions = ReportByException()
+    exceptions.filter(schema, DEVICE1, RTC, reading(), metrics)
+    assert exceptions.filter(schema, DEVICE2, RTC, reading(), metrics) == reading()
+
+
+def test_an_integrity_reading_is_reported_whole_every_interval(schema, metrics):
+    exceptions = ReportByException()
+    exceptions.filter(schema, DEVICE1, RTC, reading(), metrics)
+    assert exceptions.filter(schema, DEVICE1, RTC + 899, reading(), metrics) is None
+    assert exceptions.filter(schema, DEVICE1, RTC + 900, reading(), metrics) == reading()
+    assert exceptions.filter(schema, DEVICE1, RTC + 901, reading(), metrics) is None
+
+
+def test_an_rtc_stepping_back_restarts_the_bands(schema, metrics):
+    exceptions = ReportByException()
+    exceptions.filter(schema, DEVICE1, RTC, reading(), metrics)
+    assert exceptions.filter(schema, DEVICE1, RTC - 60, reading(), metrics) == reading()
+
+
+def test_a_schema_without_deadband_reports_everything(metrics):
+    schema = FrameSchema('pds_test', 'pds_test.json', 0, dict(DEFINITION, deadband=None))
+    exceptions = ReportByException()
+    for _ in range(2):
+        assert exceptions.filter(schema, DEVICE1, RTC, reading(), metrics) == reading()
+
+
+@pytest.mark.parametrize('deadband', [{"fields": {"Frequency": {"absolute": 1}}},
+                                      {"default": {"absolute": -1}}])
+def test_an_invalid_deadband_is_rejected(deadband):
+    with pytest.raises(ValueError):
+        FrameSchema('pds_test', 'pds_test.json', 0, dict(DEFINITION, deadband=deadband))
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" DiskFrameQueue: ring wrap, ack and replay after a restart """
+
+import types
+
+import pytest
+
+from disk_buffer import DiskFrameQueue, _RECORD
+from ingest_worker import DROP_NEWEST, DROP_OLDEST
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+TOPIC = 'dev1/pds'
+
+
+def route(topic):
+    device, stream = topic.split('/')
+    return types.SimpleNamespace(stream=stream, device=device, topic=topic)
+
+
+def frame(number, size=20):
+    return types.SimpleNamespace(topic=TOPIC, payload=bytes([number % 256]) * size)
+
+
+def record_size(size=20):
+    return _RECORD.size + len(TOPIC) + size
+
+
+def payloads(items):
+    return [msg.payload for _, (_, msg) in items]
+
+
+@pytest.fixture
+def ring_path(tmp_path):
+    return str(tmp_path / 'frames.ring')
+
+
+def test_frames_come_back_in_order(ring_path):
+    queue = DiskFrameQueue(ring_path, 4096, route)
+    for number in range(5):
+        assert queue.put('pds', (route(TOPIC), frame(number)))
+    items = queue.take_all()
+    assert payloads(items) == [frame(number).payload for number in range(5)]
+    assert [item[1][1].topic for item in items] == [TOPIC] * 5
+    assert len(queue) == 0
+    queue.ack()
+    assert queue.stats()['fill'] == 0
+    queue.release()
+
+
+def test_frames_wrap_around_the_end_of_the_ring(ring_path):
+    # room for two and a half frames, one of them always queued: the ring wraps every other frame
+    queue = DiskFrameQueue(ring_path, record_size() * 5 // 2, route)
+    queue.put('pds', (route(TOPIC), frame(0)))
+    wraps, tail = 0, queue._tail
+    for number in range(1, 20):
+        assert payloads(queue.take_all()) == [frame(number - 1).payload]
+        assert queue.put('pds', (route(TOPIC), frame(number)))
+        queue.ack()
+        wraps += queue._tail < tail
+        tail = queue._tail
+    assert wraps >= 5
+    assert payloads(queue.take_all()) == [frame(19).payload]
+    assert queue.overflows == 0
+    queue.release()
+
+
+def test_frames_not_acked_are_replayed_after_a_restart(ring_path):
+    queue = DiskFrameQueue(ring_path, 4096, route)
+    for number in range(3):
+        queue.put('pds', (route(TOPIC), frame(number)))
+    assert len(queue.take_all()) == 3
+    queue.release()
+
+    queue = DiskFrameQueue(ring_path, 4096, route)
+    assert payloads(queue.take_all()) == [frame(number).payload for number in range(3)]
+    queue.ack()
+    queue.release()
+
+    queue = DiskFrameQueue(ring_path, 4096, route)
+    assert queue.take_all() == []
+    queue.release()
+
+
+def test_a_ring_of_another_size_starts_empty(ring_path):
+    queue = DiskFrameQueue(ring_path, 4096, route)
+    queue.put('pds', (route(TOPIC), frame(1)))
+    queue.release()
+    queue = DiskFrameQueue(ring_path, 8192, route)
+    assert len(queue) == 0
+    queue.release()
+
+
+def test_drop_oldest_evicts_the_oldest_frame(ring_path):
+    queue = DiskFrameQueue(ring_path, record_size() * 2, route, DROP_OLDEST)
+    for number in range(3):
+        assert queue.put('pds', (route(TOPIC), frame(number)))
+    assert payloads(queue.take_all()) == [frame(1).payload, frame(2).payload]
+    assert queue.stats()['dropped'] == {'pds': 1}
+    queue.release()
+
+
+def test_drop_newest_keeps_the_queued_frames(ring_path):
+    queue = DiskFrameQueue(ring_path, record_size() * 2, route, DROP_NEWEST)
+    assert queue.put('pds', (route(TOPIC), frame(0)))
+    assert queue.put('pds', (route(TOPIC), frame(1)))
+    assert not queue.put('pds', (route(TOPIC), frame(2)))
+    assert payloads(queue.take_all()) == [frame(0).payload, frame(1).payload]
+    queue.release()
+
+
+def test_a_released_ring_hands_out_nothing(ring_path):
+    queue = DiskFrameQueue(ring_path, 4096, route)
+    queue.put('pds', (route(TOPIC), frame(0)))
+    queue.release()
+    assert queue.take_all() == []
+    queue.ack()
+    queue.release()
+
+
+def test_the_ring_file_is_locked(ring_path):
+    queue = DiskFrameQueue(ring_path, 4096, route)
+    with pytest.raises(OSError):
+        DiskFrameQueue(ring_path, 4096, route)
+    queue.release()
+
+
+def test_frames_no_longer_routed_go_to_unrouted(ring_path):
+    queue = DiskFrameQueue(ring_path, 4096, route)
+    assert queue.put('pds', (route(TOPIC), frame(1)))
+    assert queue.put('pds', (route(TOPIC), frame(2)))
+    # a reconfiguration removed the route of their topic
+    queue.route = lambda topic: None
+    unrouted = []
+    queue.unrouted = unrouted.append
+    assert queue.take_all() == []
+    queue.ack()
+    assert [msg.payload for msg in unrouted] == [frame(1).payload, frame(2).payload]
+    assert len(queue) == 0
+    queue.release()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" FrameArchive segments and block reads by RTC range and device """
+
+import glob
+import json
+import os
+
+from frame_archive import FrameArchive, _segment_start, parse_time, read_archive
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+RTC = 1735732800  # 2025-01-01 12:00:00
+
+
+def payload(number):
+    return number.to_bytes(4, 'little') * 8
+
+
+def archive_frames(directory, count=100, block_size=1024, segment_size=1 << 20, max_size=1 << 30):
+    """ ``count`` frames, one second apart and alternately of dev1 and dev2 """
+    archive = FrameArchive(str(directory), segment_size, max_size, block_size=block_size)
+    for number in range(count):
+        device = 'dev{}'.format(number % 2 + 1)
+        archive.append(device, device + '/pdstop', payload(number), RTC + number, 1000.0 + number)
+    archive.close()
+    return archive
+
+
+def test_every_frame_is_read_back(tmp_path):
+    archive = archive_frames(tmp_path)
+    frames = list(read_archive(str(tmp_path)))
+    assert [frame.payload for frame in frames] == [payload(number) for number in range(100)]
+    assert frames[3].device == 'dev2' and frames[3].topic == 'dev2/pdstop'
+    assert frames[3].rtc == RTC + 3 and frames[3].received == 1003.0
+    assert archive.stats()['frames'] == 100
+    assert archive.blocks > 1
+
+
+def test_a_read_only_yields_the_rtc_range_and_devices(tmp_path):
+    archive_frames(tmp_path)
+    frames = list(read_archive(str(tmp_path), RTC + 10, RTC + 19, devices={'dev1'}))
+    assert [frame.rtc - RTC for frame in frames] == [10, 12, 14, 16, 18]
+
+
+def test_a_read_skips_the_blocks_outside_its_range(tmp_path):
+    archive_frames(tmp_path)
+    segment, = glob.glob(os.path.join(str(tmp_path), '*.seg'))
+    with open(segment[:-len('.seg')] + '.idx') as index:
+        entries = [json.loads(line) for line in index]
+    first, last = entries[0], entries[-1]
+    # a corrupt block only fails the reads that need it
+    with open(segment, 'r+b') as data:
+        data.seek(last['offset'])
+        data.write(b'XXXX')
+    frames = list(read_archive(str(tmp_path), first['rtc'][0], first['rtc'][1]))
+    assert len(frames) == first['frames']
+
+
+def test_frames_without_an_rtc_only_in_unbounded_reads(tmp_path):
+    archive = FrameArchive(str(tmp_path), 1 << 20, 1 << 30)
+    archive.append('dev1', 'dev1/pdstop', payload(1), None, 1000.0)
+    archive.close()
+    assert len(list(read_archive(str(tmp_path)))) == 1
+    assert list(read_archive(str(tmp_path), RTC)) == []
+
+
+def test_the_oldest_segments_are_expired(tmp_path):
+    archive_frames(tmp_path, count=400, block_size=256, segment_size=1024, max_size=4096)
+    segments = sorted(glob.glob(os.path.join(str(tmp_path), '*.seg')), key=_segment_start)
+    # checked when a segment is opened, which the newest one was last
+    assert sum(os.path.getsize(path) for path in segments[:-1]) <= 4096
+    frames = list(read_archive(str(tmp_path)))
+    assert frames[-1].payload == payload(399)
+    assert len(frames) < 400
+
+
+def test_times_parse_as_rtc_seconds():
+    assert parse_time('2025-01-01 12:00:00') == RTC
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" FrameTracker: duplicate frames and the RTC sequence of each device """
+
+import struct
+import types
+
+import pytest
+
+from conftest import PLUGIN_DIR
+from frame_tracker import FrameTracker
+from metrics import StreamMetrics
+from schema_registry import SchemaRegistry
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+ROUTE = types.SimpleNamespace(stream='dds', device='STMS1')
+
+
+@pytest.fixture
+def schema():
+    registry = SchemaRegistry(PLUGIN_DIR)
+    registry.load()
+    return registry.get('dds')
+
+
+def frame(second, digital=0):
+    """ A dds record at 12:00:<second>, minutes carried over """
+    minutes, seconds = divmod(second, 60)
+    return struct.pack('<8BB B B B B B H?', digital, *range(7), seconds, minutes, 12, 3, 15, 6, 2025, False)
+
+
+def test_a_resent_frame_is_a_duplicate(schema):
+    tracker, metrics = FrameTracker(10), StreamMetrics('dds', 'STMS1')
+    assert not tracker.check(schema, ROUTE, frame(1), metrics)
+    assert tracker.check(schema, ROUTE, frame(1), metrics)
+    # the same RTC with other values is another frame
+    assert not tracker.check(schema, ROUTE, frame(1, digital=1), metrics)
+    assert metrics.duplicates == 1
+
+
+def test_frames_of_other_devices_are_no_duplicates(schema):
+    tracker, metrics = FrameTracker(10), StreamMetrics('dds', 'STMS1')
+    assert not tracker.check(schema, ROUTE, frame(1), metrics)
+    assert not tracker.check(schema, types.SimpleNamespace(stream='dds', device='STMS2'), frame(1), metrics)
+
+
+def test_only_the_latest_frames_are_remembered(schema):
+    tracker, metrics = FrameTracker(2), StreamMetrics('dds', 'STMS1')
+    for second in (1, 2, 3):
+        assert not tracker.check(schema, ROUTE, frame(second), metrics)
+    assert tracker.check(schema, ROUTE, frame(3), metrics)
+    assert not tracker.check(schema, ROUTE, frame(1), metrics)
+
+
+def test_a_step_longer_than_the_period_is_a_gap(schema):
+    tracker, metrics = FrameTracker(10), StreamMetrics('dds', 'STMS1')
+    for second in (0, 1, 2, 5, 6):
+        tracker.check(schema, ROUTE, frame(second), metrics)
+    assert (metrics.gaps, metrics.reorders) == (1, 0)
+
+
+def test_an_older_record_is_a_reorder(schema):
+    tracker, metrics = FrameTracker(10), StreamMetrics('dds', 'STMS1')
+    for second in (0, 1, 2):
+        tracker.check(schema, ROUTE, frame(second), metrics)
+    # a late record of its own rather than a resent one
+    tracker.check(schema, ROUTE, frame(1, digital=1), metrics)
+    tracker.check(schema, ROUTE, frame(3), metrics)
+    assert (metrics.gaps, metrics.reorders) == (0, 1)
+
+
+def test_every_record_of_a_payload_is_followed(schema):
+    tracker, metrics = FrameTracker(10), StreamMetrics('dds', 'STMS1')
+    assert not tracker.check(schema, ROUTE, frame(0) + frame(1) + frame(2), metrics)
+    assert not tracker.check(schema, ROUTE, frame(10) + frame(11), metrics)
+    assert metrics.gaps == 1
+
+
+def test_a_payload_of_no_whole_number_of_records_is_left_to_decoding(schema):
+    tracker, metrics = FrameTracker(10), StreamMetrics('dds', 'STMS1')
+    assert not tracker.check(schema, ROUTE, frame(1)[:-1], metrics)
+    assert not tracker.check(schema, ROUTE, frame(1)[:-1], metrics)
+    assert metrics.duplicates == 0
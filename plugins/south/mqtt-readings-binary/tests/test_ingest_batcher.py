@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" IngestBatcher: flushing on batch size, linger time and immediate readings """
+
+import asyncio
+import time
+
+from ingest_batcher import IngestBatcher
+from metrics import StreamMetrics
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+
+class Sender(object):
+
+    def __init__(self):
+        self.batches = []
+
+    async def __call__(self, readings):
+        self.batches.append(readings)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_a_full_batch_is_sent_at_once():
+    send = Sender()
+    batcher = IngestBatcher(send, 3, 60.0)
+
+    async def add():
+        for number in range(7):
+            await batcher.add(number)
+        return list(send.batches)
+
+    assert run(add()) == [[0, 1, 2], [3, 4, 5]]
+    assert batcher.batch_sizes.count == 2
+
+
+def test_pending_readings_are_sent_once_the_oldest_lingered():
+    send = Sender()
+    batcher = IngestBatcher(send, 100, 0.05)
+
+    async def add():
+        await batcher.add(1)
+        await batcher.add(2)
+        assert send.batches == []
+        await asyncio.sleep(0.2)
+
+    run(add())
+    assert send.batches == [[1, 2]]
+
+
+def test_no_linger_sends_every_reading():
+    send = Sender()
+    batcher = IngestBatcher(send, 100, 0)
+
+    async def add():
+        await batcher.add(1)
+        await batcher.add(2)
+
+    run(add())
+    assert send.batches == [[1], [2]]
+
+
+def test_an_immediate_reading_is_sent_with_those_pending():
+    send = Sender()
+    batcher = IngestBatcher(send, 100, 60.0)
+
+    async def add():
+        await batcher.add(1)
+        await batcher.add(2, immediate=True)
+        await batcher.add(3)
+        await batcher.flush()
+
+    run(add())
+    assert send.batches == [[1, 2], [3]]
+
+
+def test_sent_readings_are_timed_in_their_metrics():
+    send = Sender()
+    batcher = IngestBatcher(send, 2, 60.0)
+    metrics = StreamMetrics('pds', 'STMS1')
+
+    async def add():
+        await batcher.add(1, metrics, time.monotonic())
+        await batcher.add(2)
+
+    run(add())
+    assert metrics.readings == 1
+    assert metrics.ingest_ms.count == 1
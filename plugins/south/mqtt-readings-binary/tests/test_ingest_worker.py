@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" IngestWorker start and stop around a hand-over of its queue """
+
+import threading
+
+from ingest_worker import FrameQueue, IngestWorker
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+
+class Recorder(object):
+
+    def __init__(self):
+        self.items = []
+        self.ingested = threading.Event()
+
+    async def __call__(self, items):
+        self.items.extend(item for _, item in items)
+        self.ingested.set()
+
+
+def test_frames_put_before_start_are_ingested_at_start():
+    queue = FrameQueue(10)
+    handler = Recorder()
+    worker = IngestWorker(queue, handler)
+    # bound to paho before the pipeline starts, the first frame notifies a worker without a loop
+    assert queue.put('pds', 1)
+    worker.start()
+    assert handler.ingested.wait(5.0)
+    assert worker.stop()
+    assert handler.items == [1]
+
+
+def test_notify_between_start_and_the_wakeup_event_is_harmless():
+    queue = FrameQueue(10)
+    worker = IngestWorker(queue, Recorder())
+    worker.loop = object()
+    # the loop is published, the wakeup event not yet created
+    worker.notify()
+
+
+def test_a_queue_left_open_takes_frames_after_stop():
+    queue = FrameQueue(10)
+    worker = IngestWorker(queue, Recorder())
+    worker.start()
+    assert worker.stop(close=False)
+    assert queue.put('pds', 1)
+    assert len(queue) == 1
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" JSON documents of the mqtt-publisher SEED-STEM emulator mapped onto the frame schemas """
+
+import json
+import os
+
+import pytest
+
+from conftest import PLUGIN_DIR, REPO_DIR
+from json_payload import json_reading, parse_burst, parse_records
+from schema_registry import SchemaRegistry
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+TIMESTAMP = '2025-01-01 12:00:00'
+
+
+def emulator_config(stream):
+    with open(os.path.join(REPO_DIR, 'mqtt-publisher', 'config_{}.json'.format(stream))) as config_file:
+        return json.load(config_file)
+
+
+def pds_document():
+    """ As generate_pds_payload publishes it, with each sensor at its minimum """
+    document = {name: float(sensor['min']) for name, sensor in emulator_config('pds')['sensors'].items()}
+    document['timestamp'] = TIMESTAMP
+    return document
+
+
+def ads_document():
+    document = {name: float(sensor['min']) for name, sensor in emulator_config('ads')['sensors'].items()}
+    document['timestamp'] = TIMESTAMP
+    return document
+
+
+def dds_document(channels):
+    """ As generate_dds_payload publishes the state changes of ``channels`` """
+    return {channel: {'state': 1, 'timestamp': TIMESTAMP} for channel in channels}
+
+
+@pytest.fixture(scope='module')
+def schemas():
+    registry = SchemaRegistry(PLUGIN_DIR)
+    registry.load()
+    return registry
+
+
+def reading_of(schemas, stream, document):
+    schema = schemas.json_schema(stream, document, stream)
+    unmapped = []
+    reading = json_reading(schema, document, stream + '/device', 0.0, unmapped)
+    return schema, reading, unmapped
+
+
+def test_pds_document_keeps_every_sensor(schemas):
+    document = pds_document()
+    schema, reading, unmapped = reading_of(schemas, 'pds', document)
+    for name, value in document.items():
+        if name == 'timestamp':
+            continue
+        key = schema.json_keys.get(name, name)
+        assert reading[key] == value
+    assert len(unmapped) == len(document) - 1 - sum(1 for name in document if name in schema.json_keys)
+    assert reading['timestamp'] == TIMESTAMP
+    assert reading['topic'] == 'pds/device'
+
+
+def test_ads_document_picks_the_schema_covering_every_channel(schemas):
+    document = ads_document()
+    schema, reading, unmapped = reading_of(schemas, 'ads', document)
+    assert schema.name == 'ads_ph8'
+    assert unmapped == []
+    assert reading['ANASEN_CH6'] == document['ANASEN_CH6']
+
+
+def test_dds_state_changes_of_high_channels_are_not_dead_lettered(schemas):
+    channels = ['Digi9', 'Digi23', 'Digi32']
+    schema, reading, unmapped = reading_of(schemas, 'dds', dds_document(channels))
+    for channel in channels:
+        assert reading[schema.json_keys.get(channel, channel)] == 1
+    assert set(unmapped) == {channel for channel in channels if channel not in schema.json_keys}
+    assert reading['timestamp'] == TIMESTAMP
+
+
+def test_dds_document_of_every_channel(schemas):
+    channels = list(emulator_config('dds')['channels'])
+    schema, reading, unmapped = reading_of(schemas, 'dds', dds_document(channels))
+    assert len(reading) == len(channels) + 2
+
+
+def test_topic_schema_settles_a_tie(schemas):
+    document = {'timestamp': TIMESTAMP}
+    assert schemas.json_schema('pds', document, 'pds_ph8').name == 'pds_ph8'
+    assert schemas.json_schema('pds', document, 'pds').name == 'pds'
+
+
+def test_unknown_stream_raises_key_error(schemas):
+    with pytest.raises(KeyError):
+        schemas.json_schema('xyz', {}, 'xyz')
+
+
+def test_only_numbers_pass_through(schemas):
+    schema = schemas.json_schema('ads', {}, 'ads')
+    unmapped = []
+    reading = json_reading(schema, {'ANASEN_CH1': 1.5, 'label': 'x', 'count': 3, 'flag': True}, 't', 0.0, unmapped)
+    assert 'label' not in reading
+    assert reading['count'] == 3 and reading['flag'] is True
+    assert sorted(unmapped) == ['count', 'flag', 'label']
+
+
+def test_record_without_a_datapoint_raises(schemas):
+    schema = schemas.json_schema('ads', {}, 'ads')
+    with pytest.raises(ValueError):
+        json_reading(schema, {'timestamp': TIMESTAMP, 'label': 'x'}, 't', 0.0)
+
+
+def test_receive_time_stands_in_for_a_missing_timestamp(schemas):
+    schema = schemas.json_schema('ads', {}, 'ads')
+    reading = json_reading(schema, {'ANASEN_CH1': 1.0}, 't', 0.0)
+    assert reading['timestamp'] == '1970-01-01 00:00:00'
+
+
+def test_parse_records_of_an_array():
+    assert parse_records(b'[{"a": 1}, {"b": 2}]') == [{'a': 1}, {'b': 2}]
+    with pytest.raises(ValueError):
+        parse_records(b'[1, 2]')
+
+
+def test_parse_burst_matches_parsing_each_payload():
+    payloads = [json.dumps(pds_document()).encode(), json.dumps(ads_document()).encode(),
+                json.dumps([dds_document(['Digi1']), dds_document(['Digi2'])]).encode()]
+    assert parse_burst(payloads) == [parse_records(payload) for payload in payloads]
+
+
+def test_parse_burst_isolates_a_broken_payload():
+    results = parse_burst([b'{"a": 1}', b'{"a": ', b'7', b'{"b": 2}'])
+    assert results[0] == [{'a': 1}]
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[2], ValueError)
+    assert results[3] == [{'b': 2}]
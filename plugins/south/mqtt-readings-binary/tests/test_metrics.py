@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Histograms, per stream type and device metrics and the metrics endpoint """
+
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from metrics import Histogram, IngestMetrics, MetricsServer
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+
+def test_a_value_lands_in_the_first_bucket_that_holds_it():
+    histogram = Histogram((1, 10))
+    for value in (0.5, 1, 2, 10, 11):
+        histogram.observe(value)
+    assert histogram.snapshot() == {'count': 5, 'sum': 24.5, 'buckets': {'<=1': 2, '<=10': 2, '>10': 1}}
+    assert histogram.mean() == 4.9
+    assert Histogram((1,)).mean() == 0.0
+
+
+def test_metrics_are_kept_per_stream_type_and_device():
+    metrics = IngestMetrics()
+    metrics.get('pds', 'STMS1').messages += 1
+    metrics.get('pds', 'STMS1').messages += 1
+    metrics.get('pds', 'STMS2').messages += 1
+    assert sorted((m.stream, m.device, m.messages) for m in metrics) == [('pds', 'STMS1', 2), ('pds', 'STMS2', 1)]
+    reading = metrics.get('pds', 'STMS1').reading()
+    assert reading['messages'] == 2
+    assert reading['queue_wait_ms_avg'] == 0.0
+
+
+@pytest.fixture
+def server():
+    server = MetricsServer(0, lambda: {'queue': {'depth': 3}})
+    server.start()
+    yield 'http://127.0.0.1:{}'.format(server._server.server_address[1])
+    server.stop()
+
+
+def test_the_endpoint_serves_the_metrics(server):
+    with urllib.request.urlopen(server + '/metrics') as response:
+        assert json.loads(response.read().decode('utf-8')) == {'queue': {'depth': 3}}
+
+
+def test_the_endpoint_serves_nothing_else(server):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(server + '/other')
+    assert error.value.code == 404
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Client ID and session of the broker connection """
+
+import importlib.util
+import os
+from unittest import mock
+
+import pytest
+
+from conftest import PLUGIN_DIR
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+pytest.importorskip('paho.mqtt.client')
+pytest.importorskip('fledge.plugins.common.utils')
+pytest.importorskip('async_ingest')
+
+
+@pytest.fixture
+def plugin():
+    spec = importlib.util.spec_from_file_location('mqtt_readings_binary',
+                                                  os.path.join(PLUGIN_DIR, 'mqtt-readings-binary.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.schemas = module.SchemaRegistry(PLUGIN_DIR)
+    module.schemas.load()
+    return module
+
+
+def config(plugin, tmp_path, **values):
+    items = {key: dict(item, value=item['default']) for key, item in plugin._DEFAULT_CONFIG.items()}
+    values.setdefault('deadLetterSpool', str(tmp_path / 'dead.spool'))
+    values.setdefault('metricsPort', '0')
+    for key, value in values.items():
+        items[key]['value'] = value
+    return items
+
+
+def test_v5_with_a_shared_group_connects_and_subscribes(plugin, tmp_path, monkeypatch):
+    paho_client = mock.MagicMock()
+    paho_client.subscribe.return_value = (0, 1)
+    client_class = mock.MagicMock(return_value=paho_client)
+    monkeypatch.setattr(plugin.mqtt, 'Client', client_class)
+    client = plugin.MqttSubscriberClient(config(
+        plugin, tmp_path, protocolVersion='MQTTv5', clientId='meter-1', sharedSubscriptionGroup='gateways',
+        topic='+/pdsdata, +/adsdata', qos='1', sessionExpiryInterval='3600', receiveMaximum='100'), plugin.schemas)
+    client.start()
+    try:
+        # clean_session is not an MQTTv5 argument of the client
+        client_class.assert_called_once_with(client_id='meter-1', protocol=plugin.mqtt.MQTTv5)
+        (host, port, keep_alive), connect = paho_client.connect_async.call_args
+        assert (host, port) == (client.broker_host, client.broker_port)
+        # a client ID with a session expiry is a persistent session, resumed rather than started clean
+        assert connect['clean_start'] is False
+        assert connect['properties'].SessionExpiryInterval == 3600
+        assert connect['properties'].ReceiveMaximum == 100
+
+        paho_client.on_connect(paho_client, None, {'session present': 0}, 0)
+        paho_client.subscribe.assert_called_once_with([('$share/gateways/+/pdsdata', 1),
+                                                       ('$share/gateways/+/adsdata', 1)])
+    finally:
+        client.stop()
+
+
+def client_id(plugin, tmp_path, monkeypatch, service):
+    monkeypatch.setattr(plugin, '_service_name', lambda: service)
+    client = plugin.MqttSubscriberClient(config(plugin, tmp_path, persistentSession='true'), plugin.schemas)
+    return client.client_id
+
+
+def test_services_with_the_default_asset_name_get_their_own_client_id(plugin, tmp_path, monkeypatch):
+    first = client_id(plugin, tmp_path, monkeypatch, 'meter-1')
+    assert first.startswith('fledge-')
+    assert first == client_id(plugin, tmp_path, monkeypatch, 'meter-1')
+    assert first != client_id(plugin, tmp_path, monkeypatch, 'meter-2')
+
+
+def no_proc(*args):
+    raise OSError("no /proc")
+
+
+def test_the_service_name_comes_from_the_command_line(plugin, monkeypatch):
+    # the module global shadows the builtin, as on a system without /proc
+    monkeypatch.setattr(plugin, 'open', no_proc, raising=False)
+    monkeypatch.setattr(plugin.sys, 'argv', ['south', '--port=8081', '--name=meter-1'])
+    assert plugin._service_name() == 'meter-1'
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" PriorityFrameQueue lanes, shedding and quanta, and the DeviceRateLimiter token bucket """
+
+import types
+
+import pytest
+
+from ingest_worker import DROP_NEWEST, DROP_OLDEST
+from priority_lanes import DEFAULT_LANES, LANE_QUANTUM, DeviceRateLimiter, PriorityFrameQueue, parse_lanes
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+
+def queue_of(maxsize, default_policy=DROP_NEWEST, lanes=DEFAULT_LANES):
+    return PriorityFrameQueue(maxsize, parse_lanes(lanes), default_policy)
+
+
+def streams(items):
+    return [stream for stream, _ in items]
+
+
+def test_urgent_lanes_are_taken_first():
+    queue = queue_of(100)
+    for stream in ('pds', 'ads', 'dds', 'pqs', 'dds'):
+        queue.put(stream, stream)
+    assert streams(queue.take_all()) == ['dds', 'dds', 'ads', 'pds', 'pqs']
+
+
+def test_unknown_streams_join_the_last_lane():
+    queue = queue_of(100)
+    assert queue.lane('xyz') is queue.lanes[-1]
+
+
+def test_a_take_hands_out_the_weighted_quanta():
+    queue = queue_of(10000)
+    for number in range(300):
+        queue.put('pds', number)
+        queue.put('dds', number)
+    taken = streams(queue.take_all())
+    # dds gets its share of 8 quanta plus the 4 ads leaves unused, pds its 1 quantum
+    assert taken.count('dds') == 12 * LANE_QUANTUM
+    assert taken.count('pds') == LANE_QUANTUM
+    assert taken == sorted(taken)
+    assert len(queue) == 600 - 13 * LANE_QUANTUM
+
+
+def test_a_full_queue_sheds_the_least_urgent_lane():
+    queue = queue_of(3)
+    for number in range(2):
+        queue.put('pds', number)
+    queue.put('ads', 0)
+    assert queue.put('dds', 0)
+    assert queue.put('dds', 1)
+    assert queue.take_all() == [('dds', 0), ('dds', 1), ('ads', 0)]
+    assert queue.lanes[-1].shed == 2
+
+
+def test_the_least_urgent_lane_falls_back_to_its_policy():
+    queue = queue_of(2, DROP_OLDEST)
+    for number in range(3):
+        assert queue.put('pds', number)
+    assert queue.take_all() == [('pds', 1), ('pds', 2)]
+    assert queue.stats()['dropped'] == {'pds': 1}
+
+    queue = queue_of(2, DROP_NEWEST)
+    for number in range(3):
+        queue.put('pds', number)
+    assert queue.take_all() == [('pds', 0), ('pds', 1)]
+
+
+@pytest.mark.parametrize('lanes', [[{'streams': []}], [{'streams': ['dds'], 'weight': 0}]])
+def test_invalid_lanes_are_rejected(lanes):
+    with pytest.raises(ValueError):
+        parse_lanes(lanes)
+
+
+def test_the_token_bucket_caps_the_rate_of_each_device():
+    limiter = DeviceRateLimiter(2.0, burst=1.0)
+    device1 = types.SimpleNamespace(stream='pds', device='dev1')
+    device2 = types.SimpleNamespace(stream='pds', device='dev2')
+    assert [limiter.allow(device1, 0.0) for _ in range(3)] == [True, True, False]
+    # another device has a bucket of its own
+    assert limiter.allow(device2, 0.0)
+    # two frames per second refill a token every half second
+    assert limiter.allow(device1, 0.5)
+    assert not limiter.allow(device1, 0.5)
+    assert limiter.allow(device1, 10.0) and limiter.allow(device1, 10.0) and not limiter.allow(device1, 10.0)
+    assert limiter.stats()['limited'] == {'dev1': 3}
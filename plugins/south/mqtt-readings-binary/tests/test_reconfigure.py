@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Hand-over of the broker connection and the queued frames to the client of a new configuration """
+
+import asyncio
+import importlib.util
+import json
+import os
+import threading
+import time
+import types
+
+import pytest
+
+from conftest import PLUGIN_DIR
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+pytest.importorskip('paho.mqtt.client')
+pytest.importorskip('fledge.plugins.common.utils')
+pytest.importorskip('async_ingest')
+
+TOPIC = 'dev1/adsdata'
+
+
+class Message(object):
+    """ The members of a paho MQTTMessage the plugin reads """
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+        self.qos = 1
+        self.timestamp = time.monotonic()
+
+
+@pytest.fixture
+def plugin(monkeypatch):
+    spec = importlib.util.spec_from_file_location('mqtt_readings_binary',
+                                                  os.path.join(PLUGIN_DIR, 'mqtt-readings-binary.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    module.ingested = []
+
+    async def ingest_callback(callback, ingest_ref, readings):
+        module.ingested.extend(readings)
+
+    monkeypatch.setattr(module, 'async_ingest', types.SimpleNamespace(ingest_callback=ingest_callback))
+
+    # a slow ingest, which the hand-over must wait for; counts the workers ingesting at a time
+    module.active, module.most_active = 0, 0
+    lock = threading.Lock()
+    ingest = module.MqttSubscriberClient.ingest
+
+    async def slow_ingest(self, items):
+        with lock:
+            module.active += 1
+            module.most_active = max(module.most_active, module.active)
+        try:
+            await asyncio.sleep(0.05)
+            await ingest(self, items)
+        finally:
+            with lock:
+                module.active -= 1
+
+    monkeypatch.setattr(module.MqttSubscriberClient, 'ingest', slow_ingest)
+    module.schemas = module.SchemaRegistry(PLUGIN_DIR)
+    module.schemas.load()
+    return module
+
+
+def config(plugin, tmp_path, **values):
+    items = {key: dict(item, value=item['default']) for key, item in plugin._DEFAULT_CONFIG.items()}
+    values.setdefault('deadLetterSpool', str(tmp_path / 'dead.spool'))
+    values.setdefault('diskBufferFile', str(tmp_path / 'frames.ring'))
+    values.setdefault('maxBatchLinger', '1')
+    values.setdefault('metricsPort', '0')
+    for key, value in values.items():
+        items[key]['value'] = value
+    return items
+
+
+def publish(client, first, count):
+    for number in range(first, first + count):
+        payload = json.dumps({'ANASEN_CH1': float(number), 'timestamp': '2025-01-01 12:00:00'}).encode()
+        client.mqtt_client.on_message(client.mqtt_client, None, Message(TOPIC, payload))
+
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def channel_values(plugin):
+    return sorted(reading['readings']['ANASEN_CH1'] for reading in plugin.ingested
+                  if 'ANASEN_CH1' in reading['readings'])
+
+
+@pytest.mark.parametrize('disk_buffer', ['false', 'true'])
+def test_frames_of_a_hand_over_are_ingested_once_by_one_worker_at_a_time(plugin, tmp_path, disk_buffer):
+    client = plugin.MqttSubscriberClient(config(plugin, tmp_path, diskBuffer=disk_buffer), plugin.schemas)
+    client.start_pipeline()
+    client.bind()
+    client.mqtt_client.on_message(client.mqtt_client, None, Message(TOPIC, b'not json'))
+    publish(client, 0, 50)
+
+    successor = client.succeed(config(plugin, tmp_path, diskBuffer=disk_buffer, maxBatchSize='10'))
+    publish(successor, 50, 50)
+    wait_for(lambda: len(channel_values(plugin)) >= 100)
+    successor.stop_pipeline()
+
+    assert channel_values(plugin) == [float(number) for number in range(100)]
+    assert plugin.most_active == 1
+    assert client.worker.loop.is_closed()
+    assert successor.dead_letters.count == 1
+    if disk_buffer == 'true':
+        assert successor.queue is client.queue
+
+
+def test_a_disk_buffer_not_taken_over_is_drained(plugin, tmp_path):
+    client = plugin.MqttSubscriberClient(config(plugin, tmp_path, diskBuffer='true'), plugin.schemas)
+    client.start_pipeline()
+    client.bind()
+    publish(client, 0, 50)
+
+    successor = client.succeed(config(plugin, tmp_path, diskBuffer='false'))
+    assert channel_values(plugin) == [float(number) for number in range(50)]
+    successor.stop_pipeline()
+
+    ring = plugin.DiskFrameQueue(str(tmp_path / 'frames.ring'), client.queue.capacity, client.router.route)
+    assert len(ring) == 0
+    ring.release()
+
+
+def test_device_state_carries_over(plugin, tmp_path):
+    client = plugin.MqttSubscriberClient(config(plugin, tmp_path, duplicateCacheSize='100'), plugin.schemas)
+    client.start_pipeline()
+    client.bind()
+    successor = client.succeed(config(plugin, tmp_path, duplicateCacheSize='10'))
+    successor.stop_pipeline()
+
+    assert successor.tracker is client.tracker
+    assert successor.tracker.cache_size == 10
+    assert successor.exceptions is client.exceptions
+    assert successor.metrics is client.metrics
+
+
+def test_a_stuck_worker_falls_back_to_a_new_connection(plugin, tmp_path, monkeypatch):
+    monkeypatch.setattr(plugin, '_HANDOVER_TIMEOUT', 0.2)
+    release = threading.Event()
+    ingest = plugin.MqttSubscriberClient.ingest
+
+    async def stuck_ingest(self, items):
+        release.wait(10.0)
+        await ingest(self, items)
+
+    monkeypatch.setattr(plugin.MqttSubscriberClient, 'ingest', stuck_ingest)
+    handle = plugin.plugin_init(config(plugin, tmp_path))
+    plugin.plugin_start(handle)
+    client = handle['_mqtt']
+    publish(client, 0, 1)
+    try:
+        new_handle = plugin.plugin_reconfigure(handle, config(plugin, tmp_path, maxBatchSize='10'))
+    finally:
+        release.set()
+    try:
+        assert new_handle['_mqtt'] is not client
+        assert new_handle['_mqtt'].mqtt_client is not client.mqtt_client
+    finally:
+        plugin.plugin_shutdown(new_handle)
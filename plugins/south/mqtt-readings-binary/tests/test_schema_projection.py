@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Field projection of frame schemas with ``selected_fields`` """
+
+import struct
+
+import pytest
+
+from schema_registry import FrameSchema, project
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+DEFINITION = {
+    "struct_format": "<3f H 7B ?",
+    "field_names": ["Voltage", "Current", "Power", "Status"],
+    "output_names": {"Power": "P"}
+}
+VALUES = (230.0, 5.0, 1000.0, 7, 0, 0, 12, 3, 1, 1, 25, True)
+FRAME = struct.pack(DEFINITION['struct_format'], *VALUES)
+
+
+def schema_of(definition):
+    return FrameSchema('pds_test', 'pds_test.json', 0, definition)
+
+
+def test_a_definition_without_selection_is_unchanged():
+    assert project(DEFINITION) is DEFINITION
+
+
+def test_unselected_fields_become_pad_bytes():
+    projected = project(dict(DEFINITION, selected_fields=["Current"]))
+    # Power and Status are 6 pad bytes
+    assert projected['struct_format'] == '<4xf6xBBBBBBB?'
+    assert struct.calcsize(projected['struct_format']) == struct.calcsize(DEFINITION['struct_format'])
+    assert projected['rtc_fields'] == [1, 8]
+    assert projected['flag_fields'] == {'IsNlf': 8}
+
+
+def test_a_projected_reading_holds_the_selected_datapoints():
+    full = schema_of(DEFINITION)
+    projected = schema_of(dict(DEFINITION, selected_fields=["Current", "P"]))
+    assert projected.size == full.size
+    reading = projected.reading(projected.unpack_records(FRAME)[0], 'dev1/pds')
+    expected = full.reading(full.unpack_records(FRAME)[0], 'dev1/pds')
+    assert list(reading) == ['Current', 'P', 'timestamp', 'IsNlf', 'topic']
+    assert all(reading[key] == expected[key] for key in reading)
+    assert reading['timestamp'] == '2025-01-01 12:00:00'
+
+
+def test_the_rtc_of_a_projected_frame_is_read_in_place():
+    projected = schema_of(dict(DEFINITION, selected_fields=["Status"]))
+    assert projected.rtc_values(FRAME) == VALUES[4:11]
+    assert projected.rtc_values(FRAME + FRAME, projected.size) == VALUES[4:11]
+
+
+def test_an_unknown_selected_field_is_rejected():
+    with pytest.raises(ValueError):
+        project(dict(DEFINITION, selected_fields=["Frequency"]))
+
+
+def test_native_alignment_cannot_be_projected():
+    with pytest.raises(ValueError):
+        project(dict(DEFINITION, struct_format="3f H 7B ?", selected_fields=["Current"]))
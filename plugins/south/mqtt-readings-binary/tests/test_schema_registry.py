@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" SchemaRegistry: loading and reloading schema files, schema detection from the payload length and
+payloads of several records
+"""
+
+import json
+import os
+import shutil
+import struct
+
+import pytest
+
+from conftest import PLUGIN_DIR
+from schema_registry import SchemaRegistry
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+
+@pytest.fixture
+def schema_dir(tmp_path):
+    for name in ('dds', 'dds_ph8'):
+        shutil.copy(os.path.join(PLUGIN_DIR, name + '.json'), str(tmp_path))
+    return tmp_path
+
+
+def rewrite(path, definition):
+    """ Write a schema file with an mtime that differs from the previous one """
+    mtime = os.stat(str(path)).st_mtime
+    path.write_text(json.dumps(definition))
+    os.utime(str(path), (mtime + 10, mtime + 10))
+
+
+def test_only_files_with_a_struct_format_are_schemas(schema_dir):
+    (schema_dir / 'routes.json').write_text(json.dumps({'streams': {}}))
+    registry = SchemaRegistry(str(schema_dir))
+    registry.load()
+    assert registry.names() == ['dds', 'dds_ph8']
+    assert registry.get('dds').stream == registry.get('dds_ph8').stream == 'dds'
+
+
+def test_an_edited_schema_is_recompiled_with_its_counters(schema_dir):
+    registry = SchemaRegistry(str(schema_dir), refresh_interval=0)
+    registry.load()
+    schema = registry.get('dds')
+    schema.decode_count = 5
+    definition = json.loads((schema_dir / 'dds.json').read_text())
+    definition['struct_format'] += 'f'
+    definition['field_names'].append('Extra')
+    rewrite(schema_dir / 'dds.json', definition)
+
+    reloaded = registry.get('dds')
+    assert reloaded is not schema
+    assert reloaded.size == schema.size + 4
+    assert 'Extra' in reloaded.keys
+    assert reloaded.decode_count == 5
+    assert registry.detect('dds', reloaded.size, None) == 'dds'
+
+
+def test_an_unchanged_schema_is_not_recompiled(schema_dir):
+    registry = SchemaRegistry(str(schema_dir), refresh_interval=0)
+    registry.load()
+    schema = registry.get('dds')
+    assert registry.get('dds') is schema
+
+
+def test_a_broken_edit_keeps_the_last_good_schema(schema_dir):
+    registry = SchemaRegistry(str(schema_dir), refresh_interval=0)
+    registry.load()
+    schema = registry.get('dds')
+    rewrite(schema_dir / 'dds.json', {'struct_format': '<Z', 'field_names': []})
+    assert registry.get('dds') is schema
+
+
+def test_a_removed_schema_is_dropped(schema_dir):
+    registry = SchemaRegistry(str(schema_dir), refresh_interval=0)
+    registry.load()
+    os.remove(str(schema_dir / 'dds_ph8.json'))
+    with pytest.raises(KeyError):
+        registry.get('dds_ph8')
+    assert registry.detect('dds', registry.get('dds').size * 31, None) == 'dds'
+
+
+@pytest.fixture
+def schemas():
+    registry = SchemaRegistry(PLUGIN_DIR)
+    registry.load()
+    return registry
+
+
+@pytest.mark.parametrize('stream, topic_schema, expected', [
+    ('pds', 'pds', 'pds_ph8'),
+    ('pds', 'pds_ph8', 'pds'),
+    ('ads', 'ads', 'ads_ph8'),
+])
+def test_the_payload_length_picks_the_schema_over_the_topic(schemas, stream, topic_schema, expected):
+    assert schemas.detect(stream, schemas.get(expected).size, topic_schema) == expected
+    assert schemas.topic_fallbacks == 0
+
+
+def test_the_topic_settles_schemas_of_the_same_size(schemas):
+    assert schemas.get('pqs').size == schemas.get('pqs_ph8').size
+    assert schemas.detect('pqs', schemas.get('pqs').size, 'pqs_ph8') == 'pqs_ph8'
+    assert schemas.detect('pqs', schemas.get('pqs').size, 'pqs') == 'pqs'
+    assert schemas.topic_fallbacks == 2
+
+
+def test_a_payload_of_several_records_is_detected_by_its_record_size(schemas):
+    assert schemas.detect('pds', schemas.get('pds_ph8').size * 3, 'pds') == 'pds_ph8'
+    assert schemas.detect('ads', schemas.get('ads').size * 4, 'ads_ph8') == 'ads'
+
+
+def test_a_length_of_records_of_two_sizes_is_ambiguous(schemas):
+    length = schemas.get('dds').size * schemas.get('dds_ph8').size
+    # the topic settles it when it names one of them
+    assert schemas.detect('dds', length, 'dds_ph8') == 'dds_ph8'
+    assert schemas.ambiguous_lengths == 0
+    # otherwise no schema is picked at random
+    assert schemas.detect('dds', length, None) is None
+    assert schemas.detect('dds', length, None) is None
+    assert schemas.ambiguous_lengths == 2
+
+
+def test_a_length_no_schema_fits_is_left_to_the_topic_schema(schemas):
+    assert schemas.detect('pds', 7, 'pds') == 'pds'
+    assert schemas.detect('pds', 7, None) is None
+    assert schemas.detect('unknown', 421, 'pds') is None
+
+
+def dds_record(second):
+    return struct.pack('<8BB B B B B B H?', *range(8), second, 30, 12, 3, 15, 6, 2025, False)
+
+
+def test_a_payload_of_several_records_is_split_into_them(schemas):
+    schema = schemas.get('dds')
+    payload = b''.join(dds_record(second) for second in (1, 2, 3))
+    records = schema.unpack_records(payload)
+    assert [schema.reading(values, 'STMS1/ddstop')['timestamp'] for values in records] == [
+        '2025-06-15 12:30:01', '2025-06-15 12:30:02', '2025-06-15 12:30:03']
+    assert schema.decode_count == 3
+    assert schema.rtc_values(payload, schema.size * 2) == records[2][schema.rtc_slice]
+
+
+@pytest.mark.parametrize('payload', [b'', dds_record(1) + b'\x00'])
+def test_a_payload_that_is_no_whole_number_of_records_fails(schemas, payload):
+    schema = schemas.get('dds')
+    with pytest.raises(ValueError):
+        schema.unpack_records(payload)
+    assert schema.failure_count == 1
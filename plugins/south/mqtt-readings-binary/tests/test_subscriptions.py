@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Subscriptions of several topics and the asset names of the devices behind them """
+
+import importlib.util
+import json
+import os
+from unittest import mock
+
+import pytest
+
+from conftest import PLUGIN_DIR
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+pytest.importorskip('paho.mqtt.client')
+pytest.importorskip('fledge.plugins.common.utils')
+pytest.importorskip('async_ingest')
+
+DEVICES = {
+    'meter-1': {'topic': 'STMS1/+', 'asset': 'feeder1-'},
+    'meter-2': {'topic': 'STMS2/pdstop, STMS2/ddstop', 'asset': 'feeder2-'},
+}
+
+
+@pytest.fixture
+def plugin(monkeypatch):
+    spec = importlib.util.spec_from_file_location('mqtt_readings_binary',
+                                                  os.path.join(PLUGIN_DIR, 'mqtt-readings-binary.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.schemas = module.SchemaRegistry(PLUGIN_DIR)
+    module.schemas.load()
+    module.paho_client = mock.MagicMock()
+    module.paho_client.subscribe.return_value = (0, 1)
+    monkeypatch.setattr(module.mqtt, 'Client', mock.MagicMock(return_value=module.paho_client))
+    return module
+
+
+def client(plugin, tmp_path, **values):
+    items = {key: dict(item, value=item['default']) for key, item in plugin._DEFAULT_CONFIG.items()}
+    values.setdefault('deadLetterSpool', str(tmp_path / 'dead.spool'))
+    values.setdefault('metricsPort', '0')
+    for key, value in values.items():
+        items[key]['value'] = value
+    return plugin.MqttSubscriberClient(items, plugin.schemas)
+
+
+def subscribed(paho_client):
+    return [topic for call in paho_client.subscribe.call_args_list for topic, qos in call[0][0]]
+
+
+def unsubscribed(paho_client):
+    return [topic for call in paho_client.unsubscribe.call_args_list for topic in call[0][0]]
+
+
+def test_every_topic_is_subscribed_on_connect(plugin, tmp_path):
+    subscriber = client(plugin, tmp_path, topic=' +/pdstop, +/ddstop,, STMS1/adstop ')
+    subscriber.on_connect(plugin.paho_client, None, {}, 0)
+    assert subscribed(plugin.paho_client) == ['+/pdstop', '+/ddstop', 'STMS1/adstop']
+
+
+def test_changed_topics_are_subscribed_and_unsubscribed(plugin, tmp_path):
+    subscriber = client(plugin, tmp_path, topic='+/pdstop,+/ddstop')
+    plugin.paho_client.is_connected.return_value = True
+    subscriber.update_subscriptions(['+/ddstop', '+/adstop'], subscriber.qos, '')
+    assert unsubscribed(plugin.paho_client) == ['+/pdstop']
+    assert subscribed(plugin.paho_client) == ['+/adstop']
+    assert subscriber.topic == '+/ddstop,+/adstop'
+
+
+def test_a_changed_qos_resubscribes_every_topic(plugin, tmp_path):
+    subscriber = client(plugin, tmp_path, topic='+/pdstop,+/ddstop', qos='0')
+    plugin.paho_client.is_connected.return_value = True
+    subscriber.update_subscriptions(['+/pdstop', '+/ddstop'], 1, '')
+    assert plugin.paho_client.subscribe.call_args[0][0] == [('+/ddstop', 1), ('+/pdstop', 1)]
+
+
+def test_the_next_connect_subscribes_the_topics_changed_while_disconnected(plugin, tmp_path):
+    subscriber = client(plugin, tmp_path, topic='+/pdstop')
+    plugin.paho_client.is_connected.return_value = False
+    subscriber.update_subscriptions(['+/adstop'], subscriber.qos, '')
+    assert not plugin.paho_client.subscribe.called
+    subscriber.on_connect(plugin.paho_client, None, {}, 0)
+    assert subscribed(plugin.paho_client) == ['+/adstop']
+
+
+@pytest.mark.parametrize('topic, asset', [
+    ('STMS1/pdstop', 'feeder1-STMS1_pds'),
+    ('STMS2/ddstop', 'feeder2-STMS2_dds'),
+    # not a topic of meter-2
+    ('STMS2/adstop', 'mqtt-STMS2_ads'),
+])
+def test_readings_take_the_asset_name_of_their_device(plugin, tmp_path, topic, asset):
+    subscriber = client(plugin, tmp_path, devices=json.dumps(DEVICES), assetNameTemplate='{asset}{device}_{stream}')
+    assert subscriber.asset_name(subscriber.router.route(topic)) == asset
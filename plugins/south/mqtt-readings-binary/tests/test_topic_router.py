@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" TopicRouter: routes of topic strings and their cache """
+
+import pytest
+
+from topic_router import BINARY, DEFAULT_ROUTES, JSON, TopicRouter
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+
+@pytest.fixture
+def router():
+    return TopicRouter.from_config('')
+
+
+@pytest.mark.parametrize('topic, device, stream, schema, encoding', [
+    ('STMS1/pdstop', 'STMS1', 'pds', 'pds', BINARY),
+    ('STMS1_ph8/pdstop', 'STMS1_ph8', 'pds', 'pds_ph8', BINARY),
+    ('site/STMS2/ddstop', 'site', 'dds', 'dds', BINARY),
+    ('device1/adsdata', 'device1', 'ads', 'ads', JSON),
+])
+def test_the_tokens_of_a_topic_select_its_route(router, topic, device, stream, schema, encoding):
+    route = router.route(topic)
+    assert (route.topic, route.device, route.stream, route.schema, route.encoding) == (
+        topic, device, stream, schema, encoding)
+
+
+def test_a_topic_is_parsed_once(router):
+    first = router.route('STMS1/pdstop')
+    assert router.route('STMS1/pdstop') is first
+    assert router.stats() == {'routes': 1, 'hits': 1, 'misses': 1, 'unrouted': 0}
+
+
+def test_a_topic_without_a_stream_type_is_not_routed(router):
+    assert router.route('Room1/conditions') is None
+    assert router.route('Room1/conditions') is None
+    assert router.stats() == {'routes': 1, 'hits': 1, 'misses': 1, 'unrouted': 2}
+
+
+def test_the_device_segment_is_configurable():
+    router = TopicRouter.from_config('', device_segment=-2)
+    assert router.route('site/STMS2/ddstop').device == 'STMS2'
+    # out of range: no device rather than an error
+    assert TopicRouter.from_config('', device_segment=5).route('STMS1/pdstop').device == ''
+
+
+def test_routes_come_from_the_configuration():
+    router = TopicRouter.from_config({'streams': {'meters': 'pds'}, 'revisions': {'v8': '_ph8'}})
+    assert router.route('STMS1/pdstop') is None
+    assert router.route('v8/meters').schema == 'pds_ph8'
+    # JSON topics default to those of the default routes
+    assert router.json_streams == DEFAULT_ROUTES['json']
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+# FLEDGE_BEGIN
+# See: http://fledge-iot.readthedocs.io/
+# FLEDGE_END
+
+""" Topic routing for the mqtt-readings-binary south plugin
+
+A topic is split once into its tokens (on ``/``, ``_``, ``-`` and ``.``); the token naming the stream
+type (``pdstop``) and the optional hardware revision token (``ph8``) select the frame schema, e.g.
+``STMS1/pdstop`` -> ``pds`` and ``STMS1_ph8/pdstop`` -> ``pds_ph8``. The resulting route is cached per
+topic string so every later message on that topic is a single dict lookup. The device ID of a route is
+the topic segment at ``device_segment``, e.g. ``STMS1`` for ``STMS1/pdstop``.
+
+The schema named by the route is only a hint: the schema registry detects the schema of each frame from
+its payload length and falls back to the route's schema when several schemas share a frame size.
+
+A ``json`` token names the stream type of a topic carrying JSON documents instead of binary frames, e.g.
+``device1/pdsdata`` -> ``pds`` with the ``json`` encoding; see json_payload.
+"""
+
+import json
+import re
+
+__copyright__ = "Copyright (c) 2025 OrxaGrid, Ltd."
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+DEFAULT_ROUTES = {
+    "streams": {"adstop": "ads", "pdstop": "pds", "ddstop": "dds", "pqstop": "pqs"},
+    "revisions": {"ph8": "_ph8"},
+    "json": {"pdsdata": "pds", "adsdata": "ads", "ddsdata": "dds", "pqsdata": "pqs"}
+}
+
+BINARY = 'binary'
+JSON = 'json'
+
+_TOKEN_SPLIT = re.compile(r'[/_\-.]')
+
+# topics are bounded by the device fleet; the cap only guards against a misbehaving publisher
+_MAX_CACHED_ROUTES = 10000
+
+
+class Route(object):
+    """ The decoder selected for one topic """
+
+    __slots__ = ['topic', 'device', 'stream', 'revision', 'schema', 'encoding']
+
+    def __init__(self, topic, device, stream, revision, schema, encoding=BINARY):
+        self.topic = topic
+        self.device = device
+        self.stream = stream
+        self.revision = revision
+        self.schema = schema
+        self.encoding = encoding
+
+
+class TopicRouter(object):
+    """ Maps topic strings to routes through a table built once from configuration """
+
+    __slots__ = ['streams', 'revisions', 'device_segment', 'json_streams', '_cache', 'hits', 'misses', 'unrouted']
+
+    def __init__(self, streams, revisions, device_segment=0, json_streams=None):
+        self.streams = dict(streams)
+        self.revisions = dict(revisions)
+        self.device_segment = device_segment
+        self.json_streams = dict(json_streams or {})
+        self._cache = {}
+        self.hits = 0
+        self.misses = 0
+        self.unrouted = 0
+
+    @classmethod
+    def from_config(cls, routes, device_segment=0):
+        """ Build a router from the ``topicRoutes`` JSON configuration item """
+        if isinstance(routes, str):
+            routes = json.loads(routes) if routes.strip() else {}
+        return cls(routes.get('streams', DEFAULT_ROUTES['streams']),
+                   routes.get('revisions', DEFAULT_ROUTES['revisions']), device_segment,
+                   routes.get('json', DEFAULT_ROUTES['json']))
+
+    def route(self, topic):
+        """ Return the Route for ``topic``, or None when the topic carries no known stream type """
+        try:
+            route = self._cache[topic]
+        except KeyError:
+            self.misses += 1
+            route = self._parse(topic)
+            if len(self._cache) >= _MAX_CACHED_ROUTES:
+                self._cache.clear()
+            self._cache[topic] = route
+        else:
+            self.hits += 1
+        if route is None:
+            self.unrouted += 1
+        return route
+
+    def _parse(self, topic):
+        stream = None
+        encoding = BINARY
+        revision = ''
+        for token in _TOKEN_SPLIT.split(topic):
+            if stream is None and token in self.streams:
+                stream = self.streams[token]
+            elif stream is None and token in self.json_streams:
+                stream = self.json_streams[token]
+                encoding = JSON
+            elif not revision and token in self.revisions:
+                revision = token
+        if stream is None:
+            return None
+        segments = topic.split('/')
+        device = segments[self.device_segment] if -len(segments) <= self.device_segment < len(segments) else ''
+        return Route(topic, device, stream, revision, stream + self.revisions.get(revision, ''), encoding)
+
+    def stats(self):
+        return {'routes': len(self._cache), 'hits': self.hits, 'misses': self.misses, 'unrouted': self.unrouted}